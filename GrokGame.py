@@ -1,18 +1,19 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox
-import speech_recognition as sr
 import threading
 import json
 import os
 import random
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import cv2
+import importlib
+import hashlib
 import logging
-from PIL import Image, ImageTk
-import time
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+STARTUP_IMPORTS_DONE = time.perf_counter()
 
 # Setup logging
 logging.basicConfig(
@@ -21,33 +22,79 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# NLTK downloads
+# Heavy modules (cv2, PIL, speech_recognition, nltk) are imported on first use; each
+# deferred import is timed for the startup report
+IMPORT_TIMINGS = []
+_lazy_modules = {}
+
+def lazy_import(name):
+    module = _lazy_modules.get(name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        IMPORT_TIMINGS.append((name, time.perf_counter() - start, threading.current_thread().name))
+        _lazy_modules[name] = module
+    return module
+
+def startup_report(first_window_at):
+    lines = ["Startup report (ms since process start)",
+             f"  module imports      {(STARTUP_IMPORTS_DONE - STARTUP_BEGIN) * 1000:>9.1f}",
+             f"  first window        {(first_window_at - STARTUP_BEGIN) * 1000:>9.1f}" if first_window_at
+             else "  first window        (not shown)",
+             "  deferred imports    self [ms] | thread"]
+    for name, seconds, thread_name in IMPORT_TIMINGS:
+        lines.append(f"    {name:<24} {seconds * 1000:>9.1f} | {thread_name}")
+    return "\n".join(lines)
+
+# NLTK downloads go to a local directory; checked off the main thread on first use
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+_nltk_lock = threading.Lock()
+_nltk_ready = False
+
 def ensure_nltk_resources():
-    for resource in ['punkt', 'punkt_tab', 'stopwords', 'wordnet']:
-        try:
-            nltk.data.find(f'tokenizers/{resource}' if resource.startswith('punkt') else f'corpora/{resource}')
-        except LookupError:
-            logging.info(f"Downloading {resource}...")
-            nltk.download(resource)
-ensure_nltk_resources()
+    global _nltk_ready
+    with _nltk_lock:
+        nltk = lazy_import("nltk")
+        if _nltk_ready:
+            return nltk
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        for resource in ['punkt', 'punkt_tab', 'stopwords', 'wordnet']:
+            try:
+                nltk.data.find(f'tokenizers/{resource}' if resource.startswith('punkt') else f'corpora/{resource}')
+            except LookupError:
+                logging.info(f"Downloading {resource}...")
+                nltk.download(resource, download_dir=NLTK_DATA_DIR, quiet=True)
+        _nltk_ready = True
+        return nltk
 
 # Define supporting classes first
 class SpeechRecognizer:
     def __init__(self):
-        self.recognizer = sr.Recognizer()
+        # The recognizer and microphone are set up on the first mic press
+        self.recognizer = None
         self.is_recording = False
         self.microphone = None
-        try:
-            self.microphone = sr.Microphone()
-            logging.info("Microphone initialized successfully")
-        except Exception as e:
-            logging.error(f"Microphone initialization failed: {str(e)}")
-            messagebox.showerror("Audio Error", "Could not initialize microphone. Speech input disabled.")
+        self.microphone_checked = False
+
+    def ensure_microphone(self):
+        if not self.microphone_checked:
+            self.microphone_checked = True
+            try:
+                sr = lazy_import("speech_recognition")
+                self.recognizer = sr.Recognizer()
+                self.microphone = sr.Microphone()
+                logging.info("Microphone initialized successfully")
+            except Exception as e:
+                logging.error(f"Microphone initialization failed: {str(e)}")
+                messagebox.showerror("Audio Error", "Could not initialize microphone. Speech input disabled.")
+        return self.microphone is not None
 
     def record(self):
         if not self.microphone:
             return "Microphone not available"
         
+        sr = lazy_import("speech_recognition")
         self.is_recording = True
         try:
             with self.microphone as source:
@@ -72,63 +119,345 @@ class SpeechRecognizer:
         self.is_recording = False
 
 class QuestionGenerator:
-    def __init__(self):
+    def __init__(self, nlp_analyzer=None):
         self.current_question = None
         self.question_bank = self._initialize_question_bank()
+        self.concept_index = None
+        if nlp_analyzer:
+            self.concept_index = nlp_analyzer.concept_index
+            nlp_analyzer.index_bank(self.question_bank)
     
     def _initialize_question_bank(self):
         return {
             "Mathematics": {
-                1: [{"prompt": "What is 5 + 7?", 
+                1: [{"id": "math-addition-5-7",
+                     "prompt": "What is 5 + 7?", 
                      "concepts": ["addition", "basic math"], 
                      "video_path": "videos/math_addition.mp4"}],
-                2: [{"prompt": "What is 8 × 4?", 
+                2: [{"id": "math-multiplication-8-4",
+                     "prompt": "What is 8 × 4?", 
                      "concepts": ["multiplication", "basic math"], 
                      "video_path": "videos/math_multiplication.mp4"}]
             },
             "Science": {
-                1: [{"prompt": "What are the three states of matter?", 
+                1: [{"id": "science-states-of-matter",
+                     "prompt": "What are the three states of matter?", 
                      "concepts": ["states of matter", "basic science"], 
                      "video_path": "videos/science_states.mp4"}]
             }
         }
     
-    def generate_question(self, subject, difficulty):
+    def select_question(self, subject, difficulty):
+        # The question generate_question would ask, without making it current
         available_levels = list(self.question_bank.get(subject, {}).keys())
         if not available_levels:
-            self.current_question = {"prompt": f"Tell me about {subject}.", 
-                                   "concepts": [subject], 
-                                   "video_path": None}
-            return self.current_question
+            return {"id": None,
+                    "prompt": f"Tell me about {subject}.", 
+                    "concepts": [subject], 
+                    "video_path": None}
         
         actual_difficulty = min(difficulty, max(available_levels))
         questions = self.question_bank[subject][actual_difficulty]
-        self.current_question = random.choice(questions)
+        return random.choice(questions)
+    
+    def generate_question(self, subject, difficulty):
+        self.current_question = self.select_question(subject, difficulty)
         return self.current_question
     
     def get_current_question_concepts(self):
         return self.current_question.get("concepts", []) if self.current_question else []
+    
+    def get_current_question_id(self):
+        return self.current_question.get("id") if self.current_question else None
+
+class ConceptIndex:
+    # A trimmed copy of ConceptIndex in gamified-ai-learning-assistant-python.py
+    def __init__(self, preprocess, adhoc_size=4096):
+        self.preprocess = preprocess
+        self.concept_lemmas = {}     # concept -> frozenset of its lemmas, for the bank
+        self.question_entries = {}   # tuple of a bank question's concepts -> {lemma: [concepts using it]}
+        # The same for concepts from outside the bank, bounded
+        self.adhoc_lemmas = LRUCache(adhoc_size)
+        self.adhoc_entries = LRUCache(adhoc_size)
+    
+    def index_bank(self, question_bank):
+        for levels in question_bank.values():
+            for questions in levels.values():
+                for question in questions:
+                    self.get(question.get("concepts", []), pin=True)
+    
+    def concept_words(self, concept, pin=False):
+        lemmas = self.concept_lemmas.get(concept)
+        if lemmas is None and not pin:
+            lemmas = self.adhoc_lemmas.get(concept)
+        if lemmas is None:
+            lemmas = frozenset(self.preprocess(concept))
+            if pin:
+                self.concept_lemmas[concept] = lemmas
+            else:
+                self.adhoc_lemmas.put(concept, lemmas)
+        return lemmas
+    
+    def get(self, concepts, pin=False):
+        key = tuple(concepts)
+        entry = self.question_entries.get(key)
+        if entry is None and not pin:
+            entry = self.adhoc_entries.get(key)
+        if entry is None:
+            entry = {}
+            for concept in key:
+                for lemma in self.concept_words(concept, pin):
+                    entry.setdefault(lemma, []).append(concept)
+            if pin:
+                self.question_entries[key] = entry
+            else:
+                self.adhoc_entries.put(key, entry)
+        return entry
+    
+    def match(self, processed_response, concepts):
+        lemma_map = self.get(concepts)
+        matched = set()
+        for word in processed_response:
+            hits = lemma_map.get(word)
+            if hits:
+                matched.update(hits)
+        return [concept for concept in concepts if concept in matched]
+
+class LRUCache:
+    def __init__(self, maxsize):
+        # maxsize is the number of entries kept; 0 disables caching
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+# Edits to the grading code change the grader fingerprint below by themselves; bump
+# this for grading changes the code cannot show, such as different NLTK data
+GRADER_VERSION = "grokgame-1"
+# One cache file shared by the main app, GrokGame.py and the grading workers; each
+# grader's entries are kept apart by its grader fingerprint
+GRADE_CACHE_PATH = "data/grading_cache.sqlite3"
+
+def grader_fingerprint(*functions):
+    # A hash of GRADER_VERSION and of the bytecode, names and constants of the grading
+    # functions (nested code included), so changing a rule in grade_response keys its
+    # grades apart from those cached before
+    digest = hashlib.sha1(GRADER_VERSION.encode("utf-8"))
+    pending = [function.__code__ for function in functions]
+    while pending:
+        code = pending.pop()
+        digest.update(code.co_code)
+        digest.update(repr(code.co_names).encode("utf-8"))
+        for const in code.co_consts:
+            if hasattr(const, "co_code"):
+                pending.append(const)
+            elif isinstance(const, frozenset):
+                # Set literals; their repr order changes with string hash randomization
+                digest.update(repr(sorted(map(repr, const))).encode("utf-8"))
+            else:
+                digest.update(repr(const).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def normalize_response(user_response):
+    # Answers that differ only in surrounding or repeated whitespace grade the same
+    return " ".join(user_response.split())
+
+class GradeCache:
+    # Grading results keyed by (grader version, question fingerprint, normalized
+    # response hash). An LRU memory tier sits in front of an optional SQLite tier that
+    # survives restarts; the SQLite tier keeps roughly the newest max_disk_entries.
+    def __init__(self, maxsize=10000, path=None, max_disk_entries=1000000):
+        self.memory = LRUCache(maxsize)
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.lock = threading.Lock()
+        self.connection = None
+        self.disk_hits = 0
+        self.disk_writes = 0
+    
+    def _connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = lazy_import("sqlite3").connect(
+                self.path, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            # WAL lets the app variants and grading workers read while another writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS grades (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+            self.connection = connection
+        return self.connection
+    
+    def get(self, key):
+        result = self.memory.get(key)
+        if result is not None or not self.path:
+            return result
+        with self.lock:
+            row = self._connect().execute("SELECT result FROM grades WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[0])
+        self.disk_hits += 1
+        self.memory.put(key, result)
+        return result
+    
+    def put(self, key, result):
+        self.put_many([(key, result)])
+    
+    def put_many(self, entries):
+        for key, result in entries:
+            self.memory.put(key, result)
+        if not self.path or not entries:
+            return
+        rows = [(key, json.dumps(result)) for key, result in entries]
+        with self.lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            connection.executemany("INSERT OR REPLACE INTO grades (key, result) VALUES (?, ?)", rows)
+            # Rowids grow with every write, so trimming the lowest ones drops the oldest grades
+            before = self.disk_writes // 1000
+            self.disk_writes += len(rows)
+            if self.disk_writes // 1000 != before:
+                connection.execute(
+                    "DELETE FROM grades WHERE rowid <= (SELECT MAX(rowid) FROM grades) - ?",
+                    (self.max_disk_entries,)
+                )
+            connection.execute("COMMIT")
+    
+    def clear(self):
+        self.memory.clear()
+        if self.path:
+            with self.lock:
+                self._connect().execute("DELETE FROM grades")
+    
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+    
+    def stats(self):
+        return dict(self.memory.stats(), disk_hits=self.disk_hits, disk_writes=self.disk_writes)
 
 class NLPAnalyzer:
-    def __init__(self):
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
+    def __init__(self, grade_cache_path=None):
+        # NLTK is loaded on the first grade, or earlier by the startup bootstrap thread
+        self.lemmatizer = None
+        self.stop_words = None
+        self.resource_lock = threading.RLock()
+        self.pending_banks = []
+        self.concept_index = ConceptIndex(self.preprocess_text)
+        self.grade_cache = GradeCache(path=grade_cache_path)
+        self.grade_key_prefixes = LRUCache(10000)
+        self.grader_fingerprint = grader_fingerprint(
+            normalize_response, NLPAnalyzer.grade_response, NLPAnalyzer.preprocess_text,
+            ConceptIndex.match, ConceptIndex.get, ConceptIndex.concept_words
+        )
+        # Set once grading falls back to plain split() for want of NLTK data; those
+        # grades are not cached, so they are redone once the data is installed
+        self.degraded = False
+    
+    def grade_key(self, normalized_response, subject, expected_concepts, question_id=None):
+        # The key covers the question id, its subject and concepts, and the grader
+        # fingerprint of the answer rules in grade_response
+        question_key = (question_id, subject, tuple(expected_concepts))
+        prefix = self.grade_key_prefixes.get(question_key)
+        if prefix is None:
+            question = json.dumps([self.grader_fingerprint, question_id, subject, list(expected_concepts)])
+            prefix = hashlib.sha1(question.encode("utf-8")).hexdigest()
+            self.grade_key_prefixes.put(question_key, prefix)
+        response_hash = hashlib.blake2b(normalized_response.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{prefix}:{response_hash}"
+    
+    def index_bank(self, question_bank):
+        with self.resource_lock:
+            if self.stop_words is None:
+                self.pending_banks.append(question_bank)
+                return
+        self.concept_index.index_bank(question_bank)
+    
+    def load_resources(self):
+        with self.resource_lock:
+            if self.stop_words is not None:
+                return
+            ensure_nltk_resources()
+            try:
+                self.lemmatizer = lazy_import("nltk.stem").WordNetLemmatizer()
+                self.stop_words = set(lazy_import("nltk.corpus").stopwords.words('english'))
+            except LookupError as e:
+                logging.error(f"NLTK resource error: {str(e)}")
+                self.stop_words = set()
+                self.degraded = True
+            logging.info("NLP resources loaded")
+            pending_banks, self.pending_banks = self.pending_banks, []
+            for question_bank in pending_banks:
+                self.concept_index.index_bank(question_bank)
     
     def preprocess_text(self, text):
+        if self.stop_words is None:
+            self.load_resources()
         try:
-            tokens = word_tokenize(text.lower())
+            tokens = lazy_import("nltk.tokenize").word_tokenize(text.lower())
             return [self.lemmatizer.lemmatize(word) for word in tokens 
                     if word.isalpha() and word not in self.stop_words]
         except LookupError as e:
             logging.error(f"NLTK resource error: {str(e)}")
+            self.degraded = True
             return text.lower().split()
     
-    def analyze_response(self, user_response, subject, expected_concepts):
+    def analyze_response(self, user_response, subject, expected_concepts, question_id=None):
+        user_response = normalize_response(user_response)
+        key = self.grade_key(user_response, subject, expected_concepts, question_id)
+        result = self.grade_cache.get(key)
+        if result is None:
+            result = self.grade_response(user_response, subject, expected_concepts)
+            if "error" not in result and not self.degraded:
+                self.grade_cache.put(key, result)
+        return dict(result)
+    
+    def grade_response(self, user_response, subject, expected_concepts):
         try:
             processed_response = self.preprocess_text(user_response)
-            matched_concepts = [concept for concept in expected_concepts 
-                              if any(word in processed_response 
-                                   for word in self.preprocess_text(concept))]
+            matched_concepts = self.concept_index.match(processed_response, expected_concepts)
             
             match_percentage = len(matched_concepts) / len(expected_concepts) if expected_concepts else 0
             
@@ -144,11 +473,65 @@ class NLPAnalyzer:
                        "feedback": f"Let's review: {', '.join(expected_concepts)}"}
         except Exception as e:
             logging.error(f"Analysis error: {str(e)}")
-            return {"is_correct": False, "feedback": f"Error analyzing response: {str(e)}"}
+            return {"is_correct": False, "feedback": f"Error analyzing response: {str(e)}", "error": True}
+
+VIDEO_SIZE = (300, 225)
+PREFETCH_FRAMES = 8
+
+def video_source(question):
+    # A question's video file if it exists; None means the webcam
+    path = question.get("video_path") if question else None
+    return path if path and os.path.exists(path) else None
+
+def to_display_image(frame):
+    cv2 = lazy_import("cv2")
+    frame = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), VIDEO_SIZE)
+    return lazy_import("PIL.Image").fromarray(frame)
+
+def open_video(path, preload_frames=PREFETCH_FRAMES):
+    # Open a video file and decode its first frames; runs off the main thread while
+    # feedback is shown. Tk images are still made on the main thread as frames play.
+    capture = lazy_import("cv2").VideoCapture(path)
+    if not capture.isOpened():
+        capture.release()
+        return None, []
+    frames = []
+    for _ in range(preload_frames):
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(to_display_image(frame))
+    return capture, frames
+
+class MainLoopStallMonitor:
+    # Records how late a repeating Tk timer fires, i.e. how long the main loop was blocked
+    def __init__(self, root, interval_ms=10, frame_ms=1000 / 60):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.frame = frame_ms / 1000
+        self.worst_stall = 0.0
+        self.stalls_over_frame = 0
+        self.ticks = 0
+        self.expected = time.perf_counter() + self.interval
+        self.root.after(interval_ms, self.tick)
+
+    def tick(self):
+        now = time.perf_counter()
+        stall = max(0.0, now - self.expected)
+        self.ticks += 1
+        self.worst_stall = max(self.worst_stall, stall)
+        if stall > self.frame:
+            self.stalls_over_frame += 1
+        self.expected = now + self.interval
+        self.root.after(int(self.interval * 1000), self.tick)
+
+    def report(self):
+        return (f"Worst Tk main-loop stall: {self.worst_stall * 1000:.1f} ms "
+                f"({self.stalls_over_frame} of {self.ticks} ticks over one frame)")
 
 # Now define the main class
 class GamifiedLearningAssistant:
-    def __init__(self, root):
+    def __init__(self, root, measure_stalls=False, startup_report=False, prefetch=True, measure_latency=False):
         self.root = root
         self.root.title("Gamified Learning Assistant")
         self.root.geometry("800x650")
@@ -156,14 +539,33 @@ class GamifiedLearningAssistant:
         
         self.initialize_variables()
         self.speech_recognizer = SpeechRecognizer()
-        self.question_generator = QuestionGenerator()
-        self.nlp_analyzer = NLPAnalyzer()
+        self.nlp_analyzer = NLPAnalyzer(grade_cache_path=GRADE_CACHE_PATH)
+        self.question_generator = QuestionGenerator(self.nlp_analyzer)
+        # Grading and saving run on one background thread so the Tk loop never blocks on them
+        self.background = ThreadPoolExecutor(max_workers=1)
+        self.pending_submission = None
+        self.stall_monitor = MainLoopStallMonitor(self.root) if measure_stalls else None
         self.load_user_data()
         self.create_ui()
         self.video_active = False
         self.video_capture = None
         self.current_video_path = None
+        self.video_frames = deque()
+        # While feedback is shown the next question is picked and its video opened and
+        # decoded on its own thread, so Next only swaps them in
+        self.prefetch = prefetch
+        self.prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.prefetched = None   # (subject, level, question, video future or None)
+        self.question_latencies = [] if measure_latency else None
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.show_startup_report = startup_report
+        self.first_window_at = None
+        self.root.after(0, self.on_first_window)
+
+    def on_first_window(self):
+        self.first_window_at = time.perf_counter()
+        logging.info(f"First window after {(self.first_window_at - STARTUP_BEGIN) * 1000:.1f} ms")
+        threading.Thread(target=self.nlp_analyzer.load_resources, name="nltk-bootstrap", daemon=True).start()
 
     def initialize_variables(self):
         self.current_subject = ""
@@ -282,8 +684,11 @@ class GamifiedLearningAssistant:
             self.current_prompt = ""
             self.user_response = ""
             self.showing_feedback = False
+            self.pending_submission = None
+            self.discard_prefetched()
+            self.submit_button.config(text="Submit", state=tk.NORMAL)
             self.feedback_frame.place_forget()
-            self.save_user_data()
+            self.save_user_data_async()
             self.update_ui_for_session()
             logging.info(f"Returned to home from {self.current_subject}")
         except Exception as e:
@@ -297,6 +702,9 @@ class GamifiedLearningAssistant:
         logging.info(f"Progress updated: Level {self.current_level}, XP {self.experience_points}, Progress {self.progress}")
 
     def handle_submission(self):
+        if self.pending_submission is not None:
+            logging.info("Ignoring submission while the previous answer is being graded")
+            return
         try:
             self.user_response = self.answer_entry.get("1.0", tk.END).strip()
             if not self.user_response:
@@ -304,7 +712,6 @@ class GamifiedLearningAssistant:
                 return
             logging.info(f"Submitting response: {self.user_response}")
             self.evaluate_user_response()
-            logging.info(f"Submission processed for {self.current_subject} - Question {self.questions_answered}")
         except Exception as e:
             logging.error(f"Submission error: {str(e)}")
             messagebox.showerror("Error", f"Submission failed: {str(e)}")
@@ -314,8 +721,9 @@ class GamifiedLearningAssistant:
             return
         
         try:
-            self.current_video_path = self.question_generator.current_question.get("video_path")
-            if self.current_video_path and os.path.exists(self.current_video_path):
+            cv2 = lazy_import("cv2")
+            self.current_video_path = video_source(self.question_generator.current_question)
+            if self.current_video_path:
                 self.video_capture = cv2.VideoCapture(self.current_video_path)
                 logging.info(f"Playing educational video: {self.current_video_path}")
             else:
@@ -334,27 +742,39 @@ class GamifiedLearningAssistant:
             self.tutor_display.config(text="🧠", font=("Arial", 40))
             messagebox.showwarning("Video Error", "Could not start video. Using static display.")
 
+    def play_video(self, capture, frames, path):
+        # Switch to a video opened by the prefetcher, showing its decoded frames first
+        self.stop_video()
+        self.video_capture = capture
+        self.video_frames = deque(frames)
+        self.current_video_path = path
+        self.video_active = True
+        self.update_video_frame()
+        logging.info(f"Playing prefetched video: {path}")
+
     def stop_video(self):
         if self.video_active:
             self.video_active = False
             if self.video_capture:
                 self.video_capture.release()
+            self.video_frames.clear()
             self.tutor_display.config(text="🧠", font=("Arial", 40))
             logging.info("Video feed stopped")
 
     def update_video_frame(self):
         if self.video_active and self.video_capture:
-            ret, frame = self.video_capture.read()
-            if ret:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frame = cv2.resize(frame, (300, 225))
-                img = Image.fromarray(frame)
-                imgtk = ImageTk.PhotoImage(image=img)
+            if self.video_frames:
+                img = self.video_frames.popleft()
+            else:
+                ret, frame = self.video_capture.read()
+                img = to_display_image(frame) if ret else None
+            if img is not None:
+                imgtk = lazy_import("PIL.ImageTk").PhotoImage(image=img)
                 self.tutor_display.imgtk = imgtk
                 self.tutor_display.configure(image=imgtk)
             else:
                 if self.current_video_path:
-                    self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.video_capture.set(lazy_import("cv2").CAP_PROP_POS_FRAMES, 0)
             self.root.after(33, self.update_video_frame)
 
     def show_subject_selection(self):
@@ -395,12 +815,18 @@ class GamifiedLearningAssistant:
             logging.error(f"Session start error: {str(e)}")
             messagebox.showerror("Error", "Failed to start session.")
 
-    def load_next_question(self):
+    def load_next_question(self, question=None, switch_video=True):
         try:
-            question = self.question_generator.generate_question(
-                subject=self.current_subject,
-                difficulty=self.current_level
-            )
+            if question is None:
+                question = self.question_generator.generate_question(
+                    subject=self.current_subject,
+                    difficulty=self.current_level
+                )
+            else:
+                self.question_generator.current_question = question
+            if switch_video and self.video_active and video_source(question) != self.current_video_path:
+                # update_ui_for_session opens the new question's video
+                self.stop_video()
             self.current_prompt = question["prompt"]
             self.showing_feedback = False
             self.answer_entry.delete("1.0", tk.END)
@@ -412,12 +838,25 @@ class GamifiedLearningAssistant:
             self.current_prompt = "Error loading question. Please try again."
 
     def evaluate_user_response(self):
+        submission = self.background.submit(
+            self.nlp_analyzer.analyze_response,
+            user_response=self.user_response,
+            subject=self.current_subject,
+            expected_concepts=self.question_generator.get_current_question_concepts(),
+            question_id=self.question_generator.get_current_question_id()
+        )
+        self.pending_submission = submission
+        self.submit_button.config(text="Grading...", state=tk.DISABLED)
+        submission.add_done_callback(lambda done: self.root.after(0, lambda: self.finish_evaluation(done)))
+
+    def finish_evaluation(self, submission):
+        if submission is not self.pending_submission:
+            logging.info("Discarding stale grading result")
+            return
+        self.pending_submission = None
+        self.submit_button.config(text="Submit", state=tk.NORMAL)
         try:
-            analysis_result = self.nlp_analyzer.analyze_response(
-                user_response=self.user_response,
-                subject=self.current_subject,
-                expected_concepts=self.question_generator.get_current_question_concepts()
-            )
+            analysis_result = submission.result()
             self.is_correct_answer = analysis_result["is_correct"]
             self.feedback_message = analysis_result["feedback"]
             self.questions_answered += 1
@@ -439,9 +878,10 @@ class GamifiedLearningAssistant:
                     logging.info(f"Level up to {self.current_level}")
                 
                 self.user_data[self.current_subject]["xp"] = self.experience_points
-                self.save_user_data()
+                self.save_user_data_async()
                 self.update_progress_display()
             
+            logging.info(f"Submission processed for {self.current_subject} - Question {self.questions_answered}")
             self.show_feedback()
         except Exception as e:
             logging.error(f"Response evaluation error: {str(e)}")
@@ -457,19 +897,84 @@ class GamifiedLearningAssistant:
         self.feedback_text.config(text=self.feedback_message)
         self.feedback_frame.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
         logging.info("Showing feedback")
+        if self.prefetch and self.is_session_active:
+            self.prefetch_next_question()
+
+    def prefetch_next_question(self):
+        self.discard_prefetched()
+        question = self.question_generator.select_question(self.current_subject, self.current_level)
+        path = video_source(question)
+        # The webcam is never opened twice; a question without a video keeps the current feed
+        video = self.prefetcher.submit(open_video, path) if path and path != self.current_video_path else None
+        self.prefetched = (self.current_subject, self.current_level, question, video)
+
+    def discard_prefetched(self):
+        prefetched, self.prefetched = self.prefetched, None
+        if prefetched and prefetched[3] is not None:
+            prefetched[3].add_done_callback(self.release_prefetched_video)
+
+    @staticmethod
+    def release_prefetched_video(video):
+        if not video.cancelled() and video.exception() is None:
+            capture, _ = video.result()
+            if capture is not None:
+                capture.release()
+
+    def attach_prefetched_video(self, question, video):
+        # Runs on the main thread once the prefetched video is ready
+        if question is not self.question_generator.current_question or not self.is_session_active:
+            self.release_prefetched_video(video)
+            return
+        try:
+            capture, frames = video.result()
+        except Exception as e:
+            logging.error(f"Video prefetch failed: {str(e)}")
+            capture, frames = None, []
+        if capture is None:
+            self.stop_video()
+            self.start_video()
+        else:
+            self.play_video(capture, frames, video_source(question))
 
     def continue_to_new_question(self):
+        clicked_at = time.perf_counter()
         try:
             self.feedback_frame.place_forget()
             self.showing_feedback = False
-            self.load_next_question()
+            prefetched = self.prefetched
+            if prefetched and prefetched[:2] == (self.current_subject, self.current_level):
+                self.prefetched = None
+                _, _, question, video = prefetched
+                # The old video keeps playing until the prefetched one is swapped in
+                self.load_next_question(question, switch_video=video is None)
+                if video is not None:
+                    if video.done():
+                        self.attach_prefetched_video(question, video)
+                    else:
+                        video.add_done_callback(
+                            lambda done: self.root.after(0, lambda: self.attach_prefetched_video(question, done)))
+            else:
+                self.discard_prefetched()
+                self.load_next_question()
             logging.info("Continuing to new question")
         except Exception as e:
             logging.error(f"Continue error: {str(e)}")
             messagebox.showerror("Error", "Failed to load next question")
+        if self.question_latencies is not None:
+            # Idle callbacks run after Tk has redrawn, so this covers the question appearing
+            self.root.after_idle(lambda: self.question_latencies.append(time.perf_counter() - clicked_at))
+
+    def latency_report(self):
+        samples = sorted(self.question_latencies)
+        if not samples:
+            return "Click-to-question latency: no questions shown"
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+        return (f"Click-to-question latency over {len(samples)} questions: p50 {percentile(0.5):.2f} ms, "
+                f"p99 {percentile(0.99):.2f} ms, max {samples[-1] * 1000:.2f} ms")
 
     def toggle_speech_recognition(self):
-        if not self.speech_recognizer.microphone:
+        if not self.speech_recognizer.ensure_microphone():
             messagebox.showwarning("Audio Error", "Speech recognition is not available.")
             return
             
@@ -505,16 +1010,33 @@ class GamifiedLearningAssistant:
             self.user_data = {}
             logging.info("Initialized new user data")
 
-    def save_user_data(self):
+    def save_user_data(self, user_data=None):
         try:
             with open('data/user_progress.json', 'w') as f:
-                json.dump(self.user_data, f, indent=2)
+                json.dump(self.user_data if user_data is None else user_data, f, indent=2)
             logging.info("User data saved")
         except Exception as e:
             logging.error(f"Failed to save user data: {str(e)}")
 
+    def save_user_data_async(self):
+        snapshot = {subject: dict(progress) for subject, progress in self.user_data.items()}
+        self.background.submit(self.save_user_data, snapshot)
+
     def on_closing(self):
         self.stop_video()
+        self.discard_prefetched()
+        self.prefetcher.shutdown(wait=True)
+        self.background.shutdown(wait=True)
+        self.nlp_analyzer.grade_cache.close()
+        if self.stall_monitor:
+            logging.info(self.stall_monitor.report())
+            print(self.stall_monitor.report())
+        if self.question_latencies is not None:
+            logging.info(self.latency_report())
+            print(self.latency_report())
+        if self.show_startup_report:
+            logging.info(startup_report(self.first_window_at))
+            print(startup_report(self.first_window_at))
         self.root.destroy()
 
     def run(self):
@@ -522,5 +1044,8 @@ class GamifiedLearningAssistant:
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = GamifiedLearningAssistant(root)
+    app = GamifiedLearningAssistant(root, measure_stalls="--measure-stalls" in sys.argv,
+                                    startup_report="--startup-report" in sys.argv,
+                                    prefetch="--no-prefetch" not in sys.argv,
+                                    measure_latency="--measure-latency" in sys.argv)
     app.run()
@@ -1,25 +1,134 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-import speech_recognition as sr
 import threading
 import json
+import logging
 import os
+import queue
 import random
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-
-# Download necessary NLTK packages (run once)
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    nltk.download('wordnet')
+import argparse
+import asyncio
+import base64
+import bisect
+import csv
+import heapq
+import importlib
+import hashlib
+import math
+import multiprocessing
+import pickle
+import re
+import signal
+import subprocess
+import sys
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from itertools import count
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, quote, urlsplit
+
+# Heavy modules (nltk, speech_recognition) are imported when the feature that needs
+# them is first used, not at startup. Each deferred import is timed for the startup report.
+STARTUP_IMPORTS_DONE = time.perf_counter()
+IMPORT_TIMINGS = []
+_lazy_modules = {}
+
+
+def lazy_import(name):
+    module = _lazy_modules.get(name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        IMPORT_TIMINGS.append((name, time.perf_counter() - start, threading.current_thread().name))
+        _lazy_modules[name] = module
+    return module
+
+
+# NLTK data lives in a local directory next to the script; missing packages are
+# downloaded there once (run once)
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+NLTK_RESOURCES = [
+    ("tokenizers/punkt", "punkt"),
+    ("tokenizers/punkt_tab", "punkt_tab"),
+    ("corpora/stopwords", "stopwords"),
+    ("corpora/wordnet", "wordnet")
+]
+_nltk_lock = threading.Lock()
+_nltk_ready = False
+
+
+def load_nltk():
+    # Import NLTK and make sure its data is available. The app calls this from a
+    # background thread at startup; graders call it on first use and wait if needed.
+    global _nltk_ready
+    with _nltk_lock:
+        nltk = lazy_import("nltk")
+        if not _nltk_ready:
+            if NLTK_DATA_DIR not in nltk.data.path:
+                nltk.data.path.insert(0, NLTK_DATA_DIR)
+            for resource, package in NLTK_RESOURCES:
+                try:
+                    nltk.data.find(resource)
+                except LookupError:
+                    nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+            _nltk_ready = True
+    return nltk
+
+
+def nltk_word_tokenize(text):
+    return lazy_import("nltk.tokenize").word_tokenize(text)
+
+
+def startup_report(first_window_at):
+    lines = [
+        "Startup report (ms since process start)",
+        f"  module imports      {(STARTUP_IMPORTS_DONE - STARTUP_BEGIN) * 1000:>9.1f}",
+        f"  first window        {(first_window_at - STARTUP_BEGIN) * 1000:>9.1f}" if first_window_at else
+        "  first window        (not shown)",
+        "  deferred imports    self [ms] | thread"
+    ]
+    for name, seconds, thread_name in IMPORT_TIMINGS:
+        lines.append(f"    {name:<24} {seconds * 1000:>9.1f} | {thread_name}")
+    return "\n".join(lines)
+
+class MainLoopStallMonitor:
+    # Measures how late Tk runs a timer that should fire every interval_ms. The
+    # lateness is how long the main loop was blocked, so the worst value per session
+    # must stay under one frame (~16.7 ms at 60 Hz) for the UI to feel responsive.
+    def __init__(self, root, interval_ms=10, frame_ms=1000 / 60):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.frame = frame_ms / 1000
+        self.worst_stall = 0.0
+        self.stalls_over_frame = 0
+        self.ticks = 0
+        self.expected = time.perf_counter() + self.interval
+        self.root.after(interval_ms, self.tick)
+    
+    def tick(self):
+        now = time.perf_counter()
+        stall = max(0.0, now - self.expected)
+        self.ticks += 1
+        self.worst_stall = max(self.worst_stall, stall)
+        if stall > self.frame:
+            self.stalls_over_frame += 1
+        self.expected = now + self.interval
+        self.root.after(int(self.interval * 1000), self.tick)
+    
+    def report(self):
+        return (f"Worst Tk main-loop stall: {self.worst_stall * 1000:.1f} ms "
+                f"({self.stalls_over_frame} of {self.ticks} ticks over one frame)")
+
 
 class GamifiedLearningAssistant:
-    def __init__(self, root):
+    def __init__(self, root, measure_stalls=False, startup_report=False, stage_stats=None, prefetch=True,
+                 measure_latency=False):
         self.root = root
         self.root.title("Gamified Learning Assistant")
         self.root.geometry("700x600")
@@ -43,14 +152,43 @@ class GamifiedLearningAssistant:
         
         # Initialize components
         self.speech_recognizer = SpeechRecognizer()
-        self.question_generator = QuestionGenerator()
-        self.nlp_analyzer = NLPAnalyzer()
+        self.nlp_analyzer = NLPAnalyzer(grade_cache_path=GRADE_CACHE_PATH)
+        self.question_generator = QuestionGenerator(self.nlp_analyzer)
+        
+        # Grading and saving run on one background thread, off the Tk main loop.
+        # A single worker also keeps progress writes in submission order.
+        self.background = ThreadPoolExecutor(max_workers=1)
+        self.pending_submission = None
+        self.stall_monitor = MainLoopStallMonitor(self.root) if measure_stalls else None
+        # The next question is chosen while feedback is on screen and prepared in the
+        # background, so Continue only has to show it
+        self.prefetch = prefetch
+        self.prefetched = None   # (subject, level, question, preparation future)
+        self.question_latency = LatencyHistogram() if measure_latency else None
+        if stage_stats:
+            self.nlp_analyzer.enable_instrumentation().start_dump(stage_stats)
         
         # Load user data
         self.load_user_data()
         
         # Create UI
         self.create_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        
+        # Load NLTK and its data in the background once the window is up
+        self.show_startup_report = startup_report
+        self.first_window_at = None
+        self.root.after(0, self.on_first_window)
+    
+    def on_first_window(self):
+        self.first_window_at = time.perf_counter()
+        threading.Thread(target=self.nlp_analyzer.load_resources, name="nltk-bootstrap", daemon=True).start()
+        self.root.after(QUESTION_REFRESH_INTERVAL * 1000, self.refresh_questions)
+    
+    def refresh_questions(self):
+        # Only the changed questions are re-read, so this is cheap enough for the main loop
+        self.question_generator.refresh()
+        self.root.after(QUESTION_REFRESH_INTERVAL * 1000, self.refresh_questions)
     
     def create_ui(self):
         # Main frame
@@ -267,7 +405,7 @@ class GamifiedLearningAssistant:
             self.subject_label.config(text="")
     
     def show_subject_selection(self):
-        subjects = ["Mathematics", "Science", "History", "Language Arts", "Programming"]
+        subjects = self.question_generator.subjects()
         
         # Create a new top-level window
         selection_window = tk.Toplevel(self.root)
@@ -315,6 +453,7 @@ class GamifiedLearningAssistant:
     def start_session(self, subject, selection_window=None):
         self.current_subject = subject
         self.is_session_active = True
+        self.prefetched = None
         
         # Load saved level and XP if available
         if subject in self.user_data:
@@ -335,11 +474,16 @@ class GamifiedLearningAssistant:
         # Load first question
         self.load_next_question()
     
-    def load_next_question(self):
-        question = self.question_generator.generate_question(
-            subject=self.current_subject,
-            difficulty=self.current_level
-        )
+    def load_next_question(self, question=None):
+        if question is None:
+            question = self.question_generator.generate_question(
+                subject=self.current_subject,
+                difficulty=self.current_level,
+                scheduler=self.review_scheduler,
+                seen=self.seen_questions.get(self.current_subject)
+            )
+        else:
+            self.question_generator.current_question = question
         
         self.current_prompt = question["prompt"]
         self.showing_feedback = False
@@ -351,6 +495,10 @@ class GamifiedLearningAssistant:
         self.progress_bar['value'] = self.progress * 100
     
     def evaluate_user_response(self):
+        # Ignore a second click while the previous answer is still being graded
+        if self.pending_submission is not None:
+            return
+        
         # Get user's answer from text entry
         self.user_response = self.answer_entry.get("1.0", tk.END).strip()
         
@@ -358,15 +506,39 @@ class GamifiedLearningAssistant:
             messagebox.showinfo("Input Required", "Please enter your answer.")
             return
         
-        # Analyze response
-        analysis_result = self.nlp_analyzer.analyze_response(
+        # Analyze response in the background and show a pending state meanwhile
+        submission = self.background.submit(
+            self.nlp_analyzer.analyze_response,
             user_response=self.user_response,
             subject=self.current_subject,
-            expected_concepts=self.question_generator.get_current_question_concepts()
+            expected_concepts=self.question_generator.get_current_question_concepts(),
+            question_id=self.question_generator.get_current_question_id()
         )
+        self.pending_submission = submission
+        self.submit_button.config(text="Grading...", state=tk.DISABLED)
+        submission.add_done_callback(
+            lambda done: self.root.after(0, lambda: self.finish_evaluation(done))
+        )
+    
+    def finish_evaluation(self, submission):
+        # Results of a submission that is no longer pending are stale
+        if submission is not self.pending_submission:
+            return
+        self.pending_submission = None
+        self.submit_button.config(text="Submit Answer", state=tk.NORMAL)
+        
+        try:
+            analysis_result = submission.result()
+        except Exception as e:
+            messagebox.showerror("Grading Error", f"Could not grade your answer: {e}")
+            return
         
         self.is_correct_answer = analysis_result["is_correct"]
         self.feedback_message = analysis_result["feedback"]
+        question_id = self.question_generator.get_current_question_id()
+        if question_id:
+            self.review_scheduler.record(self.current_subject, question_id, review_quality(analysis_result))
+            self.seen_questions.setdefault(self.current_subject, ScalableBloomFilter()).add(question_id)
         
         # Update stats
         self.questions_answered += 1
@@ -382,7 +554,7 @@ class GamifiedLearningAssistant:
                 # Save progress
                 self.user_data[self.current_subject]["level"] = self.current_level
                 self.user_data[self.current_subject]["xp"] = self.experience_points
-                self.save_user_data()
+                self.save_user_data_async()
         
         # Show feedback
         self.show_feedback()
@@ -405,14 +577,37 @@ class GamifiedLearningAssistant:
             width=500,
             height=300
         )
+        
+        if self.prefetch:
+            self.prefetch_next_question()
+    
+    def prefetch_next_question(self):
+        # Picking is cheap and stays on the main thread; compiling rules and lemmatizing
+        # concepts runs on the background thread while the student reads the feedback
+        question = self.question_generator.select_question(
+            self.current_subject, self.current_level, scheduler=self.review_scheduler,
+            seen=self.seen_questions.get(self.current_subject)
+        )
+        preparation = self.background.submit(self.nlp_analyzer.prepare_question, self.current_subject, question)
+        self.prefetched = (self.current_subject, self.current_level, question, preparation)
     
     def continue_to_next_question(self):
+        clicked_at = time.perf_counter()
+        
         # Hide feedback
         self.feedback_frame.place_forget()
         self.showing_feedback = False
         
-        # Load next question
-        self.load_next_question()
+        # Show the prefetched question if it is still the right one, else pick one now
+        prefetched, self.prefetched = self.prefetched, None
+        if prefetched and prefetched[:2] == (self.current_subject, self.current_level):
+            self.load_next_question(prefetched[2])
+        else:
+            self.load_next_question()
+        
+        if self.question_latency:
+            # Idle callbacks run after Tk has redrawn, so this covers the question appearing
+            self.root.after_idle(lambda: self.question_latency.record(time.perf_counter() - clicked_at))
     
     def toggle_speech_recognition(self):
         if self.is_listening:
@@ -465,11 +660,48 @@ class GamifiedLearningAssistant:
         except (FileNotFoundError, json.JSONDecodeError):
             # Initialize with empty data if file doesn't exist or is invalid
             self.user_data = {}
+        self.review_scheduler = ReviewScheduler.load(REVIEW_SCHEDULE_PATH)
+        # Questions answered per subject, kept with the subject's progress as a Bloom filter
+        self.seen_questions = load_seen_filters(self.user_data, self.review_scheduler)
     
-    def save_user_data(self):
+    def user_data_snapshot(self):
+        snapshot = {subject: dict(progress) for subject, progress in self.user_data.items()}
+        for subject, seen in self.seen_questions.items():
+            snapshot.setdefault(subject, {})["seen"] = seen.copy()
+        return snapshot
+    
+    def save_user_data(self, user_data=None):
         # Save user data to file
         with open('data/user_progress.json', 'w') as f:
-            json.dump(self.user_data, f, indent=2)
+            json.dump(self.user_data if user_data is None else user_data, f, indent=2,
+                      default=ScalableBloomFilter.json_default)
+    
+    def save_user_data_async(self):
+        # Serialize a snapshot on the background thread so later edits can't race the write
+        self.background.submit(self.save_user_data, self.user_data_snapshot())
+        self.background.submit(ReviewScheduler.write, REVIEW_SCHEDULE_PATH, self.review_scheduler.snapshot())
+    
+    def on_closing(self):
+        # Let a pending save finish before the window goes away
+        if self.seen_questions:
+            self.background.submit(self.save_user_data, self.user_data_snapshot())
+        self.background.submit(ReviewScheduler.write, REVIEW_SCHEDULE_PATH, self.review_scheduler.snapshot())
+        self.background.shutdown(wait=True)
+        self.question_generator.close()
+        if self.nlp_analyzer.grade_cache:
+            self.nlp_analyzer.grade_cache.close()
+        if self.nlp_analyzer.stage_timer:
+            self.nlp_analyzer.stage_timer.stop_dump()
+            print(self.nlp_analyzer.stage_timer.summary())
+        if self.stall_monitor:
+            print(self.stall_monitor.report())
+        if self.question_latency:
+            latency = self.question_latency.snapshot()
+            print(f"Click-to-question latency over {latency['count']} questions: "
+                  f"p50 {latency['p50_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms, max {latency['max_ms']:.2f} ms")
+        if self.show_startup_report:
+            print(startup_report(self.first_window_at))
+        self.root.destroy()
     
     def run(self):
         self.root.mainloop()
@@ -477,12 +709,21 @@ class GamifiedLearningAssistant:
 
 class SpeechRecognizer:
     def __init__(self):
-        self.recognizer = sr.Recognizer()
+        # speech_recognition is imported on the first mic press
+        self.recognizer = None
         self.is_recording = False
     
     def record(self):
         self.is_recording = True
         
+        try:
+            sr = lazy_import("speech_recognition")
+        except ImportError:
+            self.is_recording = False
+            return "Speech recognition is not installed"
+        if self.recognizer is None:
+            self.recognizer = sr.Recognizer()
+        
         try:
             with sr.Microphone() as source:
                 # Adjust for ambient noise
@@ -509,65 +750,1576 @@ class SpeechRecognizer:
         self.is_recording = False
 
 
-class QuestionGenerator:
+QUESTION_STORE_PATH = "data/questions.sqlite3"
+# Seconds between checks for questions imported or removed while the app is running
+QUESTION_REFRESH_INTERVAL = 5
+DUPLICATE_REPORT_PATH = "data/duplicate_questions.jsonl"
+
+
+class ConceptTable:
+    # Interned concept lists. Each distinct concept name is stored once and gets an id;
+    # each distinct list of them is stored once, as a run of ids in one flat array, and
+    # questions refer to it by its number. Entries live as long as the process.
     def __init__(self):
+        self.names = []                  # concept id -> name
+        self.ids = {}                    # name -> concept id
+        self.flat = array("I")           # concept ids of every list, back to back
+        self.starts = array("I", [0])    # list number -> start in flat; the next start ends it
+        self.lists = {}                  # packed concept ids -> list number
+        self.lock = threading.Lock()
+    
+    def intern(self, concepts):
+        with self.lock:
+            ids = array("I")
+            for name in concepts:
+                concept_id = self.ids.get(name)
+                if concept_id is None:
+                    concept_id = self.ids[name] = len(self.names)
+                    self.names.append(sys.intern(name))
+                ids.append(concept_id)
+            key = ids.tobytes()
+            number = self.lists.get(key)
+            if number is None:
+                number = self.lists[key] = len(self.starts) - 1
+                self.flat.extend(ids)
+                self.starts.append(len(self.flat))
+            return number
+    
+    def concepts(self, number):
+        names = self.names
+        return tuple([names[concept_id] for concept_id in self.flat[self.starts[number]:self.starts[number + 1]]])
+
+
+class Question:
+    # Immutable question record. Concepts are a ConceptTable list number and rules stay
+    # as their JSON text until compiled, so a resident question is a handful of
+    # pointers. get() and [] read it like the question dicts the bank used to hold.
+    __slots__ = ("id", "prompt", "concept_list", "rules_json", "video_path", "weight")
+    FIELDS = frozenset(["id", "prompt", "concepts", "rules", "video_path", "weight"])
+    concept_table = ConceptTable()
+    
+    def __init__(self, question_id, prompt, concepts=(), rules="[]", video_path=None, weight=1.0):
+        assign = object.__setattr__
+        assign(self, "id", question_id)
+        assign(self, "prompt", prompt)
+        assign(self, "concept_list", self.concept_table.intern(concepts))
+        assign(self, "rules_json", rules if isinstance(rules, str) else json.dumps(rules))
+        assign(self, "video_path", video_path)
+        assign(self, "weight", 1.0 if weight == 1.0 else float(weight))
+    
+    @classmethod
+    def from_dict(cls, question):
+        return cls(question.get("id"), question["prompt"], question.get("concepts", []), question.get("rules", []),
+                   question.get("video_path"), question.get("weight", 1.0))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Question is immutable")
+    
+    def __delattr__(self, name):
+        raise AttributeError("Question is immutable")
+    
+    def __reduce__(self):
+        # Concept list numbers are only meaningful in this process, so pickle the names
+        return Question, (self.id, self.prompt, self.concepts, self.rules_json, self.video_path, self.weight)
+    
+    def __repr__(self):
+        return f"Question({self.id!r}, {self.prompt!r})"
+    
+    @property
+    def concepts(self):
+        return self.concept_table.concepts(self.concept_list)
+    
+    @property
+    def rules(self):
+        # A fresh list each time, so callers cannot change the record's rules
+        return json.loads(self.rules_json) if self.rules_json != "[]" else []
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __contains__(self, key):
+        return key in self.FIELDS
+    
+    def to_dict(self):
+        return {field: getattr(self, field) for field in ("id", "prompt", "concepts", "rules", "video_path", "weight")}
+
+
+class QuestionStore:
+    # The question bank on disk: one SQLite row per question, indexed on (subject, level)
+    # so a subject loads without touching the rest of the bank. A seed bank is upserted
+    # whenever it changes; questions added any other way are left alone. Every write
+    # bumps the store's revision and stamps the rows it touched, and removed questions
+    # leave a tombstone, so readers can catch up with changes_since().
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS questions (
+            id TEXT PRIMARY KEY,
+            subject TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            prompt TEXT NOT NULL,
+            concepts TEXT NOT NULL,
+            rules TEXT NOT NULL,
+            video_path TEXT,
+            weight REAL NOT NULL DEFAULT 1,
+            revision INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS questions_subject_level ON questions (subject, level);
+        CREATE TABLE IF NOT EXISTS subjects (name TEXT PRIMARY KEY, position INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS tombstones (id TEXT PRIMARY KEY, revision INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS tombstones_revision ON tombstones (revision);
+    """
+    
+    def __init__(self, path=QUESTION_STORE_PATH, seed=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = lazy_import("sqlite3").connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(questions)")]
+        if "weight" not in columns:
+            # Stores created before questions had sampling weights
+            self.connection.execute("ALTER TABLE questions ADD COLUMN weight REAL NOT NULL DEFAULT 1")
+        if "revision" not in columns:
+            # Stores created before revisions were tracked
+            self.connection.execute("ALTER TABLE questions ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS questions_revision ON questions (revision)")
+        # Random id telling this store apart from another one at the same revision
+        self.connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (os.urandom(8).hex(),))
+        if seed:
+            self.seed(seed)
+    
+    def seed(self, question_bank):
+        fingerprint = hashlib.sha1(json.dumps(question_bank, sort_keys=True).encode("utf-8")).hexdigest()
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'seed'").fetchone()
+        if row and row[0] == fingerprint:
+            return
+        self.add_questions(
+            dict(question, subject=subject, level=level)
+            for subject, levels in question_bank.items()
+            for level, questions in levels.items()
+            for question in questions
+        )
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seed', ?)", (fingerprint,))
+    
+    def add_questions(self, questions):
+        # Insert or update questions given as dicts with subject and level. Questions
+        # without an id get one derived from their subject, level and prompt.
+        rows = []
+        subjects = []
+        for question in questions:
+            question_id = self.question_id(question)
+            rows.append((
+                question_id, question["subject"], int(question["level"]), question["prompt"],
+                json.dumps(question.get("concepts", [])), json.dumps(question.get("rules", [])),
+                question.get("video_path"), float(question.get("weight", 1.0))
+            ))
+            if question["subject"] not in subjects:
+                subjects.append(question["subject"])
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            revision = self._next_revision()
+            # Upsert rather than replace, so updated questions keep their place in the bank;
+            # rows that did not actually change keep their revision
+            self.connection.executemany(
+                "INSERT INTO questions (id, subject, level, prompt, concepts, rules, video_path, weight, revision) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                "subject = excluded.subject, level = excluded.level, prompt = excluded.prompt, "
+                "concepts = excluded.concepts, rules = excluded.rules, video_path = excluded.video_path, "
+                "weight = excluded.weight, revision = excluded.revision "
+                "WHERE (subject, level, prompt, concepts, rules, video_path, weight) IS NOT "
+                "(excluded.subject, excluded.level, excluded.prompt, excluded.concepts, excluded.rules, "
+                "excluded.video_path, excluded.weight)",
+                [row + (revision,) for row in rows]
+            )
+            self.connection.executemany("DELETE FROM tombstones WHERE id = ?", [(row[0],) for row in rows])
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO subjects (name, position) "
+                "VALUES (?, (SELECT COUNT(*) FROM subjects))",
+                [(subject,) for subject in subjects]
+            )
+            self.connection.execute("COMMIT")
+        return len(rows)
+    
+    @staticmethod
+    def question_id(question):
+        return question.get("id") or "{}-{}-{}".format(
+            re.sub(r"\W+", "-", question["subject"].lower()), question["level"],
+            hashlib.sha1(question["prompt"].encode("utf-8")).hexdigest()[:12]
+        )
+    
+    def prompts(self):
+        # (id, subject, level, prompt) of every stored question, in insertion order
+        with self.lock:
+            return self.connection.execute("SELECT id, subject, level, prompt FROM questions ORDER BY rowid").fetchall()
+    
+    def _next_revision(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        revision = (int(row[0]) if row else 0) + 1
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (str(revision),))
+        return revision
+    
+    def revision(self):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def version(self):
+        # [store id, revision]; changes whenever any question is written or removed
+        with self.lock:
+            rows = dict(self.connection.execute(
+                "SELECT key, value FROM meta WHERE key IN ('store_id', 'revision')"
+            ).fetchall())
+        return [rows.get("store_id"), int(rows.get("revision", 0))]
+    
+    def remove_questions(self, question_ids):
+        question_ids = list(question_ids)
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            revision = self._next_revision()
+            removed = 0
+            for question_id in question_ids:
+                removed += self.connection.execute("DELETE FROM questions WHERE id = ?", (question_id,)).rowcount
+                self.connection.execute("INSERT OR REPLACE INTO tombstones (id, revision) VALUES (?, ?)",
+                                        (question_id, revision))
+            self.connection.execute("COMMIT")
+        return removed
+    
+    def changes_since(self, revision):
+        # (current revision, [(subject, level, question)] written since, [removed ids]),
+        # read through the revision indexes
+        with self.lock:
+            current = self.connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+            current = int(current[0]) if current else 0
+            if current <= revision:
+                return current, [], []
+            rows = self.connection.execute(
+                "SELECT id, subject, level, prompt, concepts, rules, video_path, weight FROM questions "
+                "WHERE revision > ? ORDER BY revision, rowid",
+                (revision,)
+            ).fetchall()
+            removed = [question_id for question_id, in self.connection.execute(
+                "SELECT id FROM tombstones WHERE revision > ?", (revision,)
+            )]
+        return current, [(subject, level, self.question_from_row(question_id, *row))
+                         for question_id, subject, level, *row in rows], removed
+    
+    def subjects(self):
+        with self.lock:
+            return [name for name, in self.connection.execute("SELECT name FROM subjects ORDER BY position")]
+    
+    def load_subject(self, subject):
+        # {level: [question, ...]} in insertion order, read through the (subject, level) index
+        levels = {}
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, level, prompt, concepts, rules, video_path, weight FROM questions "
+                "WHERE subject = ? ORDER BY level, rowid",
+                (subject,)
+            ).fetchall()
+        for question_id, level, *row in rows:
+            levels.setdefault(level, []).append(self.question_from_row(question_id, *row))
+        return levels
+    
+    @staticmethod
+    def question_from_row(question_id, prompt, concepts, rules, video_path, weight):
+        return Question(question_id, prompt, json.loads(concepts), rules, video_path, weight)
+    
+    def subject_of(self, question_id):
+        with self.lock:
+            row = self.connection.execute("SELECT subject FROM questions WHERE id = ?", (question_id,)).fetchone()
+        return row[0] if row else None
+    
+    def concept_lists(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT concepts FROM questions ORDER BY rowid").fetchall()
+        return [json.loads(concepts) for concepts, in rows]
+    
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+    
+    def close(self):
+        self.connection.close()
+
+
+class LazyQuestionBank(Mapping):
+    # Read-only {subject: {level: [question, ...]}} view of a QuestionStore. A subject is
+    # read the first time it is used; once more than max_questions questions are
+    # resident, the least recently used subjects are dropped again. refresh() applies
+    # what changed in the store since, touching only those questions. Listeners are
+    # called as listener(subject, loaded, evicted, changed) for every load, eviction and
+    # refresh so indexes built over the bank can follow it; changed is a list of
+    # (level, old question, new question), with None for an added or removed side.
+    def __init__(self, store, max_questions=50000):
+        self.store = store
+        self.max_questions = max_questions
+        self.resident = OrderedDict()   # subject -> levels, least recently used first
+        self.resident_count = 0
+        self.questions = {}             # question id -> (subject, question), resident only
+        self.positions = {}             # question id -> (level, index in that level's list)
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.subject_names = None
+        self.revision = store.revision()
+    
+    def subjects(self):
+        if self.subject_names is None:
+            self.subject_names = self.store.subjects()
+        return self.subject_names
+    
+    def __iter__(self):
+        return iter(self.subjects())
+    
+    def __len__(self):
+        return len(self.subjects())
+    
+    def __contains__(self, subject):
+        return subject in self.subjects()
+    
+    def __getitem__(self, subject):
+        with self.lock:
+            levels = self.resident.get(subject)
+            if levels is not None:
+                self.resident.move_to_end(subject)
+                return levels
+            if subject not in self.subjects():
+                raise KeyError(subject)
+            levels = self.store.load_subject(subject)
+            self.resident[subject] = levels
+            for level, questions in levels.items():
+                self.resident_count += len(questions)
+                for position, question in enumerate(questions):
+                    self.questions[question["id"]] = (subject, question)
+                    self.positions[question["id"]] = (level, position)
+            evicted = []
+            while self.resident_count > self.max_questions and len(self.resident) > 1:
+                evicted.append(self.evict(next(iter(self.resident))))
+        # Listeners run outside the lock, so they are free to call back into the bank
+        for listener in self.listeners:
+            listener(subject, levels, None, None)
+            for evicted_subject, evicted_levels in evicted:
+                listener(evicted_subject, None, evicted_levels, None)
+        return levels
+    
+    def evict(self, subject):
+        levels = self.resident.pop(subject)
+        for questions in levels.values():
+            self.resident_count -= len(questions)
+            for question in questions:
+                self.questions.pop(question["id"], None)
+                self.positions.pop(question["id"], None)
+        return subject, levels
+    
+    def refresh(self):
+        # Apply questions added, changed or removed in the store since the last refresh.
+        # Only resident subjects are touched; others read the new rows when they load.
+        # Returns the number of questions that changed here.
+        revision, written, removed = self.store.changes_since(self.revision)
+        if revision == self.revision:
+            return 0
+        changes = {}   # subject -> [(level, old, new)]
+        with self.lock:
+            self.revision = revision
+            if removed:
+                self.subject_names = None
+            for question_id in removed:
+                self._take(question_id, changes)
+            for subject, level, question in written:
+                if self.subject_names is not None and subject not in self.subject_names:
+                    self.subject_names = None
+                levels = self.resident.get(subject)
+                found = self.questions.get(question["id"])
+                if found and found[0] == subject:
+                    old_level, questions, position = self._locate(question["id"])
+                    if old_level == level:
+                        questions[position] = question
+                        self.questions[question["id"]] = (subject, question)
+                        changes.setdefault(subject, []).append((level, found[1], question))
+                        continue
+                self._take(question["id"], changes)
+                if levels is not None:
+                    questions = levels.setdefault(level, [])
+                    self.positions[question["id"]] = (level, len(questions))
+                    questions.append(question)
+                    self.questions[question["id"]] = (subject, question)
+                    self.resident_count += 1
+                    changes.setdefault(subject, []).append((level, None, question))
+        for listener in self.listeners:
+            for subject, changed in changes.items():
+                listener(subject, None, None, changed)
+        return sum(len(changed) for changed in changes.values())
+    
+    def _locate(self, question_id):
+        subject, _ = self.questions[question_id]
+        level, position = self.positions[question_id]
+        return level, self.resident[subject][level], position
+    
+    def _take(self, question_id, changes):
+        # Remove a resident question in O(1) by moving its level's last question into its place
+        found = self.questions.get(question_id)
+        if found is None:
+            return
+        subject = found[0]
+        level, questions, position = self._locate(question_id)
+        last = questions.pop()
+        if last is not found[1]:
+            questions[position] = last
+            self.positions[last["id"]] = (level, position)
+        if not questions:
+            del self.resident[subject][level]
+        del self.questions[question_id]
+        del self.positions[question_id]
+        self.resident_count -= 1
+        changes.setdefault(subject, []).append((level, found[1], None))
+    
+    def loaded(self):
+        with self.lock:
+            return list(self.resident.items())
+    
+    def find(self, question_id):
+        # (subject, question) for a question id, loading its subject if needed
+        found = self.questions.get(question_id)
+        if found is None:
+            subject = self.store.subject_of(question_id)
+            if subject is None:
+                return None
+            self[subject]
+            found = self.questions.get(question_id)
+        return found
+    
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+
+class PromptDeduplicator:
+    # Near-duplicate prompts by MinHash LSH. A prompt is normalized (case, punctuation,
+    # spacing) and cut into character shingles; bands * rows hash functions give it a
+    # signature of per-function minimums, and each band of rows is hashed to a bucket
+    # key. Prompts sharing a key in any band are candidates, so the work grows with the
+    # prompts plus the candidates rather than with every pair. A candidate joins a
+    # cluster only if it asks about the same numbers as the cluster's question and the
+    # exact Jaccard similarity of their shingles reaches the threshold. With 20 bands of
+    # 6 rows, a pair at similarity 0.8 becomes a candidate 99.8% of the time.
+    NON_WORD = re.compile(r"[^\w]+")
+    NUMBER = re.compile(r"\d+(?:\.\d+)?")
+    MAX_BUCKET_REPRESENTATIVES = 8
+    
+    def __init__(self, threshold=0.8, bands=20, rows=6, shingle_size=5, seed=0, use_numpy=True, chunk_size=128):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.use_numpy = use_numpy
+        self.chunk_size = chunk_size
+        # Multiply-shift hashing of 32-bit shingle hashes: (a * x + b) mod 2**64, top 32 bits
+        rng = random.Random(seed)
+        self.multipliers = [rng.getrandbits(64) | 1 for _ in range(bands * rows)]
+        self.offsets = [rng.getrandbits(64) for _ in range(bands * rows)]
+        self.row_multipliers = [rng.getrandbits(64) | 1 for _ in range(rows)]
+        self.shingle_cache = LRUCache(100000)
+    
+    def normalize(self, prompt):
+        return " ".join(self.NON_WORD.sub(" ", prompt.lower()).split())
+    
+    def shingles(self, prompt):
+        text = self.normalize(prompt).encode("utf-8")
+        size = self.shingle_size
+        if len(text) <= size:
+            return frozenset([zlib.crc32(text)])
+        return frozenset([zlib.crc32(text[i:i + size]) for i in range(len(text) - size + 1)])
+    
+    def band_keys(self, prompts):
+        # One key per band for each prompt: an (n, bands) uint64 array with NumPy,
+        # else a list of per-prompt key lists
+        np = None
+        if self.use_numpy:
+            try:
+                np = lazy_import("numpy")
+            except ImportError:
+                self.use_numpy = False
+        if np is None:
+            mask = 2 ** 64 - 1
+            hash_functions = list(zip(self.multipliers, self.offsets))
+            keys = []
+            for prompt in prompts:
+                shingles = self.shingles(prompt)
+                signature = [min(((a * x + b) & mask) >> 32 for x in shingles) for a, b in hash_functions]
+                keys.append([hash(tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                             for band in range(self.bands)])
+            return keys
+        multipliers = np.array(self.multipliers, dtype=np.uint64)[:, None]
+        offsets = np.array(self.offsets, dtype=np.uint64)[:, None]
+        row_multipliers = np.array(self.row_multipliers, dtype=np.uint64)
+        size = self.shingle_size
+        keys = np.empty((len(prompts), self.bands), dtype=np.uint64)
+        for start in range(0, len(prompts), self.chunk_size):
+            # A chunk's prompts back to back; each shingle's bytes, packed into one
+            # integer, serve as its hash. Minimums ignore repeated shingles, so no sets.
+            texts = [self.normalize(prompt).ljust(size).encode("utf-8")
+                     for prompt in prompts[start:start + self.chunk_size]]
+            lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+            data = np.frombuffer(b"".join(texts), dtype=np.uint8).astype(np.uint64)
+            count = len(data) - size + 1
+            shingles = np.zeros(count, dtype=np.uint64)
+            for offset in range(size):
+                shingles = (shingles << np.uint64(8)) | data[offset:offset + count]
+            # Drop shingles that run from one prompt into the next
+            ends = np.repeat(np.cumsum(lengths), lengths)[:count]
+            shingles = shingles[np.arange(count) + size <= ends]
+            boundaries = np.concatenate(([0], np.cumsum(lengths - size + 1)[:-1]))
+            # (hash functions, shingles) -> per-prompt minimums -> (prompts, bands, rows)
+            values = (multipliers * shingles + offsets) >> np.uint64(32)
+            signatures = np.minimum.reduceat(values, boundaries, axis=1).T
+            signatures = signatures.reshape(len(texts), self.bands, self.rows)
+            keys[start:start + len(texts)] = (signatures * row_multipliers).sum(axis=2)
+        return keys
+    
+    def candidate_groups(self, keys):
+        # Indices sharing a bucket in some band, ascending, for buckets of two or more
+        if isinstance(keys, list):
+            for band in range(self.bands):
+                buckets = {}
+                for index, prompt_keys in enumerate(keys):
+                    buckets.setdefault(prompt_keys[band], []).append(index)
+                yield from (group for group in buckets.values() if len(group) > 1)
+            return
+        np = lazy_import("numpy")
+        for band in range(self.bands):
+            column = keys[:, band]
+            order = np.argsort(column, kind="stable")
+            ordered = column[order]
+            starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+            ends = np.append(starts[1:], len(ordered))
+            for start, end in zip(starts[ends - starts > 1].tolist(), ends[ends - starts > 1].tolist()):
+                yield order[start:end].tolist()
+    
+    def cached_shingles(self, index, prompt):
+        shingles = self.shingle_cache.get(index)
+        if shingles is None:
+            shingles = self.shingles(prompt)
+            self.shingle_cache.put(index, shingles)
+        return shingles
+    
+    def similarity(self, first, second):
+        # Exact Jaccard similarity of two prompts' shingles
+        a, b = self.shingles(first), self.shingles(second)
+        return len(a & b) / len(a | b)
+    
+    def _similar(self, prompts, first, second):
+        if self.NUMBER.findall(prompts[first]) != self.NUMBER.findall(prompts[second]):
+            return False
+        a = self.cached_shingles(first, prompts[first])
+        b = self.cached_shingles(second, prompts[second])
+        return len(a & b) >= self.threshold * len(a | b)
+    
+    def clusters(self, prompts):
+        # Lists of indices into prompts, each starting with its earliest member
+        prompts = list(prompts)
+        self.shingle_cache = LRUCache(100000)
+        parent = {}
+        
+        def find(index):
+            root = index
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while index != root:
+                parent[index], index = root, parent.get(index, index)
+            return root
+        
+        for group in self.candidate_groups(self.band_keys(prompts)):
+            # Compare each member with a few representatives of the bucket, not every pair
+            representatives = []
+            for index in group:
+                root = find(index)
+                for representative in representatives:
+                    if find(representative) == root:
+                        break
+                    if self._similar(prompts, representative, index):
+                        other = find(representative)
+                        parent[max(root, other)] = min(root, other)
+                        break
+                else:
+                    if len(representatives) < self.MAX_BUCKET_REPRESENTATIVES:
+                        representatives.append(index)
+        clusters = {}
+        for index in list(parent):
+            clusters.setdefault(find(index), set()).update((index, find(index)))
+        return sorted(sorted(members) for members in clusters.values() if len(members) > 1)
+
+
+class AliasTable:
+    # Vose's alias method: O(n) to build over a list of positive weights, then O(1)
+    # per draw (one random number picks a column and tosses its biased coin)
+    def __init__(self, weights):
+        size = len(weights)
+        total = float(sum(weights))
+        if not size or total <= 0:
+            raise ValueError("AliasTable needs at least one positive weight")
+        scaled = [weight * size / total for weight in weights]
+        alias = list(range(size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1.0 up to rounding error
+        for i in small + large:
+            scaled[i] = 1.0
+        self.size = size
+        self.probability = scaled
+        self.alias = alias
+    
+    def __len__(self):
+        return self.size
+    
+    def draw(self, rng=random):
+        column = rng.random() * self.size
+        index = int(column)
+        return index if column - index < self.probability[index] else self.alias[index]
+
+
+class WeightedPool:
+    # The questions at one (subject, level), grouped into weight classes: class k holds
+    # the weights in (2**(k-1), 2**k]. A draw picks a class from an alias table weighted
+    # by members * 2**k, a member uniformly, and accepts it with probability
+    # weight / 2**k, which is more than 1/2. set_weight(), add() and remove() touch one
+    # question in O(1); only the small class table is rebuilt, on the next draw.
+    # Indices are stable: a removed question leaves None in its place.
+    def __init__(self, questions, weights=None):
+        self.questions = list(questions)
+        if weights is None:
+            weights = [float(question.get("weight", 1.0)) for question in self.questions]
+        self.weights = [0.0] * len(self.questions)
+        self.positions = {question.get("id"): i for i, question in enumerate(self.questions)}
+        self.classes = {}         # k -> question indices
+        self.weight_class = [0] * len(self.questions)
+        self.slot = [0] * len(self.questions)   # position within its class
+        self.total = 0.0
+        self.table = None
+        self.live = len(self.questions)
+        self.version = 0          # bumped when questions are added or removed
+        for index, weight in enumerate(weights):
+            self.place(index, weight)
+    
+    def __len__(self):
+        return self.live
+    
+    def add(self, question):
+        index = len(self.questions)
+        self.questions.append(question)
+        self.weights.append(0.0)
+        self.weight_class.append(0)
+        self.slot.append(0)
+        self.positions[question.get("id")] = index
+        self.place(index, float(question.get("weight", 1.0)))
+        self.live += 1
+        self.version += 1
+        self.table = None
+        return index
+    
+    def remove(self, index):
+        self.displace(index)
+        self.positions.pop(self.questions[index].get("id"), None)
+        self.questions[index] = None
+        self.weights[index] = 0.0
+        self.live -= 1
+        self.version += 1
+        self.table = None
+    
+    def replace(self, index, question):
+        self.questions[index] = question
+        weight = float(question.get("weight", 1.0))
+        if weight != self.weights[index]:
+            self.set_weight(index, weight)
+    
+    def place(self, index, weight):
+        if weight <= 0:
+            raise ValueError("question weights must be positive")
+        mantissa, exponent = math.frexp(weight)
+        k = exponent - 1 if mantissa == 0.5 else exponent
+        members = self.classes.setdefault(k, [])
+        self.weight_class[index] = k
+        self.slot[index] = len(members)
+        members.append(index)
+        self.weights[index] = weight
+        self.total += weight
+    
+    def displace(self, index):
+        k = self.weight_class[index]
+        members = self.classes[k]
+        last = members.pop()
+        if last != index:
+            members[self.slot[index]] = last
+            self.slot[last] = self.slot[index]
+        if not members:
+            del self.classes[k]
+        self.total -= self.weights[index]
+    
+    def set_weight(self, index, weight):
+        if weight <= 0:
+            raise ValueError("question weights must be positive")
+        self.displace(index)
+        self.place(index, weight)
+        self.table = None
+    
+    def rebuild(self):
+        order = list(self.classes)
+        self.table_members = [self.classes[k] for k in order]
+        self.table_bounds = [math.ldexp(1.0, k) for k in order]
+        self.table = AliasTable([len(members) * bound for members, bound in zip(self.table_members, self.table_bounds)])
+    
+    def draw(self, rng=random):
+        if self.table is None:
+            self.rebuild()
+        table, table_members, table_bounds, weights = self.table, self.table_members, self.table_bounds, self.weights
+        while True:
+            column = table.draw(rng)
+            members = table_members[column]
+            index = members[int(rng.random() * len(members))]
+            bound = table_bounds[column]
+            if weights[index] == bound or rng.random() * bound < weights[index]:
+                return index
+
+
+class SamplerCycle:
+    # One session's pass through a pool: no question repeats until all have been drawn.
+    # Draws come from the pool's shared table, skipping questions already drawn; once
+    # those make up half of what is being drawn from (by count or by weight), a private
+    # table is built over the rest. Each rebuild at least halves what is left, so a
+    # whole cycle costs O(n) and a draw O(1) amortized. Weight changes made mid-cycle
+    # reach the private table at its next rebuild; when questions are added or removed
+    # the cycle keeps what it has drawn and goes back to the shared table.
+    def __init__(self, pool):
+        self.pool = pool
+        self.seen = set()
+        self.remaining = None   # pool indices behind the private table, once built
+        self.table = None
+        self.table_count = len(pool)
+        self.table_weight = pool.total
+        self.seen_count = 0     # drawn since the current table was built
+        self.seen_weight = 0.0
+        self.version = pool.version
+    
+    def restart(self):
+        self.__init__(self.pool)
+    
+    def reconcile(self):
+        pool = self.pool
+        self.seen = {i for i in self.seen if pool.questions[i] is not None}
+        self.remaining = None
+        self.table = None
+        self.table_count = len(pool)
+        self.table_weight = pool.total
+        self.seen_count = len(self.seen)
+        self.seen_weight = sum(pool.weights[i] for i in self.seen)
+        self.version = pool.version
+    
+    def draw(self, rng=random):
+        pool = self.pool
+        if self.version != pool.version:
+            self.reconcile()
+        if len(self.seen) >= len(pool):
+            self.restart()
+        if 2 * self.seen_count > self.table_count or 2.0 * self.seen_weight > self.table_weight:
+            candidates = range(len(pool.questions)) if self.remaining is None else self.remaining
+            self.remaining = [i for i in candidates if i not in self.seen and pool.questions[i] is not None]
+            weights = [pool.weights[i] for i in self.remaining]
+            self.table = AliasTable(weights)
+            self.table_count = len(weights)
+            self.table_weight = sum(weights)
+            self.seen_count = 0
+            self.seen_weight = 0.0
+        seen = self.seen
+        while True:
+            if self.table is None:
+                index = pool.draw(rng)
+            else:
+                index = self.remaining[self.table.draw(rng)]
+            if index not in seen:
+                break
+        seen.add(index)
+        self.seen_count += 1
+        self.seen_weight += pool.weights[index]
+        return index
+
+
+class SamplerSession:
+    # Per-student sampling state: one cycle per (subject, level) pool. Given the
+    # student's seen filter, draws pass over questions answered in earlier sessions,
+    # giving up after MAX_SEEN_SKIPS so a level the student has finished still serves.
+    MAX_SEEN_SKIPS = 32
+    
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.cycles = {}
+    
+    def draw(self, subject, level, seen=None):
+        pool = self.sampler.pool(subject, level)
+        cycle = self.cycles.get((subject, level))
+        if cycle is None or cycle.pool is not pool:
+            # First draw, or the subject was reloaded since
+            cycle = self.cycles[(subject, level)] = SamplerCycle(pool)
+        question = pool.questions[cycle.draw(self.sampler.rng)]
+        if seen is not None:
+            for _ in range(self.MAX_SEEN_SKIPS):
+                if question.get("id") not in seen:
+                    break
+                question = pool.questions[cycle.draw(self.sampler.rng)]
+        return question
+    
+    def exhausted(self, subject, level):
+        # True once every question of the level has been drawn in this session's cycle
+        pool = self.sampler.pool(subject, level)
+        cycle = self.cycles.get((subject, level))
+        return cycle is not None and cycle.pool is pool and len(cycle.seen) >= len(pool)
+
+
+class QuestionSampler:
+    # Weighted, non-repeating question draws over a question bank. Pools are built the
+    # first time a (subject, level) is drawn from and dropped when the bank evicts the
+    # subject. Weights come from each question's optional "weight" (default 1.0) and can
+    # be changed with set_weight(); draws stay O(1) either way.
+    def __init__(self, question_bank, seed=None):
+        self.question_bank = question_bank
+        self.rng = random if seed is None else random.Random(seed)
+        self.pools = {}       # (subject, level) -> WeightedPool
+        self.levels = {}      # subject -> sorted levels
+        self.lock = threading.Lock()
+        if hasattr(question_bank, "add_listener"):
+            question_bank.add_listener(self.subject_changed)
+    
+    def subject_changed(self, subject, loaded=None, evicted=None, changed=None):
+        if evicted is not None:
+            self.forget(subject)
+        elif changed:
+            # Patch the pools already built; sessions keep their cycles
+            with self.lock:
+                self.levels.pop(subject, None)
+                for level, old, new in changed:
+                    pool = self.pools.get((subject, level))
+                    if pool is None:
+                        continue
+                    if old is not None and new is not None:
+                        pool.replace(pool.positions[old["id"]], new)
+                    elif old is not None:
+                        pool.remove(pool.positions[old["id"]])
+                    else:
+                        pool.add(new)
+                    if not len(pool):
+                        del self.pools[(subject, level)]
+    
+    def forget(self, subject):
+        with self.lock:
+            self.levels.pop(subject, None)
+            for key in [key for key in self.pools if key[0] == subject]:
+                del self.pools[key]
+    
+    def subject_levels(self, subject):
+        levels = self.levels.get(subject)
+        if levels is None:
+            levels = sorted(level for level, questions in self.question_bank.get(subject, {}).items() if questions)
+            self.levels[subject] = levels
+        return levels
+    
+    def level_for(self, subject, difficulty):
+        # The highest level at or below difficulty, else the lowest; None if no questions
+        levels = self.subject_levels(subject)
+        if not levels:
+            return None
+        position = bisect.bisect_right(levels, difficulty)
+        return levels[position - 1] if position else levels[0]
+    
+    def pool(self, subject, level):
+        pool = self.pools.get((subject, level))
+        if pool is None:
+            with self.lock:
+                pool = self.pools.get((subject, level))
+                if pool is None:
+                    pool = self.pools[(subject, level)] = WeightedPool(self.question_bank[subject][level])
+        return pool
+    
+    def session(self):
+        return SamplerSession(self)
+    
+    def draw(self, subject, level):
+        # Independent weighted draw, repeats allowed
+        pool = self.pool(subject, level)
+        return pool.questions[pool.draw(self.rng)]
+    
+    def set_weight(self, subject, level, question_id, weight):
+        pool = self.pool(subject, level)
+        pool.set_weight(pool.positions[question_id], weight)
+
+
+REVIEW_SCHEDULE_PATH = "data/review_schedule.pickle"
+REVIEW_SCHEDULE_VERSION = 1
+
+
+def review_quality(analysis_result):
+    # SM-2 answer quality (0-5) from a grade: 3-5 for correct answers by confidence,
+    # 0-2 for wrong ones
+    confidence = analysis_result.get("confidence_score", 0.0)
+    if analysis_result.get("is_correct"):
+        return 5 if confidence >= 0.9 else 4 if confidence >= 0.75 else 3
+    return 2 if confidence >= 0.5 else 1 if confidence >= 0.25 else 0
+
+
+class ReviewScheduler:
+    # SM-2 spaced repetition for one student. Items are stored column-wise in arrays
+    # indexed by slot, and each subject has a min-heap of (due, slot) so the next due
+    # question is O(log n). Rescheduling pushes a new entry and leaves the old one
+    # behind; stale entries (their due no longer matches the slot's) are skipped when
+    # they surface and dropped when a heap grows to twice its live size.
+    DAY = 86400.0
+    INITIAL_EASE = 2.5
+    MIN_EASE = 1.3
+    
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.offset = 0.0            # added to the clock by advance()
+        self.slots = {}              # question id -> slot
+        self.ids = []
+        self.subjects = []           # slot -> subject
+        self.due = array("d")        # epoch seconds
+        self.interval = array("f")   # days
+        self.ease = array("f")
+        self.repetitions = array("H")
+        self.heaps = {}              # subject -> [(due, slot), ...]
+        self.subject_counts = Counter()
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def now(self):
+        return self.clock() + self.offset
+    
+    def advance(self, seconds):
+        # Move this scheduler's clock forward, e.g. to simulate days passing; O(1)
+        self.offset += seconds
+    
+    def record(self, subject, question_id, quality, now=None):
+        # Schedule the next review of a question after an answer of the given quality
+        now = self.now() if now is None else now
+        slot = self.slots.get(question_id)
+        if slot is None:
+            slot = self.slots[question_id] = len(self.ids)
+            self.ids.append(question_id)
+            self.subjects.append(subject)
+            self.due.append(0.0)
+            self.interval.append(0.0)
+            self.ease.append(self.INITIAL_EASE)
+            self.repetitions.append(0)
+            self.subject_counts[subject] += 1
+        ease = self.ease[slot]
+        if quality < 3:
+            repetitions = 0
+            interval = 1.0
+        else:
+            repetitions = min(self.repetitions[slot] + 1, 0xFFFF)
+            interval = 1.0 if repetitions == 1 else 6.0 if repetitions == 2 else self.interval[slot] * ease
+        self.ease[slot] = max(self.MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.repetitions[slot] = repetitions
+        self.interval[slot] = interval
+        due = self.due[slot] = now + interval * self.DAY
+        
+        heap = self.heaps.setdefault(subject, [])
+        heapq.heappush(heap, (due, slot))
+        if len(heap) > 2 * self.subject_counts[subject] + 64:
+            self.heaps[subject] = heap = [(d, s) for d, s in heap if self.due[s] == d]
+            heapq.heapify(heap)
+        return due
+    
+    def next_due(self, subject, now=None):
+        # Id of the most overdue question in a subject, or None if nothing is due yet
+        heap = self.heaps.get(subject)
+        if not heap:
+            return None
+        due_times = self.due
+        while heap and due_times[heap[0][1]] != heap[0][0]:
+            heapq.heappop(heap)
+        if not heap or heap[0][0] > (self.now() if now is None else now):
+            return None
+        return self.ids[heap[0][1]]
+    
+    def question_ids(self, subject):
+        # Every question of the subject the student has answered
+        return [question_id for question_id, slot_subject in zip(self.ids, self.subjects) if slot_subject == subject]
+    
+    def drop(self, question_id):
+        # Stop reviewing a question that no longer exists; its slot stays as a tombstone
+        slot = self.slots.get(question_id)
+        if slot is not None:
+            self.due[slot] = math.inf
+    
+    def snapshot(self):
+        # Copies of the columns, cheap enough to take on the UI thread and write elsewhere
+        names = list(self.heaps)
+        subject_numbers = {name: i for i, name in enumerate(names)}
+        return (REVIEW_SCHEDULE_VERSION, self.offset, names, list(self.ids),
+                array("H", [subject_numbers[subject] for subject in self.subjects]),
+                array("d", self.due), array("f", self.interval), array("f", self.ease),
+                array("H", self.repetitions))
+    
+    @classmethod
+    def restore(cls, snapshot, clock=time.time):
+        version, offset, names, ids, subject_numbers, due, interval, ease, repetitions = snapshot
+        if version != REVIEW_SCHEDULE_VERSION:
+            raise ValueError(f"unsupported review schedule version {version}")
+        scheduler = cls(clock)
+        scheduler.offset = offset
+        scheduler.ids = ids
+        scheduler.slots = {question_id: slot for slot, question_id in enumerate(ids)}
+        scheduler.subjects = [names[number] for number in subject_numbers]
+        scheduler.due, scheduler.interval, scheduler.ease, scheduler.repetitions = due, interval, ease, repetitions
+        scheduler.subject_counts = Counter(scheduler.subjects)
+        heaps = {name: [] for name in names}
+        for slot, (subject, due_at) in enumerate(zip(scheduler.subjects, due)):
+            if due_at != math.inf:
+                heaps[subject].append((due_at, slot))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        scheduler.heaps = heaps
+        return scheduler
+    
+    @classmethod
+    def load(cls, path=REVIEW_SCHEDULE_PATH):
+        try:
+            with open(path, "rb") as f:
+                return cls.restore(pickle.load(f))
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return cls()
+    
+    @staticmethod
+    def write(path, snapshot):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+
+# False-positive rate of each student's seen-question filters: at 1%, one unseen
+# question in a hundred is mistaken for seen and skipped
+SEEN_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    # Fixed-capacity Bloom filter of strings. The bit array is sized for `capacity`
+    # items at `error_rate` false positives; an item sets `hashes` bits, picked by
+    # double hashing one 128-bit BLAKE2b digest.
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.size = (size + 7) // 8 * 8
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8) if bits is None else bytearray(bits)
+        self.count = count
+    
+    @staticmethod
+    def item_hashes(item):
+        # The two hashes every filter derives its bit positions from
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    
+    def positions(self, hashes):
+        first, step = hashes
+        size = self.size
+        return [(first + i * step) % size for i in range(self.hashes)]
+    
+    def add(self, item, hashes=None):
+        # True if the item was not (apparently) in the filter yet
+        bits = self.bits
+        added = False
+        for position in self.positions(hashes or self.item_hashes(item)):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+    
+    def __contains__(self, item):
+        return self.contains_hashes(self.item_hashes(item))
+    
+    def contains_hashes(self, hashes):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(hashes))
+
+
+class ScalableBloomFilter:
+    # Bloom filter that grows as items arrive (Almeida et al.): once the newest filter
+    # holds its capacity, another one `growth` times larger is added with its error
+    # rate tightened by `tightening`. Starting at error_rate * (1 - tightening), the
+    # rates sum to at most error_rate however many filters there are, and memory stays
+    # proportional to the items added. encode() packs it into a short JSON-safe dict;
+    # json_default lets json.dump encode filters found in the data it writes.
+    def __init__(self, error_rate=SEEN_ERROR_RATE, initial_capacity=128, growth=2, tightening=0.8):
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+    
+    def filter_error_rate(self, number):
+        return self.error_rate * (1 - self.tightening) * self.tightening ** number
+    
+    def add(self, item):
+        hashes = BloomFilter.item_hashes(item)
+        if any(bloom.contains_hashes(hashes) for bloom in self.filters):
+            return False
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            number = len(self.filters)
+            self.filters.append(BloomFilter(self.initial_capacity * self.growth ** number,
+                                            self.filter_error_rate(number)))
+        return self.filters[-1].add(item, hashes)
+    
+    def __contains__(self, item):
+        hashes = BloomFilter.item_hashes(item)
+        return any(bloom.contains_hashes(hashes) for bloom in self.filters)
+    
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+    
+    def nbytes(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+    
+    def copy(self):
+        seen = ScalableBloomFilter(self.error_rate, self.initial_capacity, self.growth, self.tightening)
+        seen.filters = [BloomFilter(bloom.capacity, bloom.error_rate, bloom.bits, bloom.count) for bloom in self.filters]
+        return seen
+    
+    def encode(self):
+        # Bits are deflated before base64: the newest filter is mostly empty
+        return {
+            "error_rate": self.error_rate,
+            "initial_capacity": self.initial_capacity,
+            "growth": self.growth,
+            "tightening": self.tightening,
+            "filters": [[bloom.count, base64.b64encode(zlib.compress(bytes(bloom.bits))).decode("ascii")]
+                        for bloom in self.filters]
+        }
+    
+    @staticmethod
+    def json_default(value):
+        if isinstance(value, ScalableBloomFilter):
+            return value.encode()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    
+    @classmethod
+    def decode(cls, data):
+        # Raises ValueError for anything encode() could not have produced
+        try:
+            seen = cls(data["error_rate"], data["initial_capacity"], data["growth"], data["tightening"])
+            for number, (count, bits) in enumerate(data["filters"]):
+                bloom = BloomFilter(seen.initial_capacity * seen.growth ** number, seen.filter_error_rate(number),
+                                    zlib.decompress(base64.b64decode(bits, validate=True)), count)
+                if len(bloom.bits) * 8 != bloom.size:
+                    raise ValueError(f"filter {number} has {len(bloom.bits)} bytes, expected {bloom.size // 8}")
+                seen.filters.append(bloom)
+        except (KeyError, TypeError, ArithmeticError, zlib.error) as e:
+            raise ValueError(f"malformed seen filter: {e!r}") from e
+        return seen
+
+
+def load_seen_filters(subjects, scheduler=None):
+    # Decode the seen filters saved with a student's per-subject progress, taking them
+    # out of it. A filter that does not decode is dropped and rebuilt from the questions
+    # the student's ReviewScheduler holds for the subject, rather than failing startup.
+    seen_filters = {}
+    for subject, progress in subjects.items():
+        data = progress.pop("seen", None)
+        if not data:
+            continue
+        try:
+            seen_filters[subject] = ScalableBloomFilter.decode(data)
+        except ValueError as e:
+            logging.warning(f"Rebuilding the seen filter for {subject}: {e}")
+            seen = seen_filters[subject] = ScalableBloomFilter()
+            for question_id in scheduler.question_ids(subject) if scheduler else ():
+                seen.add(question_id)
+    return seen_filters
+
+
+def _math_addition(a, b):
+    return {
+        "prompt": f"What is {a} + {b}?",
+        "concepts": ["addition", "single digit", "basic math"],
+        "rules": [{"type": "answer", "value": a + b,
+                   "feedback": f"That's right! {a} + {b} = {a + b}. Great job with your addition.",
+                   "concepts_identified": ["addition", "correct calculation"], "confidence_score": 0.95}]
+    }
+
+
+def _math_multiplication(a, b):
+    return {
+        "prompt": f"What is {a} × {b}?",
+        "concepts": ["multiplication", "single digit", "basic math"],
+        "rules": [{"type": "answer", "value": a * b,
+                   "feedback": f"Correct! {a} × {b} = {a * b}. You're good at multiplication!",
+                   "concepts_identified": ["multiplication", "correct calculation"], "confidence_score": 0.95}]
+    }
+
+
+def _math_area(length, width):
+    return {
+        "prompt": f"What is the area of a rectangle with length {length} and width {width}?",
+        "concepts": ["area", "rectangle", "multiplication"],
+        "rules": [{"type": "answer", "value": length * width,
+                   "feedback": f"That's right! The area is length × width = {length} × {width} = "
+                               f"{length * width} square units.",
+                   "concepts_identified": ["area", "correct calculation"], "confidence_score": 0.9}]
+    }
+
+
+def _math_linear(a, b, c):
+    x, remainder = divmod(c - b, a)
+    if remainder:
+        raise ValueError("linear questions have whole-number solutions")
+    return {
+        "prompt": f"Solve for x: {a}x + {b} = {c}",
+        "concepts": ["algebra", "equations", "solving for variable"],
+        "rules": [{"type": "answer", "value": x,
+                   "feedback": f"Correct! {a}x + {b} = {c} means x = {x}. Good algebra skills!",
+                   "concepts_identified": ["algebra", "equation solving"], "confidence_score": 0.9}]
+    }
+
+
+def _math_derivative(a, b, c):
+    square = "x²" if a == 1 else f"{a}x²"
+    linear = "x" if b == 1 else f"{b}x"
+    return {
+        "prompt": f"What is the derivative of f(x) = {square} + {linear} + {c}?",
+        "concepts": ["calculus", "derivatives", "polynomial"],
+        "rules": [{"type": "answer", "kind": "linear", "value": [2 * a, b],
+                   "feedback": f"Excellent! The derivative of f(x) = {square} + {linear} + {c} is {2 * a}x + {b}.",
+                   "concepts_identified": ["calculus", "derivatives"], "confidence_score": 0.95}]
+    }
+
+
+class MathQuestionFactory:
+    # Procedural Mathematics questions with precomputed answer keys. Each template draws
+    # its parameters in batches (vectorized with NumPy when it is installed), and each
+    # level keeps a buffer of complete questions that a background thread fills when the
+    # factory is created and refills once it runs low, so serving a question is a pop.
+    # Ids spell out the template and parameters ("math/linear/3,2,14"), so any process
+    # can rebuild a question, and its answer key, from its id alone; the process that
+    # served it finds it among the recently served ones instead.
+    SUBJECT = "Mathematics"
+    # name -> (level, build function, parameter ranges)
+    TEMPLATES = {
+        "add": (1, _math_addition, [(1, 9), (1, 9)]),
+        "mul": (1, _math_multiplication, [(2, 9), (2, 9)]),
+        "area": (2, _math_area, [(2, 20), (2, 20)]),
+        "linear": (3, _math_linear, [(2, 9), (1, 20), (1, 12)]),   # a, b, x
+        "derivative": (4, _math_derivative, [(1, 9), (1, 9), (0, 9)])
+    }
+    
+    FIRST_BATCH_SIZE = 256
+    
+    def __init__(self, batch_size=10000, seed=None, use_numpy=True, recent_questions=4096):
+        self.batch_size = batch_size
+        self.use_numpy = use_numpy
+        self.low_water = max(1, batch_size // 4)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # Only the refill thread draws from refill_rng, so it never shares self.rng
+        self.refill_rng = random.Random(None if seed is None else self.rng.randrange(2 ** 32))
+        self.levels = {}
+        for name, (level, _, _) in self.TEMPLATES.items():
+            self.levels.setdefault(level, []).append(name)
+        self.max_level = max(self.levels)
+        self.buffers = {level: deque() for level in self.levels}
+        self.refilling = {}          # level -> Future of the refill in progress
+        self.refiller = None
+        self.lock = threading.Lock()
+        self.generated = 0
+        # id -> Question of those served lately, so grading them does not rebuild them
+        self.recent = LRUCache(recent_questions)
+        for level in self.levels:
+            self.schedule_refill(level, min(batch_size, self.FIRST_BATCH_SIZE))
+    
+    @classmethod
+    def question(cls, question_id):
+        # Rebuild a generated question from its id; None for any other id
+        if not isinstance(question_id, str) or not question_id.startswith("math/"):
+            return None
+        try:
+            _, name, params = question_id.split("/")
+            _, build, _ = cls.TEMPLATES[name]
+            params = [int(param) for param in params.split(",")]
+            question = build(*params)
+        except (KeyError, ValueError, TypeError, ZeroDivisionError):
+            return None
+        return Question(question_id, question["prompt"], question["concepts"], question["rules"])
+    
+    def find(self, question_id):
+        # Like question(), looking among the questions served lately first
+        question = self.recent.get(question_id)
+        return question if question is not None else self.question(question_id)
+    
+    def parameter_rows(self, name, size, rng=None):
+        # size parameter tuples for a template, drawn with NumPy when available
+        rng = rng or self.rng
+        _, _, ranges = self.TEMPLATES[name]
+        np = None
+        if self.use_numpy:
+            try:
+                np = lazy_import("numpy")
+            except ImportError:
+                self.use_numpy = False
+        if np is not None:
+            generator = np.random.default_rng(None if self.seed is None else rng.randrange(2 ** 32))
+            columns = [generator.integers(low, high + 1, size) for low, high in ranges]
+            if name == "linear":
+                # Drawn as (a, b, x); asked as a*x + b = c
+                a, b, x = columns
+                columns = [a, b, a * x + b]
+            return list(zip(*[column.tolist() for column in columns]))
+        rows = [tuple(rng.randint(low, high) for low, high in ranges) for _ in range(size)]
+        if name == "linear":
+            rows = [(a, b, a * x + b) for a, b, x in rows]
+        return rows
+    
+    def generate_batch(self, level, size=None, rng=None):
+        # Questions for a level, shuffled across its templates
+        size = size or self.batch_size
+        rng = rng or self.rng
+        names = self.levels[level]
+        counts = [size // len(names) + (i < size % len(names)) for i in range(len(names))]
+        batch = []
+        for name, count in zip(names, counts):
+            _, build, _ = self.TEMPLATES[name]
+            for row in self.parameter_rows(name, count, rng):
+                question = build(*row)
+                batch.append(Question(f"math/{name}/{','.join(map(str, row))}", question["prompt"],
+                                      question["concepts"], question["rules"]))
+        rng.shuffle(batch)
+        return batch
+    
+    def refill(self, level, size=None):
+        batch = self.generate_batch(level, size, self.refill_rng)
+        self.buffers[level].extend(batch)
+        with self.lock:
+            self.generated += len(batch)
+            self.refilling.pop(level, None)
+    
+    def schedule_refill(self, level, size=None):
+        # The refill of level in progress, or a new one
+        with self.lock:
+            if level not in self.refilling:
+                if self.refiller is None:
+                    self.refiller = ThreadPoolExecutor(max_workers=1, thread_name_prefix="math-questions")
+                self.refilling[level] = self.refiller.submit(self.refill, level, size)
+            return self.refilling[level]
+    
+    def pop(self, difficulty):
+        # A fresh question at the highest level not above difficulty
+        level = max(1, min(difficulty, self.max_level))
+        buffer = self.buffers[level]
+        while True:
+            try:
+                question = buffer.popleft()
+                break
+            except IndexError:
+                # Only before the level's first batch is in, or if pops outrun refills
+                self.schedule_refill(level, min(self.batch_size, self.FIRST_BATCH_SIZE)).result()
+        if len(buffer) < self.low_water:
+            self.schedule_refill(level)
+        self.recent.put(question.id, question)
+        return question
+    
+    def close(self):
+        if self.refiller is not None:
+            self.refiller.shutdown(wait=True)
+
+
+class QuestionGenerator:
+    def __init__(self, nlp_analyzer=None, store=None, store_path=QUESTION_STORE_PATH, max_resident_questions=50000,
+                 procedural_math=True):
         self.current_question = None
-        self.question_bank = self._initialize_question_bank()
+        # The bank lives in a SQLite store seeded from _initialize_question_bank; each
+        # subject is read from it the first time it is asked for
+        if store is None:
+            store = QuestionStore(store_path, seed=self._initialize_question_bank())
+        self.store = store
+        self.question_bank = LazyQuestionBank(store, max_resident_questions)
+        # Weighted draws that do not repeat a question until its level is exhausted;
+        # callers serving several students pass their own session to generate_question
+        self.sampler = QuestionSampler(self.question_bank)
+        self.session = self.sampler.session()
+        # Mathematics questions are generated fresh from templates rather than drawn
+        # from the bank
+        self.math_questions = MathQuestionFactory() if procedural_math else None
+        
+        # Pre-lemmatize each loaded subject's concepts once so grading only does set
+        # lookups, and fit (or load) the analyzer's similarity model over the whole bank
+        self.nlp_analyzer = nlp_analyzer
+        self.concept_index = None
+        if nlp_analyzer:
+            self.concept_index = nlp_analyzer.concept_index
+            nlp_analyzer.rule_book.math_questions = self.math_questions
+            nlp_analyzer.index_bank(self.question_bank)
     
     def _initialize_question_bank(self):
-        # In a real app, this would load from a database or API
+        # Seed data for the question store (see QuestionStore.seed); more questions can
+        # be added with the import-questions command.
+        # Each question carries an id and declarative answer rules, tried in order;
+        # answers no rule accepts fall back to concept coverage (see RuleBook).
         return {
             "Mathematics": {
                 1: [
                     {
+                        "id": "math-addition-5-7",
                         "prompt": "What is 5 + 7?",
-                        "concepts": ["addition", "single digit", "basic math"]
+                        "concepts": ["addition", "single digit", "basic math"],
+                        "rules": [
+                            {
+                                "type": "numeric",
+                                "value": 12,
+                                "feedback": "That's right! 5 + 7 = 12. Great job with your addition.",
+                                "concepts_identified": ["addition", "correct calculation"],
+                                "confidence_score": 0.95
+                            }
+                        ]
                     },
                     {
+                        "id": "math-multiplication-8-4",
                         "prompt": "What is 8 × 4?",
-                        "concepts": ["multiplication", "single digit", "basic math"]
+                        "concepts": ["multiplication", "single digit", "basic math"],
+                        "rules": [
+                            {
+                                "type": "numeric",
+                                "value": 32,
+                                "feedback": "Correct! 8 × 4 = 32. You're good at multiplication!",
+                                "concepts_identified": ["multiplication", "correct calculation"],
+                                "confidence_score": 0.95
+                            }
+                        ]
                     }
                 ],
                 2: [
                     {
+                        "id": "math-area-rectangle-6-4",
                         "prompt": "What is the area of a rectangle with length 6 and width 4?",
-                        "concepts": ["area", "rectangle", "multiplication"]
+                        "concepts": ["area", "rectangle", "multiplication"],
+                        "rules": [
+                            {
+                                "type": "numeric",
+                                "value": 24,
+                                "feedback": "That's right! The area is length × width = 6 × 4 = 24 square units.",
+                                "concepts_identified": ["area", "correct calculation"],
+                                "confidence_score": 0.9
+                            }
+                        ]
                     }
                 ],
                 3: [
                     {
+                        "id": "math-linear-3x-2-14",
                         "prompt": "Solve for x: 3x + 2 = 14",
-                        "concepts": ["algebra", "equations", "solving for variable"]
+                        "concepts": ["algebra", "equations", "solving for variable"],
+                        "rules": [
+                            {
+                                "type": "numeric",
+                                "value": 4,
+                                "feedback": "Correct! 3x + 2 = 14 means x = 4. Good algebra skills!",
+                                "concepts_identified": ["algebra", "equation solving"],
+                                "confidence_score": 0.9
+                            }
+                        ]
                     }
                 ],
                 4: [
                     {
+                        "id": "math-derivative-x2-3x-2",
                         "prompt": "What is the derivative of f(x) = x² + 3x + 2?",
-                        "concepts": ["calculus", "derivatives", "polynomial"]
+                        "concepts": ["calculus", "derivatives", "polynomial"],
+                        "rules": [
+                            {
+                                "type": "regex",
+                                "pattern": r"2\s*x\s*\+\s*3",
+                                "feedback": "Excellent! The derivative of f(x) = x² + 3x + 2 is indeed 2x + 3.",
+                                "concepts_identified": ["calculus", "derivatives"],
+                                "confidence_score": 0.95
+                            }
+                        ]
                     }
                 ]
             },
             "Science": {
                 1: [
                     {
+                        "id": "science-states-of-matter",
                         "prompt": "What are the three states of matter?",
-                        "concepts": ["states of matter", "basic science", "solid", "liquid", "gas"]
+                        "concepts": ["states of matter", "basic science", "solid", "liquid", "gas"],
+                        "rules": [
+                            {
+                                "type": "keywords",
+                                "keywords": ["solid", "liquid", "gas"],
+                                "min_count": 3,
+                                "feedback": "Correct! The three states of matter are solid, liquid, and gas.",
+                                "concepts_identified": ["states of matter"],
+                                "confidence_score": 0.95
+                            }
+                        ]
                     }
                 ],
                 2: [
                     {
+                        "id": "science-photosynthesis-definition",
                         "prompt": "What is photosynthesis?",
-                        "concepts": ["photosynthesis", "plants", "biology", "energy"]
+                        "concepts": ["photosynthesis", "plants", "biology", "energy"],
+                        "rules": [
+                            {
+                                "type": "keywords",
+                                "keywords": ["light", "sunlight", "carbon dioxide", "water", "chlorophyll", "oxygen"],
+                                "min_count": 3,
+                                "feedback": "Great explanation of photosynthesis! You correctly identified how plants use light, carbon dioxide, and water to create energy.",
+                                "concepts_identified": ["photosynthesis", "plant biology"],
+                                "confidence_score": 0.85
+                            }
+                        ]
                     }
                 ],
                 3: [
                     {
+                        "id": "science-photosynthesis-process",
                         "prompt": "Explain how photosynthesis works.",
-                        "concepts": ["photosynthesis", "biology", "plants", "chlorophyll", "carbon dioxide", "water", "sunlight"]
+                        "concepts": ["photosynthesis", "biology", "plants", "chlorophyll", "carbon dioxide", "water", "sunlight"],
+                        "rules": [
+                            {
+                                "type": "keywords",
+                                "keywords": ["light", "sunlight", "carbon dioxide", "water", "chlorophyll", "oxygen"],
+                                "min_count": 3,
+                                "feedback": "Great explanation of photosynthesis! You correctly identified how plants use light, carbon dioxide, and water to create energy.",
+                                "concepts_identified": ["photosynthesis", "plant biology"],
+                                "confidence_score": 0.85
+                            }
+                        ]
                     }
                 ],
                 4: [
                     {
+                        "id": "science-quantum-entanglement",
                         "prompt": "Describe quantum entanglement.",
                         "concepts": ["quantum physics", "entanglement", "advanced physics", "particles"]
                     }
@@ -576,24 +2328,46 @@ class QuestionGenerator:
             "Programming": {
                 1: [
                     {
+                        "id": "programming-print",
                         "prompt": "What does the print function do in programming?",
-                        "concepts": ["print", "output", "basic programming", "display"]
+                        "concepts": ["print", "output", "basic programming", "display"],
+                        "rules": [
+                            {
+                                "type": "keywords",
+                                "keywords": ["output", "display", "screen", "console", "show"],
+                                "feedback": "That's right! The print function outputs or displays information to the user.",
+                                "concepts_identified": ["output", "basic programming"],
+                                "confidence_score": 0.9
+                            }
+                        ]
                     }
                 ],
                 2: [
                     {
+                        "id": "programming-variable",
                         "prompt": "What is a variable in programming?",
                         "concepts": ["variable", "data storage", "programming basics"]
                     }
                 ],
                 3: [
                     {
+                        "id": "programming-for-loop",
                         "prompt": "Explain the concept of a for loop.",
-                        "concepts": ["loops", "iteration", "control flow", "repetition"]
+                        "concepts": ["loops", "iteration", "control flow", "repetition"],
+                        "rules": [
+                            {
+                                "type": "keywords",
+                                "keywords": ["repeat", "iteration", "iterative", "multiple times", "cycle"],
+                                "feedback": "Good explanation of for loops! They're used to repeat operations for iteration.",
+                                "concepts_identified": ["loops", "iteration"],
+                                "confidence_score": 0.85
+                            }
+                        ]
                     }
                 ],
                 4: [
                     {
+                        "id": "programming-recursion",
                         "prompt": "Describe how recursion works and provide an example.",
                         "concepts": ["recursion", "functions", "advanced programming", "call stack"]
                     }
@@ -602,6 +2376,7 @@ class QuestionGenerator:
             "History": {
                 1: [
                     {
+                        "id": "history-first-us-president",
                         "prompt": "Who was the first President of the United States?",
                         "concepts": ["president", "united states", "george washington", "american history"]
                     }
@@ -610,6 +2385,7 @@ class QuestionGenerator:
             "Language Arts": {
                 1: [
                     {
+                        "id": "language-noun-vs-verb",
                         "prompt": "What is the difference between a noun and a verb?",
                         "concepts": ["noun", "verb", "grammar", "parts of speech"]
                     }
@@ -617,146 +2393,1273 @@ class QuestionGenerator:
             }
         }
     
-    def generate_question(self, subject, difficulty):
-        # Ensure difficulty is within available range
-        available_levels = list(self.question_bank.get(subject, {}).keys())
+    def select_question(self, subject, difficulty, session=None, scheduler=None, seen=None):
+        # The question generate_question would ask next, without making it current
+        # A question due for review (see ReviewScheduler) comes before a new one, and
+        # new ones avoid those in seen, the student's ScalableBloomFilter for the subject
+        if scheduler is not None:
+            question_id = scheduler.next_due(subject)
+            while question_id is not None:
+                found = self.find_question(question_id)
+                if found is not None:
+                    return found[1]
+                scheduler.drop(question_id)
+                question_id = scheduler.next_due(subject)
         
-        if not available_levels:
-            # Default generic question if subject not found
-            self.current_question = {
-                "prompt": f"Tell me what you know about {subject}.",
-                "concepts": [subject, "general knowledge"]
-            }
-            return self.current_question
+        if self.math_questions and subject == MathQuestionFactory.SUBJECT:
+            # Stored questions at the level come first; once the session has been through
+            # them, or the student has seen them all, the level's questions are generated
+            level = max(1, min(difficulty, self.math_questions.max_level))
+            session = session or self.session
+            if self.question_bank.get(subject, {}).get(level) and not session.exhausted(subject, level):
+                question = session.draw(subject, level, seen)
+                if seen is None or question.id not in seen:
+                    return question
+            question = self.math_questions.pop(difficulty)
+            if seen is not None:
+                for _ in range(SamplerSession.MAX_SEEN_SKIPS):
+                    if question.id not in seen:
+                        break
+                    question = self.math_questions.pop(difficulty)
+            return question
         
-        # Use highest available difficulty if requested is too high
-        actual_difficulty = min(difficulty, max(available_levels))
+        # Use the highest available difficulty if the requested one is too high
+        actual_difficulty = self.sampler.level_for(subject, difficulty) if subject in self.question_bank else None
         
-        # Find questions for this difficulty
-        questions = self.question_bank[subject][actual_difficulty]
+        if actual_difficulty is None:
+            # Default generic question if subject not found
+            return Question(None, f"Tell me what you know about {subject}.", [subject, "general knowledge"])
         
-        # Select random question
-        self.current_question = random.choice(questions)
+        return (session or self.session).draw(subject, actual_difficulty, seen)
+    
+    def generate_question(self, subject, difficulty, session=None, scheduler=None, seen=None):
+        self.current_question = self.select_question(subject, difficulty, session, scheduler, seen)
         return self.current_question
     
     def get_current_question_concepts(self):
-        return self.current_question.get("concepts", []) if self.current_question else []
+        return self.current_question.concepts if self.current_question else []
+    
+    def get_current_question_id(self):
+        return self.current_question.id if self.current_question else None
+    
+    def subjects(self):
+        return list(self.question_bank)
+    
+    def refresh(self):
+        # Pick up questions imported, edited or removed in the store since the last call
+        revision = self.question_bank.revision
+        changed = self.question_bank.refresh()
+        if self.nlp_analyzer and self.question_bank.revision != revision:
+            # The similarity model covers every subject, loaded here or not
+            self.nlp_analyzer.refresh_scorer(self.question_bank)
+        return changed
+    
+    def close(self):
+        # Stops the background refills of generated questions
+        if self.math_questions:
+            self.math_questions.close()
+    
+    def find_question(self, question_id):
+        # (subject, question) for a question id, or None
+        if self.math_questions:
+            question = self.math_questions.find(question_id)
+        else:
+            question = MathQuestionFactory.question(question_id)
+        if question is not None:
+            return MathQuestionFactory.SUBJECT, question
+        return self.question_bank.find(question_id)
 
 
-class NLPAnalyzer:
-    def __init__(self):
-        # Initialize NLP tools
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
+class ConceptIndex:
+    # GrokGame.py and grokGamified1.py keep their own trimmed copies of this index
+    def __init__(self, preprocess, adhoc_size=4096):
+        self.preprocess = preprocess
+        # concept -> frozenset of its lemmas, for concepts of the bank
+        self.concept_lemmas = {}
+        # tuple of a bank question's concepts -> {lemma: [concepts of that question using it]}
+        self.question_entries = {}
+        # The same for concepts from outside the bank (the generic fallback question,
+        # callers passing their own), in LRU caches so they cannot grow without bound
+        self.adhoc_lemmas = LRUCache(adhoc_size)
+        self.adhoc_entries = LRUCache(adhoc_size)
     
-    def preprocess_text(self, text):
-        # Tokenize and lemmatize
-        tokens = word_tokenize(text.lower())
-        return [
-            self.lemmatizer.lemmatize(word) 
-            for word in tokens 
-            if word.isalpha() and word not in self.stop_words
-        ]
+    def index_bank(self, question_bank):
+        # A lazy bank is indexed a subject at a time as subjects load
+        levels_list = (
+            [levels for _, levels in question_bank.loaded()] if isinstance(question_bank, LazyQuestionBank)
+            else question_bank.values()
+        )
+        for levels in levels_list:
+            for questions in levels.values():
+                for question in questions:
+                    self.get(question.get("concepts", []), pin=True)
     
-    def analyze_response(self, user_response, subject, expected_concepts):
-        # Preprocess user response
-        processed_response = self.preprocess_text(user_response)
-        
-        # Match keywords (basic implementation)
-        matched_concepts = []
-        for concept in expected_concepts:
-            concept_words = self.preprocess_text(concept)
-            if any(word in processed_response for word in concept_words):
-                matched_concepts.append(concept)
-        
-        # Calculate match percentage
-        match_percentage = len(matched_concepts) / len(expected_concepts) if expected_concepts else 0
-        
-        # Subject-specific analysis
-        if subject == "Mathematics":
-            # Check for specific number answers
-            if "addition" in expected_concepts and "12" in user_response:
-                return {
-                    "is_correct": True,
-                    "feedback": "That's right! 5 + 7 = 12. Great job with your addition.",
-                    "concepts_identified": ["addition", "correct calculation"],
-                    "confidence_score": 0.95
-                }
-            elif "multiplication" in expected_concepts and "32" in user_response:
-                return {
-                    "is_correct": True,
-                    "feedback": "Correct! 8 × 4 = 32. You're good at multiplication!",
-                    "concepts_identified": ["multiplication", "correct calculation"],
-                    "confidence_score": 0.95
-                }
-            elif "area" in expected_concepts and "24" in user_response:
-                return {
-                    "is_correct": True,
-                    "feedback": "That's right! The area is length × width = 6 × 4 = 24 square units.",
-                    "concepts_identified": ["area", "correct calculation"],
-                    "confidence_score": 0.9
-                }
-            elif "algebra" in expected_concepts and ("4" in user_response or "x = 4" in user_response.lower()):
-                return {
-                    "is_correct": True,
-                    "feedback": "Correct! 3x + 2 = 14 means x = 4. Good algebra skills!",
-                    "concepts_identified": ["algebra", "equation solving"],
-                    "confidence_score": 0.9
-                }
-            elif "calculus" in expected_concepts and "2x + 3" in user_response:
-                return {
-                    "is_correct": True,
-                    "feedback": "Excellent! The derivative of f(x) = x² + 3x + 2 is indeed 2x + 3.",
-                    "concepts_identified": ["calculus", "derivatives"],
-                    "confidence_score": 0.95
-                }
+    def remove(self, levels):
+        for questions in levels.values():
+            for question in questions:
+                self.question_entries.pop(tuple(question.get("concepts", [])), None)
+    
+    def concept_words(self, concept, pin=False):
+        lemmas = self.concept_lemmas.get(concept)
+        if lemmas is None and not pin:
+            lemmas = self.adhoc_lemmas.get(concept)
+        if lemmas is None:
+            lemmas = frozenset(self.preprocess(concept))
+            if pin:
+                self.concept_lemmas[concept] = lemmas
+            else:
+                self.adhoc_lemmas.put(concept, lemmas)
+        return lemmas
+    
+    def get(self, concepts, pin=False):
+        # Bank questions are indexed pinned (pin=True); other concept lists are indexed
+        # on first use and kept while they are in use
+        key = tuple(concepts)
+        entry = self.question_entries.get(key)
+        if entry is None and not pin:
+            entry = self.adhoc_entries.get(key)
+        if entry is None:
+            entry = {}
+            for concept in key:
+                for lemma in self.concept_words(concept, pin):
+                    entry.setdefault(lemma, []).append(concept)
+            if pin:
+                self.question_entries[key] = entry
+            else:
+                self.adhoc_entries.put(key, entry)
+        return entry
+    
+    def match(self, processed_response, concepts):
+        # Single pass over the response tokens, keeping the question's concept order
+        lemma_map = self.get(concepts)
+        matched = set()
+        for word in processed_response:
+            hits = lemma_map.get(word)
+            if hits:
+                matched.update(hits)
+        return [concept for concept in concepts if concept in matched]
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        # maxsize is the number of entries kept; 0 disables caching
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Bump when a grading change should invalidate every cached result
+GRADER_VERSION = "assistant-2"
+# One cache file shared by the main app, GrokGame.py and the grading workers; each
+# grader's entries are kept apart by its GRADER_VERSION
+GRADE_CACHE_PATH = "data/grading_cache.sqlite3"
+
+
+def normalize_response(user_response):
+    # Answers that differ only in surrounding or repeated whitespace grade the same
+    return " ".join(user_response.split())
+
+
+class GradeCache:
+    # Grading results keyed by (grader version, question fingerprint, normalized
+    # response hash). An LRU memory tier sits in front of an optional SQLite tier that
+    # survives restarts; the SQLite tier keeps roughly the newest max_disk_entries.
+    def __init__(self, maxsize=10000, path=None, max_disk_entries=1000000):
+        self.memory = LRUCache(maxsize)
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.lock = threading.Lock()
+        self.connection = None
+        self.disk_hits = 0
+        self.disk_writes = 0
+    
+    def _connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = lazy_import("sqlite3").connect(
+                self.path, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            # WAL lets the app variants and grading workers read while another writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS grades (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+            self.connection = connection
+        return self.connection
+    
+    def get(self, key):
+        result = self.memory.get(key)
+        if result is not None or not self.path:
+            return result
+        with self.lock:
+            row = self._connect().execute("SELECT result FROM grades WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[0])
+        self.disk_hits += 1
+        self.memory.put(key, result)
+        return result
+    
+    def put(self, key, result):
+        self.put_many([(key, result)])
+    
+    def put_many(self, entries):
+        for key, result in entries:
+            self.memory.put(key, result)
+        if not self.path or not entries:
+            return
+        rows = [(key, json.dumps(result)) for key, result in entries]
+        with self.lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            connection.executemany("INSERT OR REPLACE INTO grades (key, result) VALUES (?, ?)", rows)
+            # Rowids grow with every write, so trimming the lowest ones drops the oldest grades
+            before = self.disk_writes // 1000
+            self.disk_writes += len(rows)
+            if self.disk_writes // 1000 != before:
+                connection.execute(
+                    "DELETE FROM grades WHERE rowid <= (SELECT MAX(rowid) FROM grades) - ?",
+                    (self.max_disk_entries,)
+                )
+            connection.execute("COMMIT")
+    
+    def clear(self):
+        self.memory.clear()
+        if self.path:
+            with self.lock:
+                self._connect().execute("DELETE FROM grades")
+    
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+    
+    def stats(self):
+        return dict(self.memory.stats(), disk_hits=self.disk_hits, disk_writes=self.disk_writes)
+
+
+class LatencyHistogram:
+    # Log-spaced latency buckets from 1 us to about a minute and a half; each bucket is
+    # ~41% wider than the last, so percentiles read from it are within that factor
+    BOUNDS_MS = [0.001 * 2 ** (i / 2) for i in range(54)]
+    BOUNDS_S = [bound / 1000 for bound in BOUNDS_MS]
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS_S, seconds)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+    
+    def record_many(self, samples):
+        # Sorting once and cutting the run at each bound is much cheaper than placing
+        # every sample on its own
+        samples = sorted(samples)
+        counts = self.counts
+        previous = 0
+        for index, bound in enumerate(self.BOUNDS_S):
+            position = bisect.bisect_right(samples, bound, previous)
+            counts[index] += position - previous
+            previous = position
+        counts[-1] += len(samples) - previous
+        self.count += len(samples)
+        self.total_ms += sum(samples) * 1000
+        self.max_ms = max(self.max_ms, samples[-1] * 1000)
+    
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the requested rank
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.BOUNDS_MS[index] if index < len(self.BOUNDS_MS) else self.max_ms
+        return 0.0
+    
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {f"{bound:.3g}": count for bound, count in zip(self.BOUNDS_MS, self.counts) if count}
+        }
+
+
+class StageTimer:
+    # Per-stage latency histograms for NLPAnalyzer. The analyzer's hot paths check
+    # stage_timer and skip all timing when it is None, so disabled instrumentation costs
+    # one local truth test per stage. When enabled, samples are appended to a per-stage
+    # buffer and folded into the histograms in bulk. Counts can race slightly when
+    # several threads grade at once; nothing is locked to keep recording cheap.
+    FOLD_EVERY = 1024
+    
+    def __init__(self):
+        self.samples = {}
+        self.histograms = {}
+        self.dump_stop = threading.Event()
+    
+    def record(self, stage, seconds):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.add_stage(stage)
+        samples.append(seconds)
+        if len(samples) >= self.FOLD_EVERY:
+            self.fold(stage)
+    
+    def lap(self, stage, since):
+        # Record the time since `since` for a stage and return the new mark
+        now = time.perf_counter()
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.add_stage(stage)
+        samples.append(now - since)
+        if len(samples) >= self.FOLD_EVERY:
+            self.fold(stage)
+        return now
+    
+    def add_stage(self, stage):
+        self.histograms.setdefault(stage, LatencyHistogram())
+        return self.samples.setdefault(stage, [])
+    
+    def fold(self, stage):
+        samples, self.samples[stage] = self.samples[stage], []
+        if samples:
+            self.histograms[stage].record_many(samples)
+    
+    def stats(self):
+        for stage in list(self.samples):
+            self.fold(stage)
+        return {stage: histogram.snapshot() for stage, histogram in self.histograms.items()}
+    
+    def summary(self):
+        for stage in list(self.samples):
+            self.fold(stage)
+        lines = [f"{'stage':<18} {'count':>9} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}"]
+        for stage, histogram in self.histograms.items():
+            lines.append(f"{stage:<18} {histogram.count:>9,} {histogram.total_ms * 1000 / histogram.count:>9.1f} "
+                         f"{histogram.percentile(0.5) * 1000:>9.1f} {histogram.percentile(0.99) * 1000:>9.1f}")
+        return "\n".join(lines)
+    
+    def start_dump(self, interval, path=None):
+        # Every interval seconds, print the summary or write the full stats as JSON to path
+        def dump():
+            while not self.dump_stop.wait(interval):
+                if path:
+                    temp_path = f"{path}.tmp"
+                    with open(temp_path, "w") as f:
+                        json.dump(self.stats(), f, indent=2)
+                    os.replace(temp_path, path)
+                else:
+                    print(self.summary())
+        threading.Thread(target=dump, name="stage-stats", daemon=True).start()
+    
+    def stop_dump(self):
+        self.dump_stop.set()
+
+
+def bank_concept_lists(question_bank):
+    # Every question's concepts; a lazy bank reads them from its store without loading subjects
+    if isinstance(question_bank, LazyQuestionBank):
+        return question_bank.store.concept_lists()
+    return [
+        question.get("concepts", [])
+        for levels in question_bank.values()
+        for questions in levels.values()
+        for question in questions
+    ]
+
+
+class SimilarityScorer:
+    # Weights a response by how much of a question's concept vocabulary it covers,
+    # using TF-IDF or BM25 weights learned over every question in the bank. Rare,
+    # discriminative lemmas ("chlorophyll") count for more than common ones ("basic").
+    # The score is reported as confidence_score only; whether an answer is correct is
+    # decided by the rules and concept coverage, never by this score.
+    def __init__(self, method="bm25", k1=1.2, b=0.75, model_path="data/similarity_model.json",
+                 extra_documents=1024):
+        self.method = method
+        self.k1 = k1
+        self.b = b
+        self.model_path = model_path
+        self.fingerprint = None   # hash of the concept lists the model was fitted on
+        self.source = None        # store id and revision the model is current for
+        self.vocabulary = {}   # lemma -> term id
+        self.idf = []          # term id -> idf weight
+        self.documents = {}    # tuple of a question's concepts -> ({term id: weight}, self-score)
+        # Vectors of concept tuples outside the bank (e.g. the generic fallback)
+        self.extra_documents_size = extra_documents
+        self.extra_documents = LRUCache(extra_documents)
+        # Held while a model is swapped in, so score() never mixes two models
+        self.lock = threading.Lock()
+    
+    def bank_source(self, question_bank):
+        # Cheap identity of a store-backed bank's contents: a start with an unchanged
+        # store loads the saved model without reading every question's concepts
+        if isinstance(question_bank, LazyQuestionBank):
+            return json.dumps([self.method, self.k1, self.b, question_bank.store.version()])
+        return None
+    
+    def bank_fingerprint(self, concept_lists):
+        payload = json.dumps([self.method, self.k1, self.b, sorted(concept_lists)])
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    def load_or_fit(self, question_bank, preprocess):
+        # Also called after the bank reloads; returns at once if the store has not changed
+        source = self.bank_source(question_bank)
+        if source is not None:
+            if source == self.source:
+                return
+            if self.model_path and self.load("source", source):
+                return
+        concept_lists = bank_concept_lists(question_bank)
+        fingerprint = self.bank_fingerprint(concept_lists)
+        if fingerprint != self.fingerprint and not (self.model_path and self.load("fingerprint", fingerprint)):
+            self.fit(concept_lists, preprocess)
+            self.fingerprint = fingerprint
+        self.source = source
+        if self.model_path:
+            self.save()
+    
+    def fit(self, concept_lists, preprocess):
+        corpus = {}
+        for concepts in concept_lists:
+            concepts = tuple(concepts)
+            if concepts not in corpus:
+                corpus[concepts] = [lemma for concept in concepts for lemma in preprocess(concept)]
         
-        elif subject == "Science":
-            if "states of matter" in expected_concepts:
-                if all(state in user_response.lower() for state in ["solid", "liquid", "gas"]):
-                    return {
-                        "is_correct": True,
-                        "feedback": "Correct! The three states of matter are solid, liquid, and gas.",
-                        "concepts_identified": ["states of matter"],
-                        "confidence_score": 0.95
-                    }
-            elif "photosynthesis" in expected_concepts:
-                photosynthesis_keywords = ["light", "sunlight", "carbon dioxide", "water", "chlorophyll", "oxygen"]
-                if sum(keyword in user_response.lower() for keyword in photosynthesis_keywords) >= 3:
-                    return {
-                        "is_correct": True,
-                        "feedback": "Great explanation of photosynthesis! You correctly identified how plants use light, carbon dioxide, and water to create energy.",
-                        "concepts_identified": ["photosynthesis", "plant biology"],
-                        "confidence_score": 0.85
-                    }
+        document_frequency = {}
+        for lemmas in corpus.values():
+            for lemma in set(lemmas):
+                document_frequency[lemma] = document_frequency.get(lemma, 0) + 1
         
-        elif subject == "Programming":
-            if "print" in expected_concepts:
-                output_keywords = ["output", "display", "screen", "console", "show"]
-                if any(keyword in user_response.lower() for keyword in output_keywords):
-                    return {
-                        "is_correct": True,
-                        "feedback": "That's right! The print function outputs or displays information to the user.",
-                        "concepts_identified": ["output", "basic programming"],
-                        "confidence_score": 0.9
-                    }
-            elif "loops" in expected_concepts:
-                loop_keywords = ["repeat", "iteration", "iterative", "multiple times", "cycle"]
-                if any(keyword in user_response.lower() for keyword in loop_keywords):
-                    return {
-                        "is_correct": True,
-                        "feedback": "Good explanation of for loops! They're used to repeat operations for iteration.",
-                        "concepts_identified": ["loops", "iteration"],
-                        "confidence_score": 0.85
-                    }
+        with self.lock:
+            self.vocabulary = {}
+            self.idf = []
+            total = len(corpus)
+            for lemma, frequency in sorted(document_frequency.items()):
+                self.vocabulary[lemma] = len(self.idf)
+                if self.method == "bm25":
+                    self.idf.append(math.log(1 + (total - frequency + 0.5) / (frequency + 0.5)))
+                else:
+                    self.idf.append(math.log((1 + total) / (1 + frequency)) + 1)
+            
+            self.average_length = sum(len(lemmas) for lemmas in corpus.values()) / total if total else 0
+            self.documents = {concepts: self._vectorize(lemmas) for concepts, lemmas in corpus.items()}
+            self.extra_documents = LRUCache(self.extra_documents_size)
+    
+    def _vectorize(self, lemmas):
+        counts = {}
+        for lemma in lemmas:
+            term = self.vocabulary.get(lemma)
+            if term is not None:
+                counts[term] = counts.get(term, 0) + 1
+        
+        vector = {}
+        for term, frequency in counts.items():
+            if self.method == "bm25":
+                length_norm = 1 - self.b + self.b * len(lemmas) / (self.average_length or 1)
+                vector[term] = self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            else:
+                vector[term] = self.idf[term] * frequency
+        
+        # Score of a response containing every term, used to scale scores into 0..1
+        self_score = sum(weight * self.idf[term] for term, weight in vector.items())
+        return vector, self_score
+    
+    def score(self, processed_response, concepts, preprocess=None):
+        key = tuple(concepts)
+        with self.lock:
+            vocabulary, idf, documents, extra_documents = self.vocabulary, self.idf, self.documents, self.extra_documents
+        document = documents.get(key) or extra_documents.get(key)
+        if document is None:
+            if preprocess is None:
+                return 0.0
+            # Questions outside the bank are scored against the bank's vocabulary
+            lemmas = [lemma for concept in key for lemma in preprocess(concept)]
+            with self.lock:
+                vocabulary, idf, extra_documents = self.vocabulary, self.idf, self.extra_documents
+                document = self._vectorize(lemmas)
+            extra_documents.put(key, document)
         
-        # Generic evaluation based on concept matching
-        if match_percentage >= 0.7:
+        vector, self_score = document
+        if not self_score:
+            return 0.0
+        
+        # Sparse dot product of the binary response vector with the question vector
+        total = 0.0
+        for term in {vocabulary.get(lemma) for lemma in processed_response}:
+            weight = vector.get(term)
+            if weight:
+                total += weight * idf[term]
+        return total / self_score
+    
+    def save(self):
+        directory = os.path.dirname(self.model_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        model = {
+            "fingerprint": self.fingerprint,
+            "source": self.source,
+            "method": self.method,
+            "average_length": self.average_length,
+            "vocabulary": self.vocabulary,
+            "idf": self.idf,
+            "documents": [
+                [list(concepts), {str(term): weight for term, weight in vector.items()}, self_score]
+                for concepts, (vector, self_score) in self.documents.items()
+            ]
+        }
+        # Write then rename, so concurrent graders never read a partial model
+        temp_path = f"{self.model_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(model, f)
+        os.replace(temp_path, self.model_path)
+    
+    def load(self, key, value):
+        # Loads the saved model if its fingerprint or source (key) is value
+        try:
+            with open(self.model_path, "r") as f:
+                model = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if model.get(key) != value:
+            return False
+        
+        documents = {
+            tuple(concepts): ({int(term): weight for term, weight in vector.items()}, self_score)
+            for concepts, vector, self_score in model["documents"]
+        }
+        with self.lock:
+            self.fingerprint = model["fingerprint"]
+            self.source = model.get("source")
+            self.average_length = model["average_length"]
+            self.vocabulary = model["vocabulary"]
+            self.idf = model["idf"]
+            self.documents = documents
+            self.extra_documents = LRUCache(self.extra_documents_size)
+        return True
+
+
+class KeywordMatcher:
+    # Finds every keyword occurrence, overlaps included. Each keyword is searched with
+    # str.find, which runs in C but costs a pass over the text per keyword. From
+    # AUTOMATON_MIN_KEYWORDS keywords on, an Aho-Corasick automaton finds them all in one
+    # Python-level pass instead; below that (every rule in the bank) the passes of
+    # str.find are cheaper, on long essays and transcripts too.
+    AUTOMATON_MIN_KEYWORDS = 96
+    
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+        self.transitions = None
+        if len(self.keywords) >= self.AUTOMATON_MIN_KEYWORDS:
+            self._build_automaton()
+    
+    def _build_automaton(self):
+        # A trie of the keywords whose states also carry the transitions of their
+        # failure states, so matching is one dict lookup per character.
+        # outputs[state] lists (keyword, len - 1) for each keyword ending there
+        trie = [{}]
+        outputs = [()]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                following = trie[state].get(char)
+                if following is None:
+                    following = trie[state][char] = len(trie)
+                    trie.append({})
+                    outputs.append(())
+                state = following
+            outputs[state] += ((keyword, len(keyword) - 1),)
+        
+        failures = [0] * len(trie)
+        transitions = [None] * len(trie)
+        transitions[0] = trie[0]
+        pending = deque(trie[0].values())
+        while pending:
+            state = pending.popleft()
+            transitions[state] = {**transitions[failures[state]], **trie[state]}
+            for char, following in trie[state].items():
+                if state:
+                    failures[following] = transitions[failures[state]].get(char, 0)
+                outputs[following] += outputs[failures[following]]
+                pending.append(following)
+        self.transitions = transitions
+        self.outputs = outputs
+    
+    def matches(self, text):
+        # text must already be lowercased; keyword -> positions, for the keywords present
+        if self.transitions is not None:
+            return self._automaton_matches(text)
+        found = {}
+        for keyword in self.keywords:
+            start = text.find(keyword)
+            if start < 0:
+                continue
+            positions = found[keyword] = []
+            while start >= 0:
+                positions.append(start)
+                start = text.find(keyword, start + 1)
+        return found
+    
+    def _automaton_matches(self, text):
+        transitions = self.transitions
+        outputs = self.outputs
+        found = {}
+        state = 0
+        for end, char in enumerate(text):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                for keyword, back in outputs[state]:
+                    positions = found.get(keyword)
+                    if positions is None:
+                        positions = found[keyword] = []
+                    positions.append(end - back)
+        # Keywords in the order given, like the str.find path
+        return {keyword: found[keyword] for keyword in self.keywords if keyword in found}
+
+
+# Answer rules. Each question in the bank lists declarative rules that compile once
+# into matcher objects; the RuleBook dispatches to a question's rules by id.
+NUMBER_PATTERN = re.compile(r"(?<![\d.])-?\d+(?:\.\d+)?")
+
+
+class AnswerRule:
+    def __init__(self, spec):
+        self.feedback = spec["feedback"]
+        self.concepts_identified = list(spec.get("concepts_identified", []))
+        self.confidence_score = spec.get("confidence_score", 0.9)
+    
+    def accepts(self, user_response, lowered_response):
+        raise NotImplementedError
+    
+    def result(self):
+        return {
+            "is_correct": True,
+            "feedback": self.feedback,
+            "concepts_identified": list(self.concepts_identified),
+            "confidence_score": self.confidence_score
+        }
+
+
+class NumericRule(AnswerRule):
+    # Correct when any number in the answer equals the expected value
+    def __init__(self, spec, keyword_matcher):
+        super().__init__(spec)
+        self.value = float(spec["value"])
+        self.tolerance = spec.get("tolerance", 1e-9)
+    
+    def accepts(self, user_response, lowered_response):
+        return any(abs(float(number) - self.value) <= self.tolerance
+                   for number in NUMBER_PATTERN.findall(user_response))
+
+
+class KeywordRule(AnswerRule):
+    # Correct when at least min_count distinct keywords appear in the answer
+    def __init__(self, spec, keyword_matcher):
+        super().__init__(spec)
+        self.matcher = keyword_matcher(spec["keywords"])
+        self.min_count = spec.get("min_count", 1)
+    
+    def accepts(self, user_response, lowered_response):
+        return len(self.matcher.matches(lowered_response)) >= self.min_count
+
+
+class RegexRule(AnswerRule):
+    def __init__(self, spec, keyword_matcher):
+        super().__init__(spec)
+        flags = re.IGNORECASE if spec.get("ignore_case", True) else 0
+        self.pattern = re.compile(spec["pattern"], flags)
+    
+    def accepts(self, user_response, lowered_response):
+        return self.pattern.search(user_response) is not None
+
+
+LINEAR_TERM = r"(?:\d+(?:\.\d+)?\s*\*?\s*x|x|\d+(?:\.\d+)?)"
+LINEAR_EXPRESSION_PATTERN = re.compile(rf"-?\s*{LINEAR_TERM}(?:\s*[+-]\s*{LINEAR_TERM})*(?=[\s.!]*$)")
+LINEAR_TERM_PATTERN = re.compile(rf"([+-]?)\s*({LINEAR_TERM})")
+
+
+def parse_linear(text):
+    # Coefficients (a, b) of the expression a*x + b an answer ends on, e.g. "it is 2x + 3"
+    # or "f'(x) = 3 + 2x"; None if it does not end on one
+    match = LINEAR_EXPRESSION_PATTERN.search(text.lower().rsplit("=", 1)[-1])
+    if match is None:
+        return None
+    a = b = 0.0
+    for sign, term in LINEAR_TERM_PATTERN.findall(match.group()):
+        if term.endswith("x"):
+            digits = term[:-1].rstrip(" *")
+            value = float(digits) if digits else 1.0
+            a += -value if sign == "-" else value
+        else:
+            b += -float(term) if sign == "-" else float(term)
+    return a, b
+
+
+class AnswerKeyRule(AnswerRule):
+    # Compares the answer a response ends on with a precomputed key: the last number
+    # for kind "number", the coefficients [a, b] of a*x + b for kind "linear"
+    def __init__(self, spec, keyword_matcher):
+        super().__init__(spec)
+        self.kind = spec.get("kind", "number")
+        if self.kind not in ("number", "linear"):
+            raise ValueError(f"Unknown answer key kind {self.kind!r}")
+        self.value = spec["value"]
+        self.tolerance = spec.get("tolerance", 1e-9)
+    
+    def accepts(self, user_response, lowered_response):
+        if self.kind == "number":
+            numbers = NUMBER_PATTERN.findall(user_response)
+            return bool(numbers) and abs(float(numbers[-1]) - self.value) <= self.tolerance
+        coefficients = parse_linear(lowered_response)
+        return coefficients is not None and all(
+            abs(found - expected) <= self.tolerance for found, expected in zip(coefficients, self.value)
+        )
+
+
+RULE_TYPES = {
+    "numeric": NumericRule,
+    "keywords": KeywordRule,
+    "regex": RegexRule,
+    "answer": AnswerKeyRule
+}
+
+
+class RuleSet:
+    def __init__(self, rules, coverage_threshold=0.7, fingerprint="default"):
+        self.rules = rules
+        self.coverage_threshold = coverage_threshold
+        # Identifies the question content the rules were compiled from; cached grades
+        # are keyed on it so editing a question's concepts or rules invalidates them
+        self.fingerprint = fingerprint
+    
+    def evaluate(self, analyzer, user_response, processed_response, expected_concepts):
+        if self.rules:
+            timer = analyzer.stage_timer
+            if timer:
+                start = time.perf_counter()
+            lowered_response = user_response.lower()
+            for rule in self.rules:
+                if rule.accepts(user_response, lowered_response):
+                    if timer:
+                        timer.record("rules", time.perf_counter() - start)
+                    return rule.result()
+            if timer:
+                timer.record("rules", time.perf_counter() - start)
+        # Fallback concept coverage
+        return analyzer.evaluate_concept_coverage(processed_response, expected_concepts, self.coverage_threshold)
+
+
+class RuleBook:
+    def __init__(self, keyword_matcher):
+        self.keyword_matcher = keyword_matcher
+        self.by_id = {}
+        # (subject, concepts) -> rules, for callers that only know a question's concepts
+        self.by_question = {}
+        self.default = RuleSet([])
+        # A lazy bank's rules compile as its subjects load, or on first lookup
+        self.bank = None
+        self.indexed_subjects = set()
+        # Rules of generated questions, compiled from their ids as they are graded
+        self.generated = LRUCache(10000)
+        # The MathQuestionFactory serving questions in this process, if any
+        self.math_questions = None
+    
+    def compile(self, question):
+        rules = []
+        coverage_threshold = 0.7
+        for spec in question.get("rules", []):
+            if spec["type"] == "concepts":
+                coverage_threshold = spec.get("threshold", coverage_threshold)
+            elif spec["type"] in RULE_TYPES:
+                rules.append(RULE_TYPES[spec["type"]](spec, self.keyword_matcher))
+            else:
+                raise ValueError(f"Unknown answer rule type {spec['type']!r} in question {question.get('id')!r}")
+        content = json.dumps([question.get("concepts", []), question.get("rules", [])], sort_keys=True)
+        return RuleSet(rules, coverage_threshold, hashlib.sha1(content.encode("utf-8")).hexdigest())
+    
+    def index_bank(self, question_bank):
+        if isinstance(question_bank, LazyQuestionBank):
+            self.bank = question_bank
+            question_bank = dict(question_bank.loaded())
+        for subject, levels in question_bank.items():
+            self.indexed_subjects.add(subject)
+            for questions in levels.values():
+                for question in questions:
+                    self.add(subject, question)
+    
+    def add(self, subject, question):
+        rule_set = self.compile(question)
+        if question.get("id") is not None:
+            self.by_id[question["id"]] = rule_set
+        self.by_question.setdefault((subject, tuple(question.get("concepts", []))), rule_set)
+        return rule_set
+    
+    def remove(self, subject, levels):
+        self.indexed_subjects.discard(subject)
+        for questions in levels.values():
+            for question in questions:
+                self.by_id.pop(question.get("id"), None)
+                self.by_question.pop((subject, tuple(question.get("concepts", []))), None)
+    
+    def update(self, subject, old, new):
+        # One question edited, added (old is None) or deleted (new is None) in the bank
+        if old is not None:
+            rule_set = self.by_id.pop(old.get("id"), None)
+            key = (subject, tuple(old.get("concepts", [])))
+            if rule_set is None or self.by_question.get(key) is rule_set:
+                self.by_question.pop(key, None)
+        if new is not None and subject in self.indexed_subjects:
+            self.add(subject, new)
+    
+    def lookup(self, question_id, subject, expected_concepts):
+        if question_id is not None:
+            rule_set = self.by_id.get(question_id) or self.generated.get(question_id)
+            if rule_set is None:
+                if self.math_questions:
+                    question = self.math_questions.find(question_id)
+                else:
+                    question = MathQuestionFactory.question(question_id)
+                if question is not None:
+                    rule_set = self.compile(question)
+                    self.generated.put(question_id, rule_set)
+            if rule_set is None and self.bank is not None:
+                found = self.bank.find(question_id)
+                if found:
+                    rule_set = self.add(*found)
+            if rule_set is not None:
+                return rule_set
+        key = (subject, tuple(expected_concepts))
+        rule_set = self.by_question.get(key)
+        if rule_set is None and self.bank is not None and subject not in self.indexed_subjects and subject in self.bank:
+            self.index_bank({subject: self.bank[subject]})
+            rule_set = self.by_question.get(key)
+        return rule_set if rule_set is not None else self.default
+
+
+# Fast tokenizer that needs no Punkt data. It mirrors the tokens word_tokenize produces
+# for the alphabetic words we keep: punctuation splits words, hyphenated or mixed tokens
+# ("well-known", "x=4") stay whole, clitics ("n't", "'s", "'re", ...) and trailing
+# periods are split off. Quotes around a word ('solid', ''gas'', ‘water’) are split
+# off too, except a leading one that starts a clitic ("'s", "'re").
+TOKEN_BOUNDARY = r"""\s,;:!?()\[\]{}"“”‘’<>"""
+TOKEN_PATTERN = re.compile(
+    r"(?:''|'(?!(?i:re|ve|ll|m|t|s|d|n)\b)(?=\w))?"
+    rf"([^{TOKEN_BOUNDARY}]+?)(?:n't|'(?:s|re|ve|ll|d|m))?'{{0,2}}\.*(?=[{TOKEN_BOUNDARY}]|$)"
+)
+
+
+def regex_tokenize(text):
+    return TOKEN_PATTERN.findall(text)
+
+
+TOKENIZERS = {
+    "nltk": nltk_word_tokenize,
+    "regex": regex_tokenize
+}
+
+
+# Compact snapshot of the NLP data grading needs: the stopword set and WordNet lemmas
+# for the question-bank and observed student vocabulary. Built by the build-snapshot
+# command; loads in milliseconds instead of reading WordNet on the first answer.
+NLP_SNAPSHOT_PATH = "data/nlp_snapshot.pickle"
+NLP_SNAPSHOT_VERSION = 1
+
+
+def load_nlp_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    if snapshot.get("version") != NLP_SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def read_answer_texts(path):
+    # Student answers from a JSONL export ({"response": ...} per line) or a plain text file
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                yield json.loads(line).get("response", "")
+            else:
+                yield line
+
+
+def build_nlp_snapshot(path=NLP_SNAPSHOT_PATH, answer_files=(), tokenizer="regex"):
+    analyzer = NLPAnalyzer(tokenizer=tokenizer, snapshot_path=None, lemma_cache_size=0, text_cache_size=0)
+    question_generator = QuestionGenerator()
+    analyzer.load_resources()
+    
+    texts = []
+    for levels in question_generator.question_bank.values():
+        for questions in levels.values():
+            for question in questions:
+                texts.append(question["prompt"])
+                texts.extend(question.get("concepts", []))
+                for rule in question.get("rules", []):
+                    texts.extend(rule.get("keywords", []))
+    texts.extend(PARITY_CORPUS)
+    
+    def all_texts():
+        yield from texts
+        for answer_file in answer_files:
+            yield from read_answer_texts(answer_file)
+    
+    lemmas = {}
+    for text in all_texts():
+        for word in analyzer.tokenize(text.lower()):
+            if word.isalpha() and word not in analyzer.stop_words and word not in lemmas:
+                lemmas[word] = analyzer.lemmatize(word)
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump({
+            "version": NLP_SNAPSHOT_VERSION,
+            "stop_words": sorted(analyzer.stop_words),
+            "lemmas": lemmas
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Wrote {path}: {len(analyzer.stop_words)} stopwords, {len(lemmas)} lemmas "
+          f"({os.path.getsize(path) / 1024:.1f} KiB)")
+
+
+class NLPAnalyzer:
+    def __init__(self, lemma_cache_size=50000, text_cache_size=10000, max_cached_text_length=500,
+                 tokenizer="nltk", scorer=None, snapshot_path=NLP_SNAPSHOT_PATH,
+                 grade_cache_size=10000, grade_cache_path=None, instrument=False):
+        # NLP tools are loaded on first use (see load_resources). With a snapshot,
+        # WordNet is only loaded for words the snapshot has not seen.
+        self.lemmatizer = None
+        self.stop_words = None
+        self.snapshot_path = snapshot_path
+        self.snapshot_lemmas = {}
+        self.resource_lock = threading.RLock()
+        self.pending_banks = []
+        self.tokenize = TOKENIZERS[tokenizer]
+        
+        # Bounded caches: student vocabulary is very repetitive, so most tokens and
+        # many whole answers have been seen before. Long essays rarely repeat and are
+        # not cached as a whole, which keeps the text cache's memory flat.
+        self.lemma_cache = LRUCache(lemma_cache_size)
+        self.text_cache = LRUCache(text_cache_size)
+        self.max_cached_text_length = max_cached_text_length
+        
+        self.concept_index = ConceptIndex(self.preprocess_text)
+        
+        # Pluggable similarity scorer that produces confidence_score for the generic
+        # evaluation; any object with load_or_fit(question_bank, preprocess) and
+        # score(processed_response, concepts, preprocess) works
+        self.scorer = scorer if scorer is not None else SimilarityScorer()
+        self.keyword_matchers = {}
+        self.rule_book = RuleBook(self.keyword_matcher)
+        # Finished grades for repeated answers; grade_cache_path adds the on-disk tier
+        self.tokenizer_name = tokenizer
+        self.grade_cache = None
+        if grade_cache_size or grade_cache_path:
+            self.grade_cache = GradeCache(grade_cache_size, grade_cache_path)
+        # Bounded, since every generated question id adds an entry
+        self.grade_key_prefixes = LRUCache(10000)
+        # Per-stage timings, see stats(); None keeps instrumentation off the hot path
+        self.stage_timer = StageTimer() if instrument else None
+    
+    def keyword_matcher(self, keywords):
+        # Each keyword list is compiled once and reused for every answer
+        key = tuple(keywords)
+        matcher = self.keyword_matchers.get(key)
+        if matcher is None:
+            matcher = KeywordMatcher(key)
+            self.keyword_matchers[key] = matcher
+        return matcher
+    
+    def index_bank(self, question_bank):
+        # Rules compile without NLTK; lemmatizing the concepts waits until the
+        # NLP resources are loaded
+        self.rule_book.index_bank(question_bank)
+        if isinstance(question_bank, LazyQuestionBank):
+            question_bank.add_listener(self.update_index)
+        with self.resource_lock:
+            if self.stop_words is None:
+                self.pending_banks.append(question_bank)
+                return
+        self._index_concepts(question_bank)
+    
+    def _index_concepts(self, question_bank):
+        self.concept_index.index_bank(question_bank)
+        if self.scorer:
+            self.scorer.load_or_fit(question_bank, self.preprocess_text)
+    
+    def refresh_scorer(self, question_bank):
+        # Refit the similarity model after the bank's store changed. Before the NLP
+        # resources load there is nothing to refit: the pending fit reads the store then.
+        with self.resource_lock:
+            if self.stop_words is None:
+                return
+        if self.scorer:
+            self.scorer.load_or_fit(question_bank, self.preprocess_text)
+    
+    def prepare_question(self, subject, question):
+        # Compile a question's rules and lemmatize its concepts ahead of its first grade
+        concepts = question.concepts
+        self.rule_book.lookup(question.id, subject, concepts)
+        self.concept_index.get(concepts)
+    
+    def update_index(self, subject, loaded=None, evicted=None, changed=None):
+        # Follows a lazy bank: rules and concept entries of a loaded subject are built
+        # on first lookup, and dropped again when the subject is evicted. Reloaded
+        # questions only touch their own entries.
+        if evicted:
+            self.rule_book.remove(subject, evicted)
+            self.concept_index.remove(evicted)
+        for _, old, new in changed or ():
+            self.rule_book.update(subject, old, new)
+            if new is not None and self.stop_words is not None:
+                self.concept_index.get(new.get("concepts", []), pin=True)
+    
+    def load_resources(self):
+        with self.resource_lock:
+            if self.stop_words is not None:
+                return
+            snapshot = load_nlp_snapshot(self.snapshot_path) if self.snapshot_path else None
+            if snapshot:
+                self.snapshot_lemmas = snapshot["lemmas"]
+                self.stop_words = set(snapshot["stop_words"])
+            else:
+                load_nltk()
+                self.stop_words = set(lazy_import("nltk.corpus").stopwords.words('english'))
+            pending_banks, self.pending_banks = self.pending_banks, []
+            for question_bank in pending_banks:
+                self._index_concepts(question_bank)
+    
+    def wordnet_lemmatizer(self):
+        with self.resource_lock:
+            if self.lemmatizer is None:
+                load_nltk()
+                self.lemmatizer = lazy_import("nltk.stem").WordNetLemmatizer()
+        return self.lemmatizer
+    
+    def lemmatize(self, word):
+        lemma = self.lemma_cache.get(word)
+        if lemma is None:
+            lemma = self.snapshot_lemmas.get(word)
+            if lemma is None:
+                lemma = (self.lemmatizer or self.wordnet_lemmatizer()).lemmatize(word)
+            self.lemma_cache.put(word, lemma)
+        return lemma
+    
+    def preprocess_text(self, text):
+        if self.stop_words is None:
+            self.load_resources()
+        text = text.lower()
+        cached = self.text_cache.get(text)
+        if cached is not None:
+            return list(cached)
+        
+        # Tokenize and lemmatize
+        timer = self.stage_timer
+        if timer:
+            mark = time.perf_counter()
+        tokens = self.tokenize(text)
+        if timer:
+            mark = timer.lap("tokenize", mark)
+        processed = [
+            self.lemmatize(word) 
+            for word in tokens 
+            if word.isalpha() and word not in self.stop_words
+        ]
+        if timer:
+            timer.lap("lemmatize", mark)
+        if len(text) <= self.max_cached_text_length:
+            self.text_cache.put(text, tuple(processed))
+        return processed
+    
+    def enable_instrumentation(self):
+        if self.stage_timer is None:
+            self.stage_timer = StageTimer()
+        return self.stage_timer
+    
+    def stats(self):
+        # Latency histograms per grading stage, empty unless instrumentation is on
+        return self.stage_timer.stats() if self.stage_timer else {}
+    
+    def cache_stats(self):
+        stats = {
+            "lemma": self.lemma_cache.stats(),
+            "text": self.text_cache.stats()
+        }
+        if self.grade_cache:
+            stats["grade"] = self.grade_cache.stats()
+        return stats
+    
+    def grade_key(self, normalized_response, subject, expected_concepts, question_id=None):
+        # The key covers everything a grade depends on: the grader and tokenizer, the
+        # similarity model, the question and the fingerprint of its compiled rules. The
+        # rules are looked up every time, so a question reloaded with new rules gets a
+        # new key.
+        scorer_fingerprint = getattr(self.scorer, "fingerprint", None)
+        rule_set = self.rule_book.lookup(question_id, subject, expected_concepts)
+        question_key = (question_id, subject, tuple(expected_concepts), scorer_fingerprint, rule_set.fingerprint)
+        prefix = self.grade_key_prefixes.get(question_key)
+        if prefix is None:
+            question = json.dumps([
+                GRADER_VERSION, self.tokenizer_name, scorer_fingerprint,
+                question_id, subject, list(expected_concepts), rule_set.fingerprint
+            ])
+            prefix = hashlib.sha1(question.encode("utf-8")).hexdigest()
+            self.grade_key_prefixes.put(question_key, prefix)
+        response_hash = hashlib.blake2b(normalized_response.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{prefix}:{response_hash}"
+    
+    def analyze_responses(self, batch):
+        # Grade many (response, subject, concepts[, question id]) tuples, returning results
+        # in input order. Identical responses to the same question are graded once, and each
+        # distinct response is only tokenized once even if it answers several questions.
+        if self.stop_words is None:
+            self.load_resources()
+        results = []
+        graded = {}
+        processed = {}
+        new_grades = []
+        for row in batch:
+            user_response, subject, expected_concepts = row[:3]
+            question_id = row[3] if len(row) > 3 else None
+            normalized = normalize_response(user_response) if self.grade_cache else user_response.strip()
+            answers = graded.setdefault((question_id, subject, tuple(expected_concepts)), {})
+            result = answers.get(normalized)
+            if result is None:
+                key = None
+                if self.grade_cache:
+                    key = self.grade_key(normalized, subject, expected_concepts, question_id)
+                    result = self.grade_cache.get(key)
+                if result is None:
+                    processed_response = processed.get(normalized)
+                    if processed_response is None:
+                        processed_response = self.preprocess_text(normalized)
+                        processed[normalized] = processed_response
+                    result = self._evaluate(normalized, processed_response, subject, expected_concepts, question_id)
+                    if key:
+                        new_grades.append((key, result))
+                answers[normalized] = result
+            results.append(dict(result, concepts_identified=list(result["concepts_identified"])))
+        if new_grades:
+            self.grade_cache.put_many(new_grades)
+        return results
+    
+    def analyze_response(self, user_response, subject, expected_concepts, question_id=None):
+        timer = self.stage_timer
+        if timer:
+            start = mark = time.perf_counter()
+        key = result = None
+        if self.grade_cache:
+            if self.stop_words is None:
+                self.load_resources()
+            user_response = normalize_response(user_response)
+            key = self.grade_key(user_response, subject, expected_concepts, question_id)
+            result = self.grade_cache.get(key)
+            if timer:
+                mark = timer.lap("grade_cache", mark)
+        
+        if result is None:
+            # Preprocess user response
+            processed_response = self.preprocess_text(user_response)
+            if timer:
+                mark = timer.lap("preprocess", mark)
+            result = self._evaluate(user_response, processed_response, subject, expected_concepts, question_id)
+            if timer:
+                timer.lap("evaluate", mark)
+            if key:
+                self.grade_cache.put(key, result)
+        if key:
+            # Callers may edit the result, so they get a copy of the cached one
+            result = dict(result, concepts_identified=list(result["concepts_identified"]))
+        if timer:
+            timer.record("analyze_response", time.perf_counter() - start)
+        return result
+    
+    def _evaluate(self, user_response, processed_response, subject, expected_concepts, question_id=None):
+        rule_set = self.rule_book.lookup(question_id, subject, expected_concepts)
+        return rule_set.evaluate(self, user_response, processed_response, expected_concepts)
+    
+    def evaluate_concept_coverage(self, processed_response, expected_concepts, threshold=0.7):
+        timer = self.stage_timer
+        if timer:
+            mark = time.perf_counter()
+        # Match keywords against the precompiled concept index
+        matched_concepts = self.concept_index.match(processed_response, expected_concepts)
+        if timer:
+            mark = timer.lap("concept_match", mark)
+        
+        # Calculate match percentage
+        match_percentage = len(matched_concepts) / len(expected_concepts) if expected_concepts else 0
+        
+        # Generic evaluation based on concept matching; the similarity score only sets
+        # confidence_score, the decision is concept coverage against the threshold
+        confidence_score = match_percentage
+        if self.scorer:
+            confidence_score = self.scorer.score(processed_response, expected_concepts, self.preprocess_text)
+            if timer:
+                timer.lap("similarity", mark)
+        
+        if match_percentage >= threshold:
             return {
                 "is_correct": True,
                 "feedback": f"Great answer! You covered {len(matched_concepts)} out of {len(expected_concepts)} key concepts.",
                 "concepts_identified": matched_concepts,
-                "confidence_score": match_percentage
+                "confidence_score": confidence_score
             }
         else:
             # Generic incorrect response
@@ -764,11 +3667,1653 @@ class NLPAnalyzer:
                 "is_correct": False,
                 "feedback": f"That's not quite right. Let's try to understand the concept better. The key points to consider are: {', '.join(expected_concepts)}.",
                 "concepts_identified": matched_concepts,
-                "confidence_score": match_percentage
+                "confidence_score": confidence_score
             }
 
 
-if __name__ == "__main__":
+# Grading state of a pool worker process, loaded once when the worker starts
+_worker_analyzer = None
+_worker_questions = None
+_worker_refreshed_at = 0.0
+_worker_started = None
+
+
+def _init_grading_worker(analyzer_options, started=None):
+    global _worker_analyzer, _worker_questions, _worker_refreshed_at, _worker_started
+    # started is the engine's queue of job starts, when the engine has a timeout
+    _worker_started = started
+    _worker_analyzer = NLPAnalyzer(**analyzer_options)
+    # Building the question bank indexes its concepts into the worker's analyzer
+    # Workers grade generated questions from their ids and never serve any
+    _worker_questions = QuestionGenerator(_worker_analyzer, procedural_math=False)
+    _worker_analyzer.load_resources()
+    _worker_refreshed_at = time.monotonic()
+
+
+def _refresh_worker_questions():
+    # Each worker reads the store itself, so questions changed in it reach every worker
+    global _worker_refreshed_at
+    now = time.monotonic()
+    if now - _worker_refreshed_at >= QUESTION_REFRESH_INTERVAL:
+        _worker_refreshed_at = now
+        _worker_questions.refresh()
+
+
+def _run_in_worker(token, fn, *args):
+    # Reports the job to the engine as it starts, with the process running it, so its
+    # timeout counts from here rather than from when it was queued
+    if _worker_started is not None:
+        _worker_started.put((token, os.getpid()))
+    return fn(*args)
+
+
+def _grade_in_worker(user_response, subject, expected_concepts, question_id=None):
+    _refresh_worker_questions()
+    return _worker_analyzer.analyze_response(user_response, subject, expected_concepts, question_id)
+
+
+def _grade_batch_in_worker(batch):
+    _refresh_worker_questions()
+    return _worker_analyzer.analyze_responses(batch)
+
+
+class GradingError(Exception):
+    pass
+
+
+class GradingTimeout(GradingError):
+    pass
+
+
+class GradingEngine:
+    def __init__(self, workers=None, timeout=None, retries=1, **analyzer_options):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        # A crashing worker fails every job in flight on its pool, so each job is
+        # retried on the replacement pool before the crash is reported for it
+        self.retries = retries
+        self.analyzer_options = analyzer_options
+        self.lock = threading.Lock()
+        # token -> job, for each job handed to a pool and not yet finished
+        self.running = {}
+        self.tokens = count()
+        self.started = None
+        self.watchdog = None
+        if timeout:
+            # Workers report each job as they start it, and one thread times them all
+            self.started = multiprocessing.Queue()
+            self.watchdog = threading.Thread(target=self._watch, daemon=True)
+            self.watchdog.start()
+        self.executor = self._create_pool()
+    
+    def _create_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_grading_worker,
+            initargs=(self.analyzer_options, self.started)
+        )
+    
+    def _replace_pool(self, broken):
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = self._create_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+    
+    def submit(self, user_response, subject, expected_concepts, question_id=None):
+        # Returns a Future resolving to the analysis dict, or raising GradingError
+        job = Future()
+        job.set_running_or_notify_cancel()
+        args = (user_response, subject, list(expected_concepts), question_id)
+        self._dispatch(job, _grade_in_worker, args, self.retries)
+        return job
+    
+    def _dispatch(self, job, fn, args, retries_left):
+        token = next(self.tokens)
+        with self.lock:
+            executor = self.executor
+            self.running[token] = job
+        try:
+            task = executor.submit(_run_in_worker, token, fn, *args)
+        except BrokenProcessPool:
+            self._replace_pool(executor)
+            with self.lock:
+                executor = self.executor
+            task = executor.submit(_run_in_worker, token, fn, *args)
+        task.add_done_callback(lambda done: self._complete(job, token, done, executor, fn, args, retries_left))
+    
+    def _watch(self):
+        # Jobs still queued for a worker are not timed; a job is timed from the moment a
+        # worker reports starting it
+        deadlines = {}   # token -> (deadline, pid of the worker running it)
+        while True:
+            wait = None
+            if deadlines:
+                wait = max(0.0, min(deadline for deadline, _ in deadlines.values()) - time.monotonic())
+            try:
+                started = self.started.get(timeout=wait)
+            except queue.Empty:
+                started = ()
+            if started is None:
+                return
+            now = time.monotonic()
+            if started:
+                token, pid = started
+                deadlines[token] = (now + self.timeout, pid)
+            for token, (deadline, pid) in list(deadlines.items()):
+                with self.lock:
+                    job = self.running.get(token)
+                if job is None:
+                    del deadlines[token]
+                elif deadline <= now:
+                    del deadlines[token]
+                    self._expire(job, pid)
+    
+    def _expire(self, job, pid):
+        # A job that overruns fails with GradingTimeout, and the worker running it is
+        # killed, so a hung job stops using a core. That breaks its pool: other jobs
+        # running on it are retried on a new pool, like after a crash.
+        # Resolved first, so the job is not retried when its worker dies; a job that
+        # finished in the meantime leaves its worker alone
+        if self._resolve(job, error=GradingTimeout(f"grading did not finish within {self.timeout}s")):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def _complete(self, job, token, task, executor, fn, args, retries_left):
+        with self.lock:
+            self.running.pop(token, None)
+        if job.done():
+            return
+        try:
+            result = task.result()
+        except BrokenProcessPool as e:
+            self._replace_pool(executor)
+            if retries_left > 0:
+                self._dispatch(job, fn, args, retries_left - 1)
+            else:
+                self._resolve(job, error=GradingError(f"grading worker crashed: {e}"))
+        except Exception as e:
+            self._resolve(job, error=GradingError(f"grading failed: {e}"))
+        else:
+            self._resolve(job, result=result)
+    
+    def _resolve(self, job, result=None, error=None):
+        # False if the job was already resolved
+        try:
+            if error is not None:
+                job.set_exception(error)
+            else:
+                job.set_result(result)
+        except InvalidStateError:
+            return False
+        return True
+    
+    def map(self, batch, chunksize=256):
+        # Grade (response, subject, concepts[, question id]) rows in order. Rows are sent to
+        # the workers in chunks with a bounded number in flight, so memory does not grow
+        # with the input. Rows of a chunk that crashed or timed out get an error result.
+        def chunks():
+            chunk = []
+            for row in batch:
+                chunk.append(row)
+                if len(chunk) >= chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        
+        for results in self.map_chunks(chunks()):
+            yield from results
+    
+    def map_chunks(self, chunks):
+        # Like map, for rows already cut into lists: yields each list's results, in
+        # order, with at most workers * 2 lists in flight. Empty lists yield [].
+        pending = deque()
+        max_pending = self.workers * 2
+        for chunk in chunks:
+            chunk = [tuple(row) for row in chunk]
+            pending.append((chunk, self.submit_batch(chunk) if chunk else None))
+            while len(pending) > max_pending:
+                yield self._chunk_results(*pending.popleft())
+        while pending:
+            yield self._chunk_results(*pending.popleft())
+    
+    def submit_batch(self, chunk):
+        # Grades a list of rows in one worker call; the Future resolves to the list of
+        # results, or raises GradingError
+        job = Future()
+        job.set_running_or_notify_cancel()
+        self._dispatch(job, _grade_batch_in_worker, (chunk,), self.retries)
+        return job
+    
+    def _chunk_results(self, chunk, job):
+        if job is None:
+            return []
+        try:
+            return job.result()
+        except GradingError as e:
+            return [
+                {
+                    "is_correct": False,
+                    "feedback": "This answer could not be graded. Please try again.",
+                    "concepts_identified": [],
+                    "confidence_score": 0.0,
+                    "error": str(e)
+                }
+                for _ in chunk
+            ]
+    
+    def close(self):
+        with self.lock:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.watchdog:
+            self.started.put(None)
+            self.watchdog.join()
+            self.started.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class GradingService:
+    # Headless JSON API over the question bank and a GradingEngine worker pool:
+    #   GET  /next-question?user=U&subject=S   pick a question at the user's level
+    #   POST /grade {"user", "response", ["question_id"]}   grade and award XP
+    #   GET  /progress?user=U                  level and XP per subject
+    #   GET  /metrics                          latency histograms, queue and batch stats
+    # Grades queue up and go to the workers in batches. Once max_in_flight batches are
+    # being graded the queue fills, and a full queue answers 503 instead of piling up.
+    MAX_BODY_BYTES = 64 * 1024
+    
+    def __init__(self, host="127.0.0.1", port=8000, workers=None, batch_size=64, max_queue=1024,
+                 progress_path="data/service_progress.json", reviews_path="data/service_reviews.pickle",
+                 save_interval=30):
+        self.host = host
+        self.port = port
+        self.engine = GradingEngine(workers=workers)
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.max_in_flight = self.engine.workers * 2
+        self.progress_path = progress_path
+        self.save_interval = save_interval
+        
+        self.question_generator = QuestionGenerator()
+        self.current_questions = {}   # user -> id of the question last served
+        self.sampler_sessions = {}    # user -> SamplerSession, so each user cycles on their own
+        self.progress = self.load_progress()
+        self.reviews_path = reviews_path
+        self.review_schedulers = self.load_reviews()
+        # user -> subject -> ScalableBloomFilter of answered questions, saved with progress
+        self.seen_questions = {user: load_seen_filters(subjects, self.review_schedulers.get(user))
+                               for user, subjects in self.progress.items()}
+        self.progress_dirty = False
+        
+        self.routes = {
+            ("GET", "/next-question"): self.next_question,
+            ("POST", "/grade"): self.grade,
+            ("GET", "/progress"): self.get_progress,
+            ("GET", "/metrics"): self.metrics
+        }
+        self.latency = {path: LatencyHistogram() for _, path in self.routes}
+        self.status_counts = Counter()
+        self.batches = 0
+        self.batched_rows = 0
+        self.started_at = time.time()
+        self.queue = None
+    
+    def load_progress(self):
+        try:
+            with open(self.progress_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def load_reviews(self):
+        try:
+            with open(self.reviews_path, "rb") as f:
+                snapshots = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return {}
+        return {user: ReviewScheduler.restore(snapshot) for user, snapshot in snapshots.items()}
+    
+    def progress_snapshot(self):
+        # Copies taken on the event loop, so writing them in a thread can't race updates;
+        # seen filters are copied here and encoded by the writer
+        progress = {user: {subject: dict(stats) for subject, stats in subjects.items()}
+                    for user, subjects in self.progress.items()}
+        for user, subjects in self.seen_questions.items():
+            for subject, seen in subjects.items():
+                progress.setdefault(user, {}).setdefault(subject, {})["seen"] = seen.copy()
+        reviews = {user: scheduler.snapshot() for user, scheduler in self.review_schedulers.items()}
+        self.progress_dirty = False
+        return progress, reviews
+    
+    def save_progress(self, snapshot=None):
+        progress, reviews = snapshot or self.progress_snapshot()
+        directory = os.path.dirname(self.progress_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.progress_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(progress, f, default=ScalableBloomFilter.json_default)
+        os.replace(temp_path, self.progress_path)
+        ReviewScheduler.write(self.reviews_path, reviews)
+    
+    async def refresh_questions_periodically(self):
+        while True:
+            await asyncio.sleep(QUESTION_REFRESH_INTERVAL)
+            self.question_generator.refresh()
+    
+    async def save_progress_periodically(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self.progress_dirty:
+                snapshot = self.progress_snapshot()
+                await asyncio.get_running_loop().run_in_executor(None, self.save_progress, snapshot)
+    
+    def subject_progress(self, user, subject):
+        return self.progress.setdefault(user, {}).setdefault(subject, {"level": 1, "xp": 0})
+    
+    async def next_question(self, params, body):
+        user = params.get("user")
+        subject = params.get("subject")
+        if not user or subject not in self.question_generator.question_bank:
+            raise HTTPError(400, "user and a known subject are required")
+        level = self.subject_progress(user, subject)["level"]
+        session = self.sampler_sessions.get(user)
+        if session is None:
+            session = self.sampler_sessions[user] = self.question_generator.sampler.session()
+        scheduler = self.review_schedulers.setdefault(user, ReviewScheduler())
+        seen = self.seen_questions.get(user, {}).get(subject)
+        question = self.question_generator.generate_question(subject, level, session, scheduler, seen)
+        self.current_questions[user] = question["id"]
+        return {"id": question["id"], "subject": subject, "level": level, "prompt": question["prompt"],
+                "video_path": question.get("video_path")}
+    
+    async def grade(self, params, body):
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError:
+            raise HTTPError(400, "request body must be JSON")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+        user = request.get("user")
+        user_response = request.get("response")
+        if not user or not isinstance(user, str) or not isinstance(user_response, str):
+            raise HTTPError(400, "user and response are required")
+        question_id = request.get("question_id")
+        if question_id is not None and not isinstance(question_id, str):
+            raise HTTPError(400, "question_id must be a string")
+        question_id = question_id or self.current_questions.get(user)
+        found = self.question_generator.find_question(question_id) if question_id else None
+        if found is None:
+            raise HTTPError(404, "unknown question; call /next-question first")
+        subject, question = found
+        
+        graded = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(((user_response, subject, question["concepts"], question_id), graded))
+        except asyncio.QueueFull:
+            raise HTTPError(503, "grading queue is full, retry shortly")
+        try:
+            analysis_result = await graded
+        except GradingError as e:
+            raise HTTPError(503, f"grading failed: {e}")
+        
+        # Same XP, level and review rules as the desktop app
+        self.review_schedulers.setdefault(user, ReviewScheduler()).record(
+            subject, question_id, review_quality(analysis_result))
+        self.seen_questions.setdefault(user, {}).setdefault(subject, ScalableBloomFilter()).add(question_id)
+        self.progress_dirty = True
+        stats = self.subject_progress(user, subject)
+        leveled_up = False
+        if analysis_result["is_correct"]:
+            stats["xp"] += 10 * stats["level"]
+            if stats["xp"] >= stats["level"] * 50:
+                stats["level"] += 1
+                leveled_up = True
+        return dict(analysis_result, question_id=question_id, level=stats["level"], xp=stats["xp"],
+                    leveled_up=leveled_up)
+    
+    async def get_progress(self, params, body):
+        user = params.get("user")
+        if not user:
+            raise HTTPError(400, "user is required")
+        return {"user": user, "subjects": self.progress.get(user, {})}
+    
+    async def metrics(self, params, body):
+        return {
+            "uptime_s": time.time() - self.started_at,
+            "endpoints": {path: histogram.snapshot() for path, histogram in self.latency.items()},
+            "status": dict(self.status_counts),
+            "queue": {"depth": self.queue.qsize(), "max": self.max_queue},
+            "batches": {
+                "count": self.batches,
+                "mean_size": self.batched_rows / self.batches if self.batches else 0.0,
+                "max_in_flight": self.max_in_flight
+            }
+        }
+    
+    async def batch_grades(self):
+        # Batches form naturally: while every in-flight slot is busy, requests queue up
+        # and the next batch takes as many as batch_size of them
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        while True:
+            batch = [await self.queue.get()]
+            await in_flight.acquire()
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.batches += 1
+            self.batched_rows += len(batch)
+            job = asyncio.wrap_future(self.engine.submit_batch([row for row, _ in batch]))
+            job.add_done_callback(lambda done, batch=batch: self.finish_batch(batch, done, in_flight))
+    
+    def finish_batch(self, batch, job, in_flight):
+        in_flight.release()
+        error = job.exception()
+        results = job.result() if error is None else [None] * len(batch)
+        for (_, graded), analysis_result in zip(batch, results):
+            # A client that disconnected has already cancelled its future
+            if graded.done():
+                continue
+            if error is None:
+                graded.set_result(analysis_result)
+            else:
+                graded.set_exception(error)
+    
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                start = time.perf_counter()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                path = None
+                try:
+                    method, target, _ = request_line.decode("latin-1").split()
+                    length = int(headers.get("content-length", 0))
+                    if length > self.MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HTTPError(413, "request body too large")
+                    body = await reader.readexactly(length) if length else b""
+                    url = urlsplit(target)
+                    path = url.path
+                    handler = self.routes.get((method, path))
+                    if handler is None:
+                        known = any(route_path == path for _, route_path in self.routes)
+                        raise HTTPError(405 if known else 404, f"no route for {method} {path}")
+                    params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                    status, payload = 200, await handler(params, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except ValueError:
+                    status, payload, keep_alive = 400, {"error": "malformed request"}, False
+                except Exception:
+                    # A bug in a handler fails this request, not the connection loop
+                    logging.exception(f"unhandled error serving {request_line!r}")
+                    status, payload, keep_alive = 500, {"error": "internal server error"}, False
+                
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                self.status_counts[str(status)] += 1
+                if path in self.latency:
+                    self.latency[path].record(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    def warm_up(self):
+        # Start every worker and load its NLP resources before taking traffic
+        row = ("warm up", "Science", ["plants"], None)
+        jobs = [self.engine.submit_batch([row]) for _ in range(self.engine.workers)]
+        for job in jobs:
+            job.result()
+    
+    async def serve(self):
+        self.queue = asyncio.Queue(self.max_queue)
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        background = [asyncio.ensure_future(self.batch_grades()),
+                      asyncio.ensure_future(self.save_progress_periodically()),
+                      asyncio.ensure_future(self.refresh_questions_periodically())]
+        print(f"Grading service on http://{self.host}:{self.port} with {self.engine.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in background:
+                task.cancel()
+    
+    def run(self):
+        self.warm_up()
+        # Stop on SIGTERM the same way as on Ctrl+C, saving progress on the way out
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.save_progress()
+            self.engine.close()
+            self.question_generator.close()
+
+
+async def http_request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    data = await reader.readexactly(length)
+    return status, json.loads(data) if data else None
+
+
+async def load_test(host, port, concurrency, duration, users, seed=0):
+    # Each client keeps one connection open and loops next-question -> grade
+    subjects = list(QuestionGenerator().question_bank)
+    latencies = {"/next-question": [], "/grade": []}
+    statuses = Counter()
+    loop = asyncio.get_running_loop()
+    end = loop.time() + duration
+    
+    async def timed(reader, writer, method, path, payload=None):
+        start = time.perf_counter()
+        status, response = await http_request(reader, writer, method, path, payload)
+        latencies[path.split("?")[0]].append(time.perf_counter() - start)
+        statuses[status] += 1
+        return status, response
+    
+    async def client(number):
+        rng = random.Random(seed + number)
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while loop.time() < end:
+                user = f"loadtest-{rng.randrange(users)}"
+                subject = rng.choice(subjects)
+                status, question = await timed(reader, writer, "GET",
+                                               f"/next-question?user={user}&subject={quote(subject)}")
+                if status != 200:
+                    continue
+                await timed(reader, writer, "POST", "/grade",
+                            {"user": user, "question_id": question["id"], "response": rng.choice(PARITY_CORPUS)})
+        finally:
+            writer.close()
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    reader, writer = await asyncio.open_connection(host, port)
+    _, server_metrics = await http_request(reader, writer, "GET", "/metrics")
+    writer.close()
+    return latencies, statuses, elapsed, server_metrics
+
+
+def run_load_test(host="127.0.0.1", port=8000, concurrency=64, duration=10.0, users=1000):
+    latencies, statuses, elapsed, server_metrics = asyncio.run(load_test(host, port, concurrency, duration, users))
+    total = sum(statuses.values())
+    print(f"{total:,} requests in {elapsed:.1f}s from {concurrency} clients: {total / elapsed:,.0f} requests/sec")
+    for path, samples in latencies.items():
+        samples.sort()
+        if samples:
+            p50 = samples[len(samples) // 2] * 1000
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+            print(f"{path:<15} {len(samples):>9,} requests  p50 {p50:>7.2f} ms  p99 {p99:>7.2f} ms")
+    print("status codes: " + ", ".join(f"{status}={count:,}" for status, count in sorted(statuses.items())))
+    batches = server_metrics["batches"]
+    print(f"server batches: {batches['count']:,}, mean size {batches['mean_size']:.1f}")
+
+
+def read_graded_rows(path, offset=0, skip=0):
+    # Stream answer records from JSONL (one object per line) or CSV (header row, with
+    # concepts separated by ";") as (end offset, record, error). Records are dicts with
+    # "response" and either "question_id" or "subject" and "concepts"; other fields such
+    # as "id" pass through. A line that is not a JSON object comes out as an empty
+    # record with an error, so one bad line does not stop the run. The end offset is
+    # the byte offset just past the record: a resumed run seeks straight to it.
+    # skip drops that many records first, for checkpoints that only counted rows.
+    with open(path, "rb") as f:
+        if path.endswith(".csv"):
+            position = 0
+            
+            def lines():
+                nonlocal position
+                for line in f:
+                    position += len(line)
+                    yield line.decode("utf-8")
+            
+            reader = csv.reader(lines())
+            header = next(reader, None)
+            if header is None:
+                return
+            if offset > position:
+                f.seek(offset)
+                position = offset
+            for number, row in enumerate(reader):
+                if number < skip:
+                    continue
+                record = dict(zip(header, row))
+                if isinstance(record.get("concepts"), str):
+                    record["concepts"] = [c.strip() for c in record["concepts"].split(";") if c.strip()]
+                yield position, record, None
+        else:
+            f.seek(offset)
+            position = offset
+            number = 0
+            for line in f:
+                position += len(line)
+                if not line.strip():
+                    continue
+                number += 1
+                # Skipped lines are not parsed, so resuming far into a file stays cheap
+                if number <= skip:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield position, {}, "malformed JSON"
+                    continue
+                if not isinstance(record, dict):
+                    yield position, {}, "record is not a JSON object"
+                    continue
+                yield position, record, None
+
+
+class GradedRowWriter:
+    FIELDS = ["row", "id", "question_id", "is_correct", "confidence_score", "concepts_identified",
+              "feedback", "error"]
+    
+    def __init__(self, path, offset=0):
+        # Resuming truncates anything written after the last checkpoint
+        self.file = open(path, "r+" if offset else "w", encoding="utf-8", newline="")
+        self.file.seek(offset)
+        self.file.truncate()
+        self.csv = csv.DictWriter(self.file, self.FIELDS, extrasaction="ignore") if path.endswith(".csv") else None
+        if self.csv and not offset:
+            self.csv.writeheader()
+    
+    def write(self, record):
+        if self.csv:
+            self.csv.writerow(dict(record, concepts_identified=";".join(record.get("concepts_identified", []))))
+        else:
+            self.file.write(json.dumps(record) + "\n")
+    
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+    
+    def close(self):
+        self.file.close()
+
+
+def analyze_chunks(nlp_analyzer, chunks):
+    # In-process counterpart of GradingEngine.map_chunks: grades rows a list at a time
+    for chunk in chunks:
+        yield nlp_analyzer.analyze_responses(chunk) if chunk else []
+
+
+def deduplicate_import(store, input_path, threshold=0.8, merge=False, report_path=DUPLICATE_REPORT_PATH):
+    # Cluster near-duplicate prompts among a .jsonl import and the questions already
+    # stored (stored ones first, so they represent their clusters) and write one report
+    # line per cluster. Returns the input line numbers to leave out of the import: none
+    # when only flagging, and every imported duplicate of an earlier question with merge.
+    entries = []   # (input line number, or None for a stored question, id, subject, level, prompt)
+    with open(input_path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            if line.strip():
+                question = json.loads(line)
+                entries.append((number, QuestionStore.question_id(question), question["subject"],
+                                int(question["level"]), question["prompt"]))
+    # A stored question the import overwrites is not a duplicate of its new version
+    imported_ids = {entry[1] for entry in entries}
+    entries = [(None, *row) for row in store.prompts() if row[0] not in imported_ids] + entries
+    
+    deduplicator = PromptDeduplicator(threshold)
+    start = time.perf_counter()
+    clusters = deduplicator.clusters(entry[4] for entry in entries)
+    elapsed = time.perf_counter() - start
+    
+    skip = set()
+    directory = os.path.dirname(report_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as report:
+        for members in clusters:
+            kept = members[0]
+            questions = []
+            for index in members:
+                number, question_id, subject, level, prompt = entries[index]
+                questions.append({
+                    "id": question_id, "subject": subject, "level": level, "prompt": prompt,
+                    "source": "store" if number is None else f"line {number + 1}",
+                    "similarity": round(deduplicator.similarity(entries[kept][4], prompt), 3)
+                })
+                if merge and index != kept and number is not None:
+                    skip.add(number)
+            report.write(json.dumps({"kept": questions[0]["id"], "questions": questions}) + "\n")
+    duplicates = sum(len(members) - 1 for members in clusters)
+    print(f"Checked {len(entries):,} prompts for near-duplicates in {elapsed:.1f}s: {len(clusters):,} clusters, "
+          f"{duplicates:,} duplicates{f', {len(skip):,} left out' if merge else ''}; report in {report_path}")
+    return skip
+
+
+def grade_file(input_path, output_path, workers=0, resume=False, checkpoint_every=10000, chunksize=1024):
+    # Re-score an answer archive. Input is read lazily and results are written as they
+    # arrive, so memory stays flat however large the file. A checkpoint recording the
+    # rows done, how far into the input they reach and the output size is saved every
+    # checkpoint_every rows; --resume continues from it after an interruption.
+    checkpoint_path = f"{output_path}.checkpoint"
+    done, input_offset, output_offset, skip = 0, 0, 0, 0
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r") as f:
+            checkpoint = json.load(f)
+        done, output_offset = checkpoint["rows"], checkpoint["output_offset"]
+        input_offset = checkpoint.get("input_offset", 0)
+        # Checkpoints written before input offsets were recorded skip rows by count
+        skip = 0 if "input_offset" in checkpoint else done
+        print(f"Resuming after row {done:,}", file=sys.stderr)
+    
+    question_generator = QuestionGenerator()
+    
+    # Records are read in segments of at most chunksize gradable rows and 4 * chunksize
+    # records in all. A segment's gradable rows go to the grader as one chunk; its
+    # results come back in order and the whole segment is written, ungradable rows in
+    # their place. Capping the records too keeps a long run of ungradable rows from
+    # piling up behind a row still being graded.
+    segments = deque()
+    segment_records = 4 * chunksize
+    
+    def grader_chunks():
+        segment, rows = [], []
+        for number, (position, record, error) in enumerate(read_graded_rows(input_path, input_offset, skip), done):
+            question_id = record.get("question_id") or None
+            if not isinstance(question_id, (str, type(None))):
+                error, question_id = error or "question_id must be a string", None
+            found = question_generator.find_question(question_id) if question_id else None
+            if found:
+                subject, concepts = found[0], found[1]["concepts"]
+            else:
+                subject, concepts = record.get("subject"), record.get("concepts")
+            if error is None and not isinstance(record.get("response"), str):
+                error = "missing response"
+            elif error is None and (not subject or not concepts):
+                error = f"unknown question {question_id!r}"
+            segment.append((number, position, record, question_id, error))
+            if error is None:
+                rows.append((record["response"], subject, concepts, question_id))
+            if len(rows) >= chunksize or len(segment) >= segment_records:
+                segments.append(segment)
+                yield rows
+                segment, rows = [], []
+        if segment:
+            segments.append(segment)
+            yield rows
+    
+    engine = None
+    if workers:
+        engine = GradingEngine(workers=workers)
+        results = engine.map_chunks(grader_chunks())
+    else:
+        nlp_analyzer = NLPAnalyzer()
+        QuestionGenerator(nlp_analyzer)
+        results = analyze_chunks(nlp_analyzer, grader_chunks())
+    
+    writer = GradedRowWriter(output_path, output_offset)
+    written = done
+    start = last_report = time.perf_counter()
+    
+    def write_row(number, position, record, question_id, error, analysis_result=None):
+        nonlocal written, input_offset, last_report
+        output = {"row": number, "id": record.get("id"), "question_id": question_id}
+        if error:
+            output["error"] = error
+        else:
+            output.update(analysis_result)
+        writer.write(output)
+        written += 1
+        input_offset = position
+        if written % checkpoint_every == 0:
+            save_checkpoint()
+        now = time.perf_counter()
+        if now - last_report >= 2:
+            last_report = now
+            print(f"\r{written:,} rows  {(written - done) / (now - start):,.0f} rows/sec", end="", file=sys.stderr)
+    
+    def save_checkpoint():
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"input": input_path, "rows": written, "input_offset": input_offset,
+                       "output_offset": writer.checkpoint()}, f)
+        os.replace(temp_path, checkpoint_path)
+    
+    try:
+        for chunk_results in results:
+            chunk_results = iter(chunk_results)
+            for number, position, record, question_id, error in segments.popleft():
+                write_row(number, position, record, question_id, error, None if error else next(chunk_results))
+        save_checkpoint()
+    finally:
+        writer.close()
+        if engine:
+            engine.close()
+    
+    elapsed = time.perf_counter() - start
+    print(f"\rGraded {written - done:,} rows in {elapsed:.1f}s "
+          f"({(written - done) / elapsed if elapsed else 0:,.0f} rows/sec) -> {output_path}", file=sys.stderr)
+
+
+def synthetic_responses(question_generator, rows, seed=0):
+    # Yield (response, subject, concepts) rows drawn from the question bank, with the
+    # heavy answer repetition we see in real classroom exports
+    rng = random.Random(seed)
+    questions = [
+        (subject, question["concepts"])
+        for subject, levels in question_generator.question_bank.items()
+        for questions in levels.values()
+        for question in questions
+    ]
+    filler = ["I think", "it is", "the answer is", "because", "maybe", "we learned that", "so"]
+    answers = ["12", "32", "24", "x = 4", "2x + 3", "solid liquid and gas", "I don't know"]
+    pool = []
+    for _ in range(500):
+        subject, concepts = rng.choice(questions)
+        words = rng.sample(filler, 2) + rng.sample(concepts, min(2, len(concepts))) + [rng.choice(answers)]
+        rng.shuffle(words)
+        pool.append((" ".join(words), subject, concepts))
+    for _ in range(rows):
+        yield rng.choice(pool)
+
+
+def synthetic_corpus(question_generator, size=500, seed=0):
+    # Answer corpora of the three shapes we grade: short numeric answers, speech-to-text
+    # transcripts (lowercase, no punctuation, fillers) and multi-paragraph essays. Each
+    # entry is (response, subject, concepts, question id).
+    rng = random.Random(seed)
+    questions = [
+        (subject, question)
+        for subject, levels in question_generator.question_bank.items()
+        for level_questions in levels.values()
+        for question in level_questions
+    ]
+    common = ("the a of and to in is that it for was on are as with they be at this have from "
+              "or one had by word but not what all were we when your can said there use each which "
+              "do how their if will up other about out many then them these so some would make").split()
+    fillers = ["um", "uh", "like", "you know", "so", "basically", "i mean", "i think", "okay"]
+    numbers = ["12", "32", "24", "x = 4", "x=4", "2x + 3", "-7", "3.14", "the answer is 12", "it's 32"]
+    
+    corpus = {"numeric": [], "speech": [], "essay": []}
+    for _ in range(size):
+        subject, question = rng.choice(questions)
+        concept_words = " ".join(question["concepts"]).split()
+        row = (subject, question["concepts"], question["id"])
+        
+        corpus["numeric"].append((rng.choice(numbers + [str(rng.randrange(-100, 1000))]),) + row)
+        
+        speech = [rng.choice(fillers + common + concept_words) for _ in range(rng.randint(8, 30))]
+        corpus["speech"].append((" ".join(speech),) + row)
+        
+        sentences = []
+        for _ in range(rng.randint(8, 25)):
+            words = [rng.choice(common + concept_words * 2) for _ in range(rng.randint(8, 20))]
+            sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", "!", "?"]))
+        corpus["essay"].append((" ".join(sentences),) + row)
+    return corpus
+
+
+# Answers of every shape we grade: numbers, expressions, lists, contractions,
+# possessives, hyphenation, abbreviations, speech transcripts and essays
+PARITY_CORPUS = [
+    "12", "32", "24", "x = 4", "x=4", "2x + 3", "2x+3", "f'(x) = 2x + 3",
+    "The answer is 12.", "5 + 7 = 12!", "It's 32, isn't it?", "I don't know...",
+    "solid, liquid and gas", "Solid; liquid; gas.", "solids, liquids & gases",
+    "The three states of matter are solid, liquid, and gas.",
+    "Plants use sunlight, water and carbon dioxide (CO2) to make glucose and oxygen.",
+    "photosynthesis is how a plant's leaves turn light into energy using chlorophyll",
+    "It's the plant's way of making food from the sun's light.",
+    "it displays output on the screen", "print() shows text in the console",
+    "A variable stores data, e.g. a number or a string.",
+    "a for-loop repeats code multiple times; each pass is an iteration",
+    "Loops let you repeat things over and over in a cycle.",
+    "Recursion is when a function calls itself, using the call stack.",
+    "Quantum entanglement links particles so that measuring one affects the other.",
+    "George Washington was the first president of the United States.",
+    "Mr. Washington, the U.S. president, took office in 1789.",
+    "A noun is a person, place or thing; a verb is an action word.",
+    "nouns name things and verbs describe what they're doing",
+    "um so i think it's like solid and uh liquid and gas right",
+    "you'll see the well-known rectangle area is length times width which is twenty four",
+    "I'm not sure we'd covered derivatives, but I've read that it's 2x + 3.",
+    "“Sunlight” and “water” are needed — also carbon dioxide.",
+    "ALGEBRA: solve equations for the variable x; x equals four",
+    "multiplication of single-digit numbers is basic math",
+    "Addition!!! 5+7... twelve",
+    ""
+]
+
+
+def run_parity_check(corpus=PARITY_CORPUS):
+    # Grade the corpus against every question with both tokenizer backends and
+    # report any answer where the grading decision or matched concepts differ
+    nltk_analyzer = NLPAnalyzer(tokenizer="nltk")
+    regex_analyzer = NLPAnalyzer(tokenizer="regex")
+    question_generator = QuestionGenerator(nltk_analyzer)
+    regex_analyzer.index_bank(question_generator.question_bank)
+    
+    mismatches = 0
+    checked = 0
+    for subject, levels in question_generator.question_bank.items():
+        for questions in levels.values():
+            for question in questions:
+                for user_response in corpus:
+                    expected = nltk_analyzer.analyze_response(user_response, subject, question["concepts"], question["id"])
+                    actual = regex_analyzer.analyze_response(user_response, subject, question["concepts"], question["id"])
+                    checked += 1
+                    if (expected["is_correct"] != actual["is_correct"]
+                            or expected["concepts_identified"] != actual["concepts_identified"]):
+                        mismatches += 1
+                        print(f"MISMATCH [{subject}] {question['prompt']!r} <- {user_response!r}")
+                        print(f"  nltk:  {expected['is_correct']} {expected['concepts_identified']}")
+                        print(f"  regex: {actual['is_correct']} {actual['concepts_identified']}")
+    
+    print(f"{checked} gradings checked, {mismatches} mismatches")
+    return mismatches == 0
+
+
+def run_tokenizer_benchmark(repeat=2000):
+    text = " ".join(PARITY_CORPUS).lower()
+    for name, tokenize in TOKENIZERS.items():
+        tokenize(text)
+        tokens = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            tokens += len(tokenize(text))
+        elapsed = time.perf_counter() - start
+        print(f"{name:<6} {tokens / elapsed:>14,.0f} tokens/sec  ({elapsed:.2f}s)")
+
+
+def run_engine_benchmark(rows, worker_counts, seed=0):
+    question_generator = QuestionGenerator()
+    # Unique answers, so the benchmark measures grading rather than deduplication
+    batch = [
+        (f"{user_response} {i}", subject, concepts)
+        for i, (user_response, subject, concepts) in enumerate(synthetic_responses(question_generator, rows, seed))
+    ]
+    for workers in worker_counts:
+        with GradingEngine(workers=workers) as engine:
+            # Let every worker finish loading before timing
+            list(engine.map(batch[:workers * 256]))
+            start = time.perf_counter()
+            graded = sum(1 for _ in engine.map(batch))
+            elapsed = time.perf_counter() - start
+        print(f"GradingEngine  workers={workers:>3}  {graded / elapsed:>12,.0f} responses/sec  ({elapsed:.2f}s)")
+
+
+def run_coldstart_child(use_snapshot):
+    start = time.perf_counter()
+    nlp_analyzer = NLPAnalyzer(snapshot_path=NLP_SNAPSHOT_PATH if use_snapshot else None)
+    question_generator = QuestionGenerator(nlp_analyzer)
+    nlp_analyzer.load_resources()
+    loaded = time.perf_counter()
+    question = question_generator.question_bank["Science"][3][0]
+    nlp_analyzer.analyze_response(
+        "Plants use sunlight, water and carbon dioxide to make glucose.",
+        "Science", question["concepts"], question["id"]
+    )
+    answered = time.perf_counter()
+    print(json.dumps({"load_ms": (loaded - start) * 1000, "first_answer_ms": (answered - loaded) * 1000}))
+
+
+def run_coldstart_benchmark():
+    # Each measurement runs in a fresh interpreter so nothing is warm
+    for label, child_mode in (("WordNet", "wordnet"), ("snapshot", "snapshot")):
+        if child_mode == "snapshot" and not os.path.exists(NLP_SNAPSHOT_PATH):
+            print(f"{label:<9} skipped: run build-snapshot first")
+            continue
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "bench", "coldstart", "--child-mode", child_mode],
+            check=True, capture_output=True, text=True
+        ).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        print(f"{label:<9} analyzer ready {timings['load_ms']:>8.1f} ms   first answer {timings['first_answer_ms']:>8.1f} ms")
+
+
+def run_batch_benchmark(row_counts, seed=0):
+    nlp_analyzer = NLPAnalyzer()
+    question_generator = QuestionGenerator(nlp_analyzer)
+    
+    # Warm up WordNet so the first measurement does not include the corpus load
+    nlp_analyzer.analyze_response("warm up", "Science", ["plants"])
+    
+    for rows in row_counts:
+        batch = list(synthetic_responses(question_generator, rows, seed))
+        start = time.perf_counter()
+        nlp_analyzer.analyze_responses(batch)
+        elapsed = time.perf_counter() - start
+        print(f"analyze_responses  rows={rows:>9,}  {rows / elapsed:>12,.0f} responses/sec  ({elapsed:.2f}s)")
+    
+    # One-at-a-time baseline on the smallest batch for comparison
+    batch = list(synthetic_responses(question_generator, min(row_counts), seed))
+    start = time.perf_counter()
+    for user_response, subject, concepts in batch:
+        nlp_analyzer.analyze_response(user_response, subject, concepts)
+    elapsed = time.perf_counter() - start
+    print(f"analyze_response   rows={len(batch):>9,}  {len(batch) / elapsed:>12,.0f} responses/sec  ({elapsed:.2f}s)")
+
+
+def benchmark_cases(seed=0, nlp_analyzer=None):
+    # name -> (inputs, operation). The analyzer runs without its text and grade caches
+    # so every operation does the full work; the lemma cache stays, as in production.
+    if nlp_analyzer is None:
+        nlp_analyzer = NLPAnalyzer(text_cache_size=0, grade_cache_size=0)
+    question_generator = QuestionGenerator(nlp_analyzer)
+    nlp_analyzer.load_resources()
+    corpus = synthetic_corpus(question_generator, seed=seed)
+    
+    cases = {}
+    for kind, rows in corpus.items():
+        cases[f"preprocess_text/{kind}"] = (rows, lambda row: nlp_analyzer.preprocess_text(row[0]))
+        cases[f"analyze_response/{kind}"] = (rows, lambda row: nlp_analyzer.analyze_response(*row))
+    # Keyword matching on long answers: each question's concept words (a rule's worth,
+    # matched with str.find), then every word and concept of the bank (the automaton)
+    matchers = {}
+    vocabulary = []
+    for subject, levels in question_generator.question_bank.items():
+        for level_questions in levels.values():
+            for question in level_questions:
+                concepts = question["concepts"]
+                matchers.setdefault(tuple(concepts), KeywordMatcher(" ".join(concepts).split()))
+                vocabulary += list(concepts) + regex_tokenize(f"{question['prompt']} {' '.join(concepts)}".lower())
+    bank_matcher = KeywordMatcher(word for word in vocabulary if not word.isdigit())
+    for kind in ("speech", "essay"):
+        texts = [(row[0].lower(), tuple(row[2])) for row in corpus[kind]]
+        cases[f"keyword_matcher/{kind}"] = (texts, lambda text: matchers[text[1]].matches(text[0]))
+        cases[f"keyword_matcher/{kind}/bank"] = (texts, lambda text: bank_matcher.matches(text[0]))
+    rng = random.Random(seed)
+    subjects = list(question_generator.question_bank)
+    levels = [(rng.choice(subjects), rng.randint(1, 5)) for _ in range(500)]
+    cases["generate_question"] = (levels, lambda level: question_generator.generate_question(*level))
+    return cases
+
+
+def run_benchmark_case(inputs, operation, min_time=1.0):
+    # Times each operation separately, so percentiles come from real per-call latencies
+    for item in inputs[:50]:
+        operation(item)
+    samples = []
+    clock = time.perf_counter
+    deadline = clock() + min_time
+    while clock() < deadline:
+        for item in inputs:
+            start = clock()
+            operation(item)
+            samples.append(clock() - start)
+    samples.sort()
+    
+    def percentile(fraction):
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e6
+    
+    return {
+        "ops": len(samples),
+        "ops_per_sec": len(samples) / sum(samples),
+        "p50_us": percentile(0.5),
+        "p90_us": percentile(0.9),
+        "p99_us": percentile(0.99)
+    }
+
+
+def run_benchmark_suite(selected=None, save_path=None, compare_path=None, threshold=10.0, min_time=1.0, seed=0):
+    # Returns False when --compare finds a benchmark more than threshold percent slower
+    # (in ops/sec) than the baseline
+    baseline = None
+    if compare_path:
+        with open(compare_path, "r") as f:
+            baseline = json.load(f)["results"]
+    
+    results = {}
+    regressions = []
+    for name, (inputs, operation) in benchmark_cases(seed).items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        result = run_benchmark_case(inputs, operation, min_time)
+        results[name] = result
+        line = (f"{name:<28} {result['ops_per_sec']:>12,.0f} ops/sec  p50 {result['p50_us']:>9.1f} us  "
+                f"p90 {result['p90_us']:>9.1f} us  p99 {result['p99_us']:>9.1f} us")
+        if baseline and name in baseline:
+            change = (result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1) * 100
+            line += f"  {change:+6.1f}%"
+            if change < -threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    
+    if save_path:
+        directory = os.path.dirname(save_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(save_path, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": sys.platform,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results
+            }, f, indent=2)
+        print(f"Saved baseline to {save_path}")
+    
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {threshold:g}%: {', '.join(regressions)}")
+    return not regressions
+
+
+def run_stage_benchmark(min_time=1.0, seed=0):
+    # Cost of stage instrumentation: analyze_response with timing off, then on
+    rates = {}
+    for instrument in (False, True):
+        nlp_analyzer = NLPAnalyzer(text_cache_size=0, grade_cache_size=0, instrument=instrument)
+        for name, (inputs, operation) in benchmark_cases(seed, nlp_analyzer).items():
+            if name.startswith("analyze_response/"):
+                rates.setdefault(name, []).append(run_benchmark_case(inputs, operation, min_time)["ops_per_sec"])
+    
+    print(f"{'benchmark':<28} {'off ops/sec':>12} {'on ops/sec':>12} {'overhead':>9}")
+    for name, (off, on) in rates.items():
+        print(f"{name:<28} {off:>12,.0f} {on:>12,.0f} {(off / on - 1) * 100:>8.1f}%")
+    print()
+    print(nlp_analyzer.stage_timer.summary())
+
+
+def run_sampler_benchmark(sizes, draws=200000, seed=0):
+    # Draws/sec for one synthetic level of each size: the old list-and-choice pick,
+    # weighted draws with repeats, non-repeating session draws, and weight updates
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    print(f"{'benchmark':<22} {'questions':>10} {'ops/sec':>14}")
+    for size in sizes:
+        questions = [{"id": f"q{i}", "weight": rng.uniform(0.5, 2.0)} for i in range(size)]
+        bank = {"Bench": {1: questions}}
+        sampler = QuestionSampler(bank, seed=seed)
+        start = clock()
+        sampler.pool("Bench", 1)
+        build = clock() - start
+        
+        def choice_pick():
+            levels = list(bank.get("Bench", {}).keys())
+            return random.choice(bank["Bench"][min(1, max(levels))])
+        session = sampler.session()
+        ids = [question["id"] for question in questions]
+        weights = [rng.uniform(0.25, 4.0) for _ in range(draws)]
+        targets = [rng.choice(ids) for _ in range(draws)]
+        cases = [
+            ("random.choice", choice_pick),
+            ("weighted draw", lambda: sampler.draw("Bench", 1)),
+            ("session draw", lambda: session.draw("Bench", 1)),
+        ]
+        for name, operation in cases:
+            start = clock()
+            for _ in range(draws):
+                operation()
+            print(f"{name:<22} {size:>10,} {draws / (clock() - start):>14,.0f}")
+        
+        start = clock()
+        for question_id, weight in zip(targets, weights):
+            sampler.set_weight("Bench", 1, question_id, weight)
+        elapsed = clock() - start
+        print(f"{'set_weight':<22} {size:>10,} {draws / elapsed:>14,.0f}  (pool built in {build * 1000:.1f} ms)")
+        start = clock()
+        for _ in range(draws):
+            sampler.draw("Bench", 1)
+        print(f"{'draw after updates':<22} {size:>10,} {draws / (clock() - start):>14,.0f}")
+
+
+def run_question_memory_benchmark(sizes, seed=0):
+    # Memory retained per resident question, measured with tracemalloc, for question
+    # dicts as the store used to build them and for Question records. Rows are made the
+    # way the store reads them, with every question's strings freshly allocated, and
+    # concept lists are shared by ten questions each from a 1,000-concept vocabulary.
+    tracemalloc = lazy_import("tracemalloc")
+    clock = time.perf_counter
+    
+    def rows(size):
+        rng = random.Random(seed)
+        vocabulary = [f"concept {number}" for number in range(1000)]
+        topics = [json.dumps(rng.sample(vocabulary, 3)) for _ in range(max(1, size // 10))]
+        for number in range(size):
+            answer = rng.randint(1, 1000)
+            rules = json.dumps([{"type": "numeric", "value": answer, "feedback": f"Correct! The answer is {answer}.",
+                                 "concepts_identified": ["correct calculation"], "confidence_score": 0.95}])
+            yield (f"bench-{number}", f"Question {number}: what is the answer?", rng.choice(topics), rules, None, 1.0)
+    
+    def as_dict(question_id, prompt, concepts, rules, video_path, weight):
+        return {"id": question_id, "prompt": prompt, "concepts": json.loads(concepts), "video_path": video_path,
+                "rules": json.loads(rules), "weight": weight}
+    
+    def as_record(question_id, prompt, concepts, rules, video_path, weight):
+        return Question(question_id, prompt, json.loads(concepts), rules, video_path, weight)
+    
+    concept_table = Question.concept_table
+    print(f"{'questions':>10} {'representation':<16} {'bytes/question':>15} {'total MB':>9} {'build s':>8}")
+    try:
+        for size in sizes:
+            results = {}
+            for name, build in (("dict", as_dict), ("Question", as_record)):
+                Question.concept_table = ConceptTable()
+                lazy_import("gc").collect()
+                tracemalloc.start()
+                baseline = tracemalloc.get_traced_memory()[0]
+                start = clock()
+                questions = [build(*row) for row in rows(size)]
+                elapsed = clock() - start
+                retained = tracemalloc.get_traced_memory()[0] - baseline
+                tracemalloc.stop()
+                del questions
+                results[name] = retained
+                print(f"{size:>10,} {name:<16} {retained / size:>15,.0f} {retained / 2 ** 20:>9,.1f} {elapsed:>8.1f}")
+            print(f"{size:>10,} {'saving':<16} {1 - results['Question'] / results['dict']:>15.0%}")
+    finally:
+        Question.concept_table = concept_table
+
+
+def run_dedupe_benchmark(sizes, duplicate_rate=0.05, seed=0):
+    # Synthetic prompts of 10 to 14 words, a duplicate_rate share of them near-copies of
+    # an earlier prompt (case, punctuation, or a trailing word changed); reports time,
+    # how many planted copies landed in their original's cluster, and clusters that
+    # mixed unrelated prompts
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    vocabulary = [f"{rng.choice('bcdfghklmnprstvw')}{rng.choice('aeiou')}{rng.choice('lmnrst')}"
+                  f"{rng.choice('aeiou')}{rng.choice('bcdfghklmnprstvw')}" for _ in range(5000)]
+    print(f"{'questions':>10} {'seconds':>8} {'clusters':>9} {'recall':>7} {'mixed clusters':>15}")
+    for size in sizes:
+        prompts = []
+        family = []   # index of the original each prompt was copied from, itself for originals
+        for index in range(size):
+            if index and rng.random() < duplicate_rate:
+                original = family[rng.randrange(index)]
+                prompt = prompts[original]
+                change = rng.randrange(3)
+                if change == 0:
+                    prompt = prompt.upper()
+                elif change == 1:
+                    prompt = prompt.replace(" ", ", ", 1).rstrip("?") + "."
+                else:
+                    prompt = prompt.rstrip("?") + " please?"
+                prompts.append(prompt)
+                family.append(original)
+            else:
+                prompts.append(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(10, 14))).capitalize() + "?")
+                family.append(index)
+        start = clock()
+        clusters = PromptDeduplicator(seed=seed).clusters(prompts)
+        elapsed = clock() - start
+        found = sum(1 for members in clusters for index in members if family[index] != index and family[index] in members)
+        planted = sum(1 for index, original in enumerate(family) if original != index)
+        mixed = sum(1 for members in clusters if len({family[index] for index in members}) > 1)
+        print(f"{size:>10,} {elapsed:>8.1f} {len(clusters):>9,} {found / max(1, planted):>7.1%} {mixed:>15,}")
+
+
+def run_reload_benchmark(sizes, levels=5, seed=0):
+    # A resident subject of `size` questions with its sampler pools and rules built:
+    # time refresh() after k questions change in the store (half edited, a quarter
+    # added, a quarter removed) against reloading the subject and rebuilding both
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    tempfile = lazy_import("tempfile")
+    
+    def question(number, level):
+        return {"id": f"bench-{number}", "subject": "Bench", "level": level, "prompt": f"Question {number}?",
+                "concepts": [f"concept {number % 97}", f"topic {number % 13}"], "weight": rng.uniform(0.5, 2.0)}
+    
+    def open_bank(store):
+        analyzer = NLPAnalyzer(snapshot_path=None, grade_cache_size=0)
+        bank = LazyQuestionBank(store, max_questions=max(sizes) * 2)
+        bank.add_listener(analyzer.update_index)
+        sampler = QuestionSampler(bank, seed=seed)
+        analyzer.rule_book.index_bank(bank)
+        analyzer.rule_book.index_bank({"Bench": bank["Bench"]})
+        for level in bank["Bench"]:
+            sampler.pool("Bench", level)
+        return bank
+    
+    print(f"{'questions':>10} {'changed':>8} {'refresh ms':>11} {'full reload ms':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = QuestionStore(os.path.join(directory, "bench.sqlite3"))
+            store.add_questions(question(number, 1 + number % levels) for number in range(size))
+            start = clock()
+            bank = open_bank(store)
+            full = clock() - start
+            next_number = size
+            for changed in (1, 10, 100, 1000):
+                ids = rng.sample(sorted(bank.questions), changed)
+                edits, removals = ids[:max(1, changed // 2)], ids[max(1, changed // 2):][:changed // 4]
+                store.add_questions(dict(question(int(question_id.split("-")[1]), rng.randint(1, levels)),
+                                         prompt=f"Edited {question_id}?") for question_id in edits)
+                store.add_questions(question(number, rng.randint(1, levels))
+                                    for number in range(next_number, next_number + changed - len(edits) - len(removals)))
+                next_number += changed
+                store.remove_questions(removals)
+                start = clock()
+                count = bank.refresh()
+                elapsed = clock() - start
+                print(f"{size:>10,} {count:>8,} {elapsed * 1000:>11.2f} {full * 1000:>15.1f}")
+            store.close()
+
+
+def run_seen_benchmark(items=100000, probes=100000, seed=0):
+    # One student answering `items` questions: memory and saved size of their seen
+    # filter against a plain list of question ids, the false-positive rate measured on
+    # ids never added, and session draws that skip seen questions
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    seen = ScalableBloomFilter()
+    unseen = [f"unseen-{number}" for number in range(probes)]
+    print(f"{'answered':>9} {'filter KB':>10} {'saved KB':>9} {'id list KB':>11} {'false pos.':>11} "
+          f"{'add/sec':>10} {'check/sec':>10}")
+    added = 0
+    for checkpoint in sorted({1000, 10000, 50000, items}):
+        if checkpoint > items:
+            continue
+        ids = [f"question-{number}" for number in range(added, checkpoint)]
+        start = clock()
+        for question_id in ids:
+            seen.add(question_id)
+        add_rate = len(ids) / max(clock() - start, 1e-9)
+        added = checkpoint
+        start = clock()
+        false_positives = sum(1 for question_id in unseen if question_id in seen)
+        check_rate = probes / (clock() - start)
+        saved = len(json.dumps(seen.encode()))
+        id_list = len(json.dumps([f"question-{number}" for number in range(added)]))
+        print(f"{added:>9,} {seen.nbytes() / 1024:>10.1f} {saved / 1024:>9.1f} {id_list / 1024:>11.1f} "
+              f"{false_positives / probes:>11.2%} {add_rate:>10,.0f} {check_rate:>10,.0f}")
+    
+    # A 10,000-question level of which the student has answered half
+    questions = [{"id": f"question-{number}"} for number in range(10000)]
+    sampler = QuestionSampler({"Bench": {1: questions}}, seed=seed)
+    level_seen = ScalableBloomFilter()
+    for question in rng.sample(questions, 5000):
+        level_seen.add(question["id"])
+    session = sampler.session()
+    draws = 5000
+    start = clock()
+    repeats = sum(1 for _ in range(draws) if session.draw("Bench", 1, level_seen)["id"] in level_seen)
+    print(f"session draws skipping a half-seen level: {draws / (clock() - start):,.0f}/sec, "
+          f"{repeats} of {draws:,} drew a seen question")
+
+
+def run_review_benchmark(items=100000, days=30, seed=0):
+    # One student with `items` review items: schedule them all, then simulate `days` of
+    # reviews by advancing the clock a day at a time, and time saving and loading
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    subjects = ["Mathematics", "Science", "Programming", "History", "Language Arts"]
+    scheduler = ReviewScheduler(clock=lambda: 0.0)
+    start = clock()
+    for i in range(items):
+        scheduler.record(subjects[i % len(subjects)], f"q{i}", rng.randint(0, 5))
+    elapsed = clock() - start
+    print(f"record (new items)    {items:>10,} items  {items / elapsed:>12,.0f} ops/sec")
+    
+    reviews = 0
+    review_time = 0.0
+    for _ in range(days):
+        scheduler.advance(ReviewScheduler.DAY)
+        start = clock()
+        for subject in subjects:
+            question_id = scheduler.next_due(subject)
+            while question_id is not None:
+                scheduler.record(subject, question_id, rng.randint(0, 5))
+                reviews += 1
+                question_id = scheduler.next_due(subject)
+        review_time += clock() - start
+    print(f"next_due + record     {reviews:>10,} reviews {reviews / review_time:>12,.0f} ops/sec  ({days} days)")
+    
+    start = clock()
+    scheduler.advance(365 * ReviewScheduler.DAY)
+    print(f"advance 365 days      {(clock() - start) * 1e6:>10.1f} us")
+    
+    path = os.path.join("data", "review_benchmark.pickle")
+    start = clock()
+    ReviewScheduler.write(path, scheduler.snapshot())
+    saved = clock() - start
+    start = clock()
+    restored = ReviewScheduler.load(path)
+    loaded = clock() - start
+    size = os.path.getsize(path)
+    os.remove(path)
+    print(f"save {saved * 1000:.1f} ms, load {loaded * 1000:.1f} ms, {size / 1e6:.2f} MB "
+          f"({size / len(restored):.0f} bytes/item)")
+
+
+def run_math_benchmark(batch_size=10000, pops=200000, seed=0):
+    # Batch generation rate per level, with NumPy and without, then the cost of
+    # serving (pop) and of building a question and its rules back from an id
+    clock = time.perf_counter
+    for use_numpy in (True, False):
+        factory = MathQuestionFactory(batch_size=batch_size, seed=seed, use_numpy=use_numpy)
+        factory.pop(1)   # imports NumPy, and lets the first batches in, outside the timing
+        for level in sorted(factory.levels):
+            start = clock()
+            factory.generate_batch(level)
+            elapsed = clock() - start
+            mode = "numpy" if factory.use_numpy else "python"
+            print(f"generate_batch  level {level}  {mode:<6} {batch_size / elapsed:>12,.0f} questions/sec")
+        if use_numpy:
+            factory.close()
+    
+    for level in factory.levels:
+        factory.buffers[level].extend(factory.generate_batch(level, pops // factory.max_level + 1))
+    start = clock()
+    for i in range(pops):
+        factory.pop(i % factory.max_level + 1)
+    elapsed = clock() - start
+    print(f"pop                          {pops / elapsed:>12,.0f} questions/sec")
+    
+    rule_book = RuleBook(lambda keywords: KeywordMatcher(keywords))
+    ids = [question.id for level in factory.levels for question in list(factory.buffers[level])[:pops // 4]]
+    start = clock()
+    for question_id in ids:
+        rule_book.compile(MathQuestionFactory.question(question_id))
+    elapsed = clock() - start
+    print(f"rules from id (uncached)     {len(ids) / elapsed:>12,.0f} questions/sec")
+    factory.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gamified Learning Assistant")
+    parser.add_argument("--measure-stalls", action="store_true",
+                        help="report the worst Tk main-loop stall when the window closes")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="report import and time-to-first-window timings when the window closes")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="pick the next question on Continue instead of while feedback is shown")
+    parser.add_argument("--measure-latency", action="store_true",
+                        help="report click-to-question latency when the window closes")
+    parser.add_argument("--stage-stats", type=float, metavar="SECONDS",
+                        help="time each grading stage and print a summary every SECONDS and on exit")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    bench_parser = subparsers.add_parser("bench", help="run a grading benchmark")
+    bench_parser.add_argument("benchmark", nargs="?",
+                              choices=["batch", "tokenizer", "engine", "coldstart", "suite", "stages", "sampler", "reviews", "math", "reload", "questions", "dedupe", "seen"],
+                              default="batch")
+    bench_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000])
+    bench_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.add_argument("--questions", type=int, nargs="+", default=[10000, 100000],
+                              help="sampler: questions per level; reload: questions in the subject; "
+                                   "questions, dedupe: numbers of questions")
+    bench_parser.add_argument("--items", type=int, default=100000, help="reviews: review items per student; seen: questions answered")
+    bench_parser.add_argument("--only", nargs="+", help="suite: run benchmarks whose name contains any of these")
+    bench_parser.add_argument("--save", metavar="FILE", help="suite: save results as a JSON baseline")
+    bench_parser.add_argument("--compare", metavar="FILE", help="suite: compare against a saved baseline")
+    bench_parser.add_argument("--threshold", type=float, default=10.0,
+                              help="suite: percent slowdown that fails --compare")
+    bench_parser.add_argument("--min-time", type=float, default=1.0, help="suite: seconds per benchmark")
+    bench_parser.add_argument("--child-mode", choices=["wordnet", "snapshot"], help=argparse.SUPPRESS)
+    
+    snapshot_parser = subparsers.add_parser("build-snapshot", help="build the pre-warmed NLP data snapshot")
+    snapshot_parser.add_argument("answers", nargs="*", help="student answer files (.jsonl or text) for vocabulary")
+    snapshot_parser.add_argument("--output", default=NLP_SNAPSHOT_PATH)
+    
+    subparsers.add_parser("parity", help="check the regex tokenizer grades like the NLTK tokenizer")
+    
+    grade_parser = subparsers.add_parser("grade", help="re-grade a JSONL or CSV file of answers")
+    grade_parser.add_argument("input", help="answers as .jsonl or .csv")
+    grade_parser.add_argument("output", help="results as .jsonl or .csv")
+    grade_parser.add_argument("--workers", type=int, default=0, help="grading processes (0 grades in-process)")
+    grade_parser.add_argument("--resume", action="store_true", help="continue from the output's checkpoint")
+    grade_parser.add_argument("--checkpoint-every", type=int, default=10000)
+    grade_parser.add_argument("--chunksize", type=int, default=1024)
+    
+    import_parser = subparsers.add_parser("import-questions", help="add questions to the question store")
+    import_parser.add_argument("input", help="questions as .jsonl: subject, level, prompt, concepts, [id, rules, video_path, weight]")
+    import_parser.add_argument("--store", default=QUESTION_STORE_PATH)
+    import_parser.add_argument("--duplicates", choices=["flag", "merge", "off"], default="flag",
+                               help="report near-duplicate prompts (flag), also leave them out (merge), or skip the check")
+    import_parser.add_argument("--similarity", type=float, default=0.8,
+                               help="shingle similarity at which prompts count as near-duplicates")
+    import_parser.add_argument("--report", default=DUPLICATE_REPORT_PATH, help="near-duplicate cluster report (.jsonl)")
+    
+    remove_parser = subparsers.add_parser("remove-questions", help="remove questions from the question store")
+    remove_parser.add_argument("ids", nargs="+", help="question ids")
+    remove_parser.add_argument("--store", default=QUESTION_STORE_PATH)
+    
+    serve_parser = subparsers.add_parser("serve", help="run the headless grading service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int, default=None)
+    serve_parser.add_argument("--batch-size", type=int, default=64)
+    serve_parser.add_argument("--max-queue", type=int, default=1024)
+    
+    loadtest_parser = subparsers.add_parser("loadtest", help="load-test a running grading service")
+    loadtest_parser.add_argument("--host", default="127.0.0.1")
+    loadtest_parser.add_argument("--port", type=int, default=8000)
+    loadtest_parser.add_argument("--concurrency", type=int, default=64)
+    loadtest_parser.add_argument("--duration", type=float, default=10.0)
+    loadtest_parser.add_argument("--users", type=int, default=1000)
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "bench":
+        if args.benchmark == "tokenizer":
+            run_tokenizer_benchmark()
+        elif args.benchmark == "engine":
+            run_engine_benchmark(max(args.rows), args.workers, args.seed)
+        elif args.benchmark == "suite":
+            if not run_benchmark_suite(args.only, args.save, args.compare, args.threshold, args.min_time, args.seed):
+                sys.exit(1)
+        elif args.benchmark == "stages":
+            run_stage_benchmark(args.min_time, args.seed)
+        elif args.benchmark == "sampler":
+            run_sampler_benchmark(args.questions, seed=args.seed)
+        elif args.benchmark == "reviews":
+            run_review_benchmark(args.items, seed=args.seed)
+        elif args.benchmark == "seen":
+            run_seen_benchmark(args.items, seed=args.seed)
+        elif args.benchmark == "dedupe":
+            run_dedupe_benchmark(args.questions, seed=args.seed)
+        elif args.benchmark == "questions":
+            run_question_memory_benchmark(args.questions, seed=args.seed)
+        elif args.benchmark == "reload":
+            run_reload_benchmark(args.questions, seed=args.seed)
+        elif args.benchmark == "math":
+            run_math_benchmark(seed=args.seed)
+        elif args.benchmark == "coldstart":
+            if args.child_mode:
+                run_coldstart_child(args.child_mode == "snapshot")
+            else:
+                run_coldstart_benchmark()
+        else:
+            run_batch_benchmark(args.rows, args.seed)
+        return
+    
+    if args.command == "parity":
+        sys.exit(0 if run_parity_check() else 1)
+    
+    if args.command == "import-questions":
+        # Opening through QuestionGenerator seeds a new store with the built-in questions first
+        store = QuestionGenerator(store_path=args.store).store
+        skip = set()
+        if args.duplicates != "off":
+            skip = deduplicate_import(store, args.input, args.similarity, args.duplicates == "merge", args.report)
+        with open(args.input, "r", encoding="utf-8") as f:
+            added = store.add_questions(json.loads(line) for number, line in enumerate(f)
+                                        if line.strip() and number not in skip)
+        print(f"Imported {added:,} questions; the store now holds {store.count():,}")
+        return
+    
+    if args.command == "remove-questions":
+        store = QuestionStore(args.store)
+        removed = store.remove_questions(args.ids)
+        print(f"Removed {removed:,} questions; the store now holds {store.count():,}")
+        return
+    
+    if args.command == "grade":
+        grade_file(args.input, args.output, args.workers, args.resume, args.checkpoint_every, args.chunksize)
+        return
+    
+    if args.command == "serve":
+        GradingService(args.host, args.port, args.workers, args.batch_size, args.max_queue).run()
+        return
+    
+    if args.command == "loadtest":
+        run_load_test(args.host, args.port, args.concurrency, args.duration, args.users)
+        return
+    
+    if args.command == "build-snapshot":
+        build_nlp_snapshot(args.output, args.answers)
+        return
+    
     root = tk.Tk()
-    app = GamifiedLearningAssistant(root)
+    app = GamifiedLearningAssistant(root, measure_stalls=args.measure_stalls, startup_report=args.startup_report,
+                                    stage_stats=args.stage_stats, prefetch=not args.no_prefetch,
+                                    measure_latency=args.measure_latency)
     app.run()
+
+
+if __name__ == "__main__":
+    main()
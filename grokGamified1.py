@@ -5,6 +5,7 @@ import threading
 import json
 import os
 import random
+from collections import OrderedDict
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
@@ -58,9 +59,13 @@ class SpeechRecognizer:
         self.is_recording = False
 
 class QuestionGenerator:
-    def __init__(self):
+    def __init__(self, nlp_analyzer=None):
         self.current_question = None
         self.question_bank = self._initialize_question_bank()
+        self.concept_index = None
+        if nlp_analyzer:
+            self.concept_index = nlp_analyzer.concept_index
+            self.concept_index.index_bank(self.question_bank)
     
     def _initialize_question_bank(self):
         return {
@@ -89,10 +94,71 @@ class QuestionGenerator:
     def get_current_question_concepts(self):
         return self.current_question.get("concepts", []) if self.current_question else []
 
+class ConceptIndex:
+    # A trimmed copy of ConceptIndex in gamified-ai-learning-assistant-python.py
+    def __init__(self, preprocess, adhoc_size=4096):
+        self.preprocess = preprocess
+        self.concept_lemmas = {}     # concept -> frozenset of its lemmas, for the bank
+        self.question_entries = {}   # tuple of a bank question's concepts -> {lemma: [concepts using it]}
+        # The same for concepts from outside the bank, oldest dropped first
+        self.adhoc_size = adhoc_size
+        self.adhoc_lemmas = OrderedDict()
+        self.adhoc_entries = OrderedDict()
+    
+    def index_bank(self, question_bank):
+        for levels in question_bank.values():
+            for questions in levels.values():
+                for question in questions:
+                    self.get(question.get("concepts", []), pin=True)
+    
+    def remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.adhoc_size:
+            cache.popitem(last=False)
+    
+    def concept_words(self, concept, pin=False):
+        lemmas = self.concept_lemmas.get(concept)
+        if lemmas is None and not pin:
+            lemmas = self.adhoc_lemmas.get(concept)
+        if lemmas is None:
+            lemmas = frozenset(self.preprocess(concept))
+        if pin:
+            self.concept_lemmas[concept] = lemmas
+        elif concept not in self.concept_lemmas:
+            self.remember(self.adhoc_lemmas, concept, lemmas)
+        return lemmas
+    
+    def get(self, concepts, pin=False):
+        key = tuple(concepts)
+        entry = self.question_entries.get(key)
+        if entry is None and not pin:
+            entry = self.adhoc_entries.get(key)
+        if entry is None:
+            entry = {}
+            for concept in key:
+                for lemma in self.concept_words(concept, pin):
+                    entry.setdefault(lemma, []).append(concept)
+        if pin:
+            self.question_entries[key] = entry
+        elif key not in self.question_entries:
+            self.remember(self.adhoc_entries, key, entry)
+        return entry
+    
+    def match(self, processed_response, concepts):
+        lemma_map = self.get(concepts)
+        matched = set()
+        for word in processed_response:
+            hits = lemma_map.get(word)
+            if hits:
+                matched.update(hits)
+        return [concept for concept in concepts if concept in matched]
+
 class NLPAnalyzer:
     def __init__(self):
         self.lemmatizer = WordNetLemmatizer()
         self.stop_words = set(stopwords.words('english'))
+        self.concept_index = ConceptIndex(self.preprocess_text)
     
     def preprocess_text(self, text):
         tokens = word_tokenize(text.lower())
@@ -101,9 +167,7 @@ class NLPAnalyzer:
     
     def analyze_response(self, user_response, subject, expected_concepts):
         processed_response = self.preprocess_text(user_response)
-        matched_concepts = [concept for concept in expected_concepts 
-                          if any(word in processed_response 
-                               for word in self.preprocess_text(concept))]
+        matched_concepts = self.concept_index.match(processed_response, expected_concepts)
         
         match_percentage = len(matched_concepts) / len(expected_concepts) if expected_concepts else 0
         
@@ -126,8 +190,8 @@ class GamifiedLearningAssistant:
         
         self.initialize_variables()
         self.speech_recognizer = SpeechRecognizer()
-        self.question_generator = QuestionGenerator()
         self.nlp_analyzer = NLPAnalyzer()
+        self.question_generator = QuestionGenerator(self.nlp_analyzer)
         self.load_user_data()
         self.create_ui()
         self.video_active = False
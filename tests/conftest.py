@@ -0,0 +1,57 @@
+import importlib.util
+import json
+import os
+import pickle
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "gamified-ai-learning-assistant-python.py")
+
+
+@pytest.fixture(scope="session")
+def app():
+    # The main script is not an importable module name, so load it from its path
+    spec = importlib.util.spec_from_file_location("learning_assistant", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["learning_assistant"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def snapshot_path(app, tmp_path):
+    # An NLP snapshot with a few stopwords and lemmas, so analyzers grade without NLTK
+    # data as long as questions and answers stick to these words
+    path = tmp_path / "nlp_snapshot.pickle"
+    with open(path, "wb") as f:
+        pickle.dump({
+            "version": app.NLP_SNAPSHOT_VERSION,
+            "stop_words": ["the", "a", "is", "it", "to"],
+            "lemmas": {word: word for word in ["how", "many", "time", "does", "loop", "print", "right"]}
+        }, f)
+    return str(path)
+
+
+@pytest.fixture
+def bank_snapshot_path(app, tmp_path):
+    # An NLP snapshot with every word of the seed question bank, for code that builds
+    # its own QuestionGenerator (grade_file, GradingEngine workers)
+    bank = app.QuestionGenerator._initialize_question_bank(None)
+    words = [word for word in app.regex_tokenize(json.dumps(bank).lower()) if word.isalpha()]
+    path = tmp_path / "nlp_bank_snapshot.pickle"
+    with open(path, "wb") as f:
+        pickle.dump({
+            "version": app.NLP_SNAPSHOT_VERSION,
+            "stop_words": ["the", "a", "is", "it", "on"],
+            "lemmas": {word: word for word in words}
+        }, f)
+    return str(path)
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    store = app.QuestionStore(str(tmp_path / "questions.sqlite3"))
+    yield store
+    store.close()
@@ -0,0 +1,49 @@
+import functools
+import json
+
+import pytest
+
+
+@pytest.fixture
+def bench(app, bank_snapshot_path, tmp_path, monkeypatch):
+    # Runs `bench suite` on two quick benchmarks, NLTK-free, with its question store in tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "NLPAnalyzer", functools.partial(app.NLPAnalyzer, tokenizer="regex",
+                                                              snapshot_path=bank_snapshot_path))
+
+    def run(*options):
+        app.main(["bench", "suite", "--only", "generate_question", "keyword_matcher/speech",
+                  "--min-time", "0.01", *options])
+
+    return run
+
+
+def test_save_then_compare_against_the_saved_baseline(bench, tmp_path, capsys):
+    bench("--save", "baselines/suite.json")
+    baseline = json.loads((tmp_path / "baselines" / "suite.json").read_text())
+    assert set(baseline["results"]) == {"generate_question", "keyword_matcher/speech",
+                                        "keyword_matcher/speech/bank"}
+    assert all(result["ops_per_sec"] > 0 for result in baseline["results"].values())
+
+    capsys.readouterr()
+    bench("--compare", "baselines/suite.json", "--threshold", "1000")
+    output = capsys.readouterr().out
+    assert output.count("%") == 3
+    assert "REGRESSION" not in output
+
+
+def test_compare_exits_non_zero_past_the_threshold(bench, tmp_path, capsys):
+    bench("--save", "suite.json")
+    baseline = json.loads((tmp_path / "suite.json").read_text())
+    # A baseline far faster than anything this run can reach; timings this short are
+    # noisy, so the threshold stays well clear of the other benchmarks' jitter
+    baseline["results"]["generate_question"]["ops_per_sec"] *= 10000
+    (tmp_path / "suite.json").write_text(json.dumps(baseline))
+
+    capsys.readouterr()
+    with pytest.raises(SystemExit) as exit_info:
+        bench("--compare", "suite.json", "--threshold", "99")
+    assert exit_info.value.code == 1
+    output = capsys.readouterr().out
+    assert "REGRESSION" in output
+    assert "1 benchmark(s) regressed by more than 99%: generate_question" in output
@@ -0,0 +1,11 @@
+def test_concepts_outside_the_bank_are_bounded(app):
+    index = app.ConceptIndex(str.split, adhoc_size=2)
+    index.index_bank({"Programming": {1: [{"concepts": ["loop", "print statement"]}]}})
+    for subject in ["Art", "Music", "Dance"]:
+        assert index.match(["general", subject], [subject, "general knowledge"]) == [subject, "general knowledge"]
+    assert len(index.adhoc_entries.entries) == 2
+    assert len(index.adhoc_lemmas.entries) == 2
+    # Bank entries stay, however many other concept lists were matched since
+    assert list(index.question_entries) == [("loop", "print statement")]
+    assert set(index.concept_lemmas) == {"loop", "print statement"}
+    assert index.match(["print"], ["loop", "print statement"]) == ["print statement"]
@@ -0,0 +1,86 @@
+import functools
+import json
+
+import pytest
+
+
+RESPONSES = ["12", "solid, liquid and gas", "displays output screen", "george washington"]
+
+
+@pytest.fixture
+def grading(app, bank_snapshot_path, tmp_path, monkeypatch):
+    # grade_file builds its own analyzer and question store; run both in tmp_path, with
+    # an NLP snapshot so no NLTK data is needed
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "NLPAnalyzer", functools.partial(app.NLPAnalyzer, tokenizer="regex",
+                                                              snapshot_path=bank_snapshot_path))
+    return tmp_path
+
+
+def write_input(path):
+    lines = []
+    for i in range(12):
+        if i % 4 == 1:
+            lines.append("")
+        lines.append(json.dumps({"id": i, "question_id": "math-addition-5-7", "response": RESPONSES[i % 4]}))
+    lines[5:5] = ["{not json", "[1, 2]", json.dumps({"id": "bad-id", "question_id": ["x"], "response": "12"}), "   "]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_bad_lines_become_error_rows(app, grading):
+    write_input(grading / "answers.jsonl")
+    app.grade_file(str(grading / "answers.jsonl"), str(grading / "graded.jsonl"))
+    rows = read_output(grading / "graded.jsonl")
+    assert [row["row"] for row in rows] == list(range(15))
+    assert [row["id"] for row in rows if "error" not in row] == list(range(12))
+    assert [row["error"] for row in rows if "error" in row] == [
+        "malformed JSON", "record is not a JSON object", "question_id must be a string"
+    ]
+
+
+def test_resume_after_an_interruption_matches_an_uninterrupted_run(app, grading, monkeypatch):
+    write_input(grading / "answers.jsonl")
+    app.grade_file(str(grading / "answers.jsonl"), str(grading / "expected.jsonl"))
+
+    class Interrupted(Exception):
+        pass
+
+    write = app.GradedRowWriter.write
+
+    def interrupting_write(self, record):
+        if record["row"] == 8:
+            raise Interrupted()
+        write(self, record)
+
+    monkeypatch.setattr(app.GradedRowWriter, "write", interrupting_write)
+    with pytest.raises(Interrupted):
+        app.grade_file(str(grading / "answers.jsonl"), str(grading / "graded.jsonl"), checkpoint_every=3)
+    monkeypatch.setattr(app.GradedRowWriter, "write", write)
+
+    app.grade_file(str(grading / "answers.jsonl"), str(grading / "graded.jsonl"), resume=True)
+    assert read_output(grading / "graded.jsonl") == read_output(grading / "expected.jsonl")
+
+
+def test_csv_resume_seeks_past_the_header(app, grading, monkeypatch):
+    lines = ["id,question_id,response"] + [f'{i},math-addition-5-7,"{RESPONSES[i % 4]}"' for i in range(7)]
+    (grading / "answers.csv").write_text("\n".join(lines) + "\n")
+    app.grade_file(str(grading / "answers.csv"), str(grading / "expected.csv"))
+
+    write = app.GradedRowWriter.write
+
+    def interrupting_write(self, record):
+        if record["row"] == 5:
+            raise KeyboardInterrupt
+        write(self, record)
+
+    monkeypatch.setattr(app.GradedRowWriter, "write", interrupting_write)
+    with pytest.raises(KeyboardInterrupt):
+        app.grade_file(str(grading / "answers.csv"), str(grading / "graded.csv"), checkpoint_every=2)
+    monkeypatch.setattr(app.GradedRowWriter, "write", write)
+
+    app.grade_file(str(grading / "answers.csv"), str(grading / "graded.csv"), resume=True)
+    assert (grading / "graded.csv").read_text() == (grading / "expected.csv").read_text()
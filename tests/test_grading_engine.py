@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+
+@pytest.fixture
+def engine_options(app, bank_snapshot_path, tmp_path, monkeypatch):
+    # Workers build their own analyzer and question store; keep the store in tmp_path
+    monkeypatch.chdir(tmp_path)
+    return {"tokenizer": "regex", "snapshot_path": bank_snapshot_path}
+
+
+def run(engine, fn, *args):
+    job = Future()
+    job.set_running_or_notify_cancel()
+    engine._dispatch(job, fn, args, engine.retries)
+    return job
+
+
+def test_queued_jobs_are_timed_from_when_they_start(app, engine_options):
+    with app.GradingEngine(workers=1, timeout=0.5, **engine_options) as engine:
+        jobs = [run(engine, time.sleep, 0.2) for _ in range(6)]
+        assert [job.result() for job in jobs] == [None] * 6
+
+
+def test_map_of_a_batch_larger_than_the_pool_finishes(app, engine_options):
+    rows = [("12", "Mathematics", ["addition", "single digit", "basic math"])] * 40
+    with app.GradingEngine(workers=2, timeout=2, **engine_options) as engine:
+        results = list(engine.map(rows, chunksize=1))
+    assert len(results) == 40
+    assert not [result for result in results if "error" in result]
+
+
+def test_an_overrunning_job_times_out_and_the_jobs_behind_it_run(app, engine_options):
+    with app.GradingEngine(workers=1, timeout=0.5, **engine_options) as engine:
+        hung = run(engine, time.sleep, 30)
+        queued = [run(engine, time.sleep, 0.1) for _ in range(3)]
+        with pytest.raises(app.GradingTimeout):
+            hung.result(timeout=10)
+        assert [job.result(timeout=10) for job in queued] == [None] * 3
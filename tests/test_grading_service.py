@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def service(app, tmp_path, monkeypatch):
+    # The service keeps its question store and progress under data/
+    monkeypatch.chdir(tmp_path)
+    service = app.GradingService(workers=1)
+    yield service
+    service.engine.close()
+    service.question_generator.close()
+
+
+def request(service, raw):
+    # Send one raw HTTP request to the service; returns (status, JSON payload)
+    async def exchange():
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+
+    return asyncio.run(exchange())
+
+
+def post(path, body):
+    return (f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            .encode("latin-1") + body)
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b'"answer"', b"12", b"null"])
+def test_grade_rejects_bodies_that_are_not_json_objects(service, body):
+    status, payload = request(service, post("/grade", body))
+    assert status == 400
+    assert payload == {"error": "request body must be a JSON object"}
+
+
+def test_unhandled_handler_errors_answer_500(service):
+    async def broken(params, body):
+        raise RuntimeError("boom")
+
+    service.routes[("GET", "/broken")] = broken
+    status, payload = request(service, b"GET /broken HTTP/1.1\r\n\r\n")
+    assert status == 500
+    assert payload == {"error": "internal server error"}
+    assert service.status_counts["500"] == 1
+
+
+@pytest.mark.parametrize("request_body, error", [
+    ({"user": ["ada"], "response": "12"}, "user and response are required"),
+    ({"user": {"name": "ada"}, "response": "12"}, "user and response are required"),
+    ({"user": 7, "response": "12"}, "user and response are required"),
+    ({"user": "", "response": "12"}, "user and response are required"),
+    ({"user": "ada", "response": ["12"]}, "user and response are required"),
+    ({"user": "ada", "response": "12", "question_id": ["math-addition-5-7"]}, "question_id must be a string"),
+    ({"user": "ada", "response": "12", "question_id": {"id": 1}}, "question_id must be a string"),
+    ({"user": "ada", "response": "12", "question_id": 12}, "question_id must be a string"),
+])
+def test_grade_rejects_fields_of_the_wrong_type(service, request_body, error):
+    status, payload = request(service, post("/grade", json.dumps(request_body).encode("utf-8")))
+    assert status == 400
+    assert payload == {"error": error}
+    assert service.status_counts["500"] == 0
@@ -0,0 +1,34 @@
+def numeric_question(value):
+    return {
+        "id": "programming-print", "subject": "Programming", "level": 1,
+        "prompt": "How many time does the loop print?", "concepts": ["loop", "print"],
+        "rules": [{"type": "numeric", "value": value, "feedback": "Right!",
+                   "concepts_identified": ["loop"], "confidence_score": 0.9}]
+    }
+
+
+def test_reloaded_rules_are_not_served_from_the_grade_cache(app, store, snapshot_path):
+    store.add_questions([numeric_question(3)])
+    analyzer = app.NLPAnalyzer(tokenizer="regex", snapshot_path=snapshot_path)
+    generator = app.QuestionGenerator(analyzer, store=store, procedural_math=False)
+    concepts = ["loop", "print"]
+    assert analyzer.analyze_response("3", "Programming", concepts, "programming-print")["is_correct"]
+    
+    store.add_questions([numeric_question(4)])
+    assert generator.refresh() == 1
+    assert not analyzer.analyze_response("3", "Programming", concepts, "programming-print")["is_correct"]
+    assert analyzer.analyze_response("4", "Programming", concepts, "programming-print")["is_correct"]
+
+
+def test_refresh_applies_edits_additions_and_removals(app, store):
+    store.add_questions([numeric_question(3), dict(numeric_question(5), id="programming-other")])
+    generator = app.QuestionGenerator(store=store, procedural_math=False)
+    assert len(generator.question_bank["Programming"][1]) == 2
+    
+    store.remove_questions(["programming-other"])
+    store.add_questions([dict(numeric_question(7), id="programming-new", level=2)])
+    generator.refresh()
+    levels = generator.question_bank["Programming"]
+    assert [question.id for question in levels[1]] == ["programming-print"]
+    assert [question.id for question in levels[2]] == ["programming-new"]
+    assert generator.question_bank.find("programming-other") is None
@@ -0,0 +1,21 @@
+def test_matches_reports_every_occurrence_overlaps_included(app):
+    matcher = app.KeywordMatcher(["Light", "sunlight", "light", "", "ana"])
+    assert matcher.keywords == ("light", "sunlight", "ana")
+    assert matcher.matches("sunlight and more light, banana") == {
+        "light": [3, 18], "sunlight": [0], "ana": [26, 28]
+    }
+    assert matcher.matches("nothing here") == {}
+
+
+def test_many_keywords_match_like_few(app):
+    # Enough keywords for the automaton, including ones that overlap, nest and share prefixes
+    keywords = ["light", "sunlight", "ana", "banana", "nan", "s", "sun", "lighthouse"]
+    keywords += [f"filler{i}" for i in range(app.KeywordMatcher.AUTOMATON_MIN_KEYWORDS)]
+    text = "sunlight and more light, banana by the lighthouse; filler12 filler1 " * 3
+    matcher = app.KeywordMatcher(keywords)
+    assert matcher.transitions is not None
+    expected = app.KeywordMatcher([])
+    expected.keywords = matcher.keywords
+    assert matcher.matches(text) == expected.matches(text)
+    assert list(matcher.matches(text)) == [keyword for keyword in matcher.keywords if keyword in text]
+    assert matcher.matches("xyz") == {}
@@ -0,0 +1,43 @@
+def test_stored_questions_are_served_before_generated_ones(app, store):
+    store.add_questions([{"id": "math-stored", "subject": "Mathematics", "level": 1,
+                          "prompt": "What is 2 + 2?", "concepts": ["addition"]}])
+    generator = app.QuestionGenerator(store=store)
+    try:
+        assert generator.select_question("Mathematics", 1).id == "math-stored"
+        # The session has drawn every stored level 1 question, so the next is generated
+        assert generator.select_question("Mathematics", 1).id.startswith("math/")
+        
+        seen = app.ScalableBloomFilter()
+        seen.add("math-stored")
+        question = generator.select_question("Mathematics", 1, session=generator.sampler.session(), seen=seen)
+        assert question.id.startswith("math/")
+    finally:
+        generator.close()
+
+
+def test_grade_key_prefixes_are_bounded(app, snapshot_path):
+    analyzer = app.NLPAnalyzer(tokenizer="regex", snapshot_path=snapshot_path)
+    analyzer.grade_key_prefixes = app.LRUCache(8)
+    for a in range(1, 10):
+        question = app.MathQuestionFactory.question(f"math/add/{a},1")
+        analyzer.grade_key("2", "Mathematics", question.concepts, question.id)
+    assert len(analyzer.grade_key_prefixes.entries) == 8
+
+
+def test_served_questions_are_not_rebuilt_from_their_ids(app, store, monkeypatch):
+    generator = app.QuestionGenerator(store=store)
+    try:
+        factory = generator.math_questions
+        # Each level's first batch is generated in the background at construction
+        for level in factory.levels:
+            factory.schedule_refill(level).result()
+        assert all(factory.buffers.values())
+        question = factory.pop(3)
+
+        def rebuild(question_id):
+            raise AssertionError("rebuilt from its id")
+
+        monkeypatch.setattr(app.MathQuestionFactory, "question", staticmethod(rebuild))
+        assert generator.find_question(question.id) == ("Mathematics", question)
+    finally:
+        generator.close()
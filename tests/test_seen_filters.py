@@ -0,0 +1,55 @@
+import base64
+import json
+import zlib
+
+import pytest
+
+
+def encoded(app, *question_ids):
+    seen = app.ScalableBloomFilter()
+    for question_id in question_ids:
+        seen.add(question_id)
+    return seen.encode()
+
+
+def corrupt(data, bits):
+    return dict(data, filters=[[data["filters"][0][0], bits]])
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: corrupt(data, "not base64!"),
+    lambda data: corrupt(data, base64.b64encode(b"not zlib").decode("ascii")),
+    lambda data: corrupt(data, base64.b64encode(zlib.compress(b"\0" * 3)).decode("ascii")),
+    lambda data: {"filters": data["filters"]},
+    lambda data: dict(data, filters="nonsense"),
+])
+def test_bad_seen_filters_are_rebuilt_from_the_review_schedule(app, damage):
+    scheduler = app.ReviewScheduler()
+    scheduler.record("Science", "science-plants", 5)
+    scheduler.record("History", "history-first-us-president", 5)
+    progress = {
+        "Science": {"level": 2, "xp": 40, "seen": damage(encoded(app, "science-plants"))},
+        "Mathematics": {"level": 1, "xp": 0, "seen": encoded(app, "math-addition-5-7")}
+    }
+    seen = app.load_seen_filters(progress, scheduler)
+    assert "science-plants" in seen["Science"]
+    assert "history-first-us-president" not in seen["Science"]
+    assert "math-addition-5-7" in seen["Mathematics"]
+    assert progress == {"Science": {"level": 2, "xp": 40}, "Mathematics": {"level": 1, "xp": 0}}
+
+
+def test_service_starts_with_a_bad_seen_filter(app, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    progress = {
+        "ada": {"Science": {"level": 1, "xp": 10, "seen": corrupt(encoded(app, "science-plants"), "!!")}},
+        "bob": {"Science": {"level": 1, "xp": 0, "seen": encoded(app, "science-plants")}}
+    }
+    (tmp_path / "data" / "service_progress.json").write_text(json.dumps(progress))
+    service = app.GradingService(workers=1)
+    try:
+        assert "science-plants" not in service.seen_questions["ada"]["Science"]
+        assert "science-plants" in service.seen_questions["bob"]["Science"]
+    finally:
+        service.engine.close()
+        service.question_generator.close()
@@ -0,0 +1,44 @@
+def question(question_id, concepts):
+    return {"id": question_id, "subject": "Programming", "level": 1,
+            "prompt": "How many time does the loop print?", "concepts": concepts}
+
+
+def test_vectors_of_concepts_outside_the_bank_are_bounded(app):
+    scorer = app.SimilarityScorer(model_path=None, extra_documents=2)
+    scorer.fit([["loop", "print"]], str.split)
+    for concept in ["loop", "print", "right", "time"]:
+        scorer.score(["loop"], [concept, "general knowledge"], str.split)
+    assert len(scorer.extra_documents.entries) == 2
+    assert list(scorer.documents) == [("loop", "print")]
+    assert scorer.score(["loop"], ["loop", "print"]) > 0
+
+
+def test_unchanged_store_loads_the_model_without_reading_concepts(app, store, tmp_path, monkeypatch):
+    store.add_questions([question("programming-print", ["loop", "print"])])
+    bank = app.LazyQuestionBank(store)
+    model_path = str(tmp_path / "similarity_model.json")
+    fitted = app.SimilarityScorer(model_path=model_path)
+    fitted.load_or_fit(bank, str.split)
+
+    def concept_lists():
+        raise AssertionError("the store was read")
+
+    monkeypatch.setattr(store, "concept_lists", concept_lists)
+    loaded = app.SimilarityScorer(model_path=model_path)
+    loaded.load_or_fit(bank, str.split)
+    assert loaded.fingerprint == fitted.fingerprint
+    assert loaded.documents == fitted.documents
+
+
+def test_refresh_refits_the_model(app, store, snapshot_path, tmp_path):
+    store.add_questions([question("programming-print", ["loop", "print"])])
+    scorer = app.SimilarityScorer(model_path=str(tmp_path / "similarity_model.json"))
+    analyzer = app.NLPAnalyzer(tokenizer="regex", snapshot_path=snapshot_path, scorer=scorer)
+    generator = app.QuestionGenerator(analyzer, store=store, procedural_math=False)
+    analyzer.load_resources()
+    fingerprint = scorer.fingerprint
+
+    store.add_questions([question("programming-time", ["time"])])
+    generator.refresh()
+    assert ("time",) in scorer.documents
+    assert scorer.fingerprint != fingerprint
@@ -0,0 +1,52 @@
+import pytest
+
+
+def nltk_data(app, *resources):
+    # Skip unless NLTK, its Punkt models (punkt or punkt_tab, depending on the NLTK
+    # version) and every named data package are installed
+    nltk = pytest.importorskip("nltk")
+    try:
+        app.nltk_word_tokenize("Punkt?")
+    except LookupError:
+        pytest.skip("NLTK Punkt data is not installed")
+    for resource in resources:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            pytest.skip(f"NLTK data {resource} is not installed")
+
+
+QUOTED = [
+    "say 'solid', 'liquid' and 'gas'",
+    "the 'loop' repeats",
+    "the answer is 'print'.",
+    "''sunlight'' and ‘water’",
+    "the plants' leaves",
+    "'tis the season",
+]
+
+
+def test_quotes_are_split_off_single_quoted_words(app):
+    assert app.regex_tokenize("say 'solid', 'liquid' and 'gas'") == ["say", "solid", "liquid", "and", "gas"]
+    assert app.regex_tokenize("the answer is 'print'.") == ["the", "answer", "is", "print"]
+    assert app.regex_tokenize("''sunlight'' and ‘water’") == ["sunlight", "and", "water"]
+    assert app.regex_tokenize("the plants' leaves") == ["the", "plants", "leaves"]
+    assert app.regex_tokenize("'tis the season") == ["tis", "the", "season"]
+    # Clitics and words with inner apostrophes are left as they were
+    assert app.regex_tokenize("it's 'x' o'clock, they're") == ["it", "x", "o'clock", "they"]
+    assert app.regex_tokenize("'s 're") == ["'s", "'re"]
+
+
+def test_quoted_words_tokenize_like_word_tokenize(app):
+    nltk_data(app)
+    for text in QUOTED:
+        text = text.lower()
+        expected = [word for word in app.nltk_word_tokenize(text) if word.isalpha()]
+        assert [word for word in app.regex_tokenize(text) if word.isalpha()] == expected, text
+
+
+def test_tokenizers_grade_the_parity_corpus_alike(app, tmp_path, monkeypatch):
+    nltk_data(app, "corpora/wordnet", "corpora/stopwords")
+    # run_parity_check builds the default question store; keep it out of the checkout
+    monkeypatch.chdir(tmp_path)
+    assert app.run_parity_check(app.PARITY_CORPUS + QUOTED)